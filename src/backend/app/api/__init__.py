@@ -5,8 +5,11 @@ from fastapi import APIRouter
 
 from app.api.auth import router as auth_router
 from app.api.templates import router as templates_router
+from app.api.conversion_batches import router as conversion_batches_router
 from app.api.conversions import router as conversions_router
 from app.api.settings import router as settings_router
+from app.api.metrics import router as metrics_router
+from app.api.jobs import router as jobs_router
 
 # メインルーター
 api_router = APIRouter()
@@ -14,7 +17,11 @@ api_router = APIRouter()
 # 各ルーターを登録
 api_router.include_router(auth_router)
 api_router.include_router(templates_router)
+# /conversions/batches は /conversions/{conversion_id} より先に登録する
+api_router.include_router(conversion_batches_router)
 api_router.include_router(conversions_router)
 api_router.include_router(settings_router)
+api_router.include_router(metrics_router)
+api_router.include_router(jobs_router)
 
 __all__ = ["api_router"]
@@ -0,0 +1,126 @@
+"""
+一括アップロードAPI
+複数のPDF・ZIPファイルをまとめてアップロードして変換し、進捗を集計する
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.api.deps import get_db, get_current_user
+from app.models import Conversion, ConversionBatch, Job, User
+from app.schemas import (
+    ApiResponse, ConversionResponse, ConversionBatchResponse,
+    ConversionBatchDetailResponse, ConversionBatchListResponse
+)
+from app.services import ConversionBatchService
+from app.batch import job_worker_pool
+from app.core.exceptions import (
+    TemplateNotFoundException, TemplateNotReadyException, ConversionBatchNotFoundException,
+    FileTooLargeException, InvalidFileTypeException, InvalidArchiveException,
+    TooManyFilesException, ValidationException
+)
+
+# /conversions/{conversion_id} より先に登録する
+router = APIRouter(prefix="/conversions/batches", tags=["変換"])
+
+
+def _batch_response(batch_service: ConversionBatchService, batch: ConversionBatch) -> ConversionBatchResponse:
+    return ConversionBatchResponse(
+        id=batch.id,
+        name=batch.name,
+        template_id=batch.template_id,
+        execution_mode=batch.execution_mode,
+        created_at=batch.created_at,
+        **batch_service.get_progress(batch)
+    )
+
+
+def _batch_detail_response(
+    batch_service: ConversionBatchService, batch: ConversionBatch
+) -> ConversionBatchDetailResponse:
+    return ConversionBatchDetailResponse(
+        **_batch_response(batch_service, batch).model_dump(),
+        items=[ConversionResponse.model_validate(c) for c in batch_service.get_conversions(batch)]
+    )
+
+
+@router.post("", response_model=ApiResponse[ConversionBatchDetailResponse])
+def create_conversion_batch(
+    files: List[UploadFile] = File(..., description="PDFファイル（複数可）またはPDFを含むZIPファイル"),
+    template_id: int = Form(...),
+    converter_type: Optional[str] = Form(None),
+    mode: str = Form(Conversion.EXECUTION_SYNC, description="sync: 通常 / batch: Vision APIをBatch APIで送信"),
+    priority: int = Form(
+        Job.PRIORITY_LOW, ge=Job.PRIORITY_LOW, le=Job.PRIORITY_HIGH,
+        description="ジョブの優先度（省略時は個別の変換より後に実行する低優先度）"
+    ),
+    name: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """一括アップロード（全PDFの変換を登録してHTML生成を開始）"""
+    try:
+        batch_service = ConversionBatchService(db)
+        batch = batch_service.create(
+            user_id=current_user.id,
+            template_id=template_id,
+            uploads=[(upload.filename or "", upload.file) for upload in files],
+            name=name,
+            requested_converter=converter_type,
+            execution_mode=mode,
+            priority=priority
+        )
+
+        conversions = batch_service.get_conversions(batch)
+        job_worker_pool.notify(len(conversions))
+
+        return ApiResponse.ok(
+            data=_batch_detail_response(batch_service, batch),
+            message=f"{len(conversions)}件のPDFをアップロードしてHTML生成を開始しました"
+        )
+    except TemplateNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
+    except ValidationException as e:
+        raise HTTPException(status_code=422, detail={"code": e.code, "message": e.message})
+    except (
+        TemplateNotReadyException, FileTooLargeException, InvalidFileTypeException,
+        InvalidArchiveException, TooManyFilesException
+    ) as e:
+        raise HTTPException(status_code=400, detail={"code": e.code, "message": e.message})
+
+
+@router.get("", response_model=ApiResponse[ConversionBatchListResponse])
+def get_conversion_batches(
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """一括アップロード一覧取得"""
+    batch_service = ConversionBatchService(db)
+    batches, total = batch_service.get_list(current_user.id, page=page, limit=limit)
+
+    return ApiResponse.ok(
+        data=ConversionBatchListResponse(
+            items=[_batch_response(batch_service, batch) for batch in batches],
+            total=total,
+            page=page,
+            limit=limit,
+            has_next=(page * limit) < total
+        )
+    )
+
+
+@router.get("/{batch_id}", response_model=ApiResponse[ConversionBatchDetailResponse])
+def get_conversion_batch(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """一括アップロード詳細取得（進捗と変換一覧）"""
+    try:
+        batch_service = ConversionBatchService(db)
+        batch = batch_service.get_by_id(batch_id, current_user.id)
+        return ApiResponse.ok(data=_batch_detail_response(batch_service, batch))
+    except ConversionBatchNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
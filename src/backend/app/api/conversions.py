@@ -3,29 +3,39 @@
 PDF変換のCRUD、ダウンロード
 """
 import json
-import threading
+import time
 import logging
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Callable, Optional
 import io
 
 from app.api.deps import get_db, get_current_user
-from app.models import User
-from app.infrastructure.database import SessionLocal
+from app.models import Conversion, Job, User
 from app.schemas import (
     ApiResponse, ConversionResponse, ConversionDetailResponse,
     ConversionListResponse, ConversionUploadResponse, ConversionGenerateResponse,
     ConversionUpdateRequest, ConversionApproveResponse, ImageResponse
 )
 from app.schemas.conversion import TemplateSimple
-from app.services import ConversionService, SettingsService
-from app.converters import ConverterManager
+from app.services import ConversionService, ConversionMetricsService, JobService
+from app.batch import job_worker_pool
+from app.converters import ConverterManager, converter_registry, image_content_hash
+from app.infrastructure.database import SessionLocal
 from app.infrastructure.file_storage import file_storage
+from app.infrastructure.generation_stream import EVENT_DONE, EVENT_ERROR, StreamEvent, generation_streams
+from app.infrastructure.monitoring import CONVERSIONS_RUNNING, observe_conversion
+from app.infrastructure.stage_metrics import (
+    STAGE_DB_COMMIT, STAGE_EXTRACT, STAGE_EXTRACTION_REUSE, STAGE_HTML_GENERATION, STAGE_IMAGE_WRITE,
+    STAGE_PRESCAN, StageRecorder, record_stage, recording
+)
+from app.core.config import settings
 from app.core.exceptions import (
     ConversionNotFoundException, TemplateNotReadyException,
-    FileTooLargeException, InvalidFileTypeException
+    FileTooLargeException, InvalidFileTypeException, ValidationException, JobCancelledException,
+    JobDeferredException
 )
 
 router = APIRouter(prefix="/conversions", tags=["変換"])
@@ -72,8 +82,10 @@ async def create_conversion(
         # ファイル内容を読み込み
         content = await file.read()
 
+        # 事前スキャン（PDF全体の解析）でイベントループを止めないようスレッドで実行
         conversion_service = ConversionService(db)
-        conversion = conversion_service.create(
+        conversion = await run_in_threadpool(
+            conversion_service.create,
             user_id=current_user.id,
             template_id=template_id,
             filename=file.filename,
@@ -81,13 +93,6 @@ async def create_conversion(
             requested_converter=converter_type
         )
 
-        # ページ数を取得
-        converter = ConverterManager()
-        pdf_path = file_storage.get_file_path(conversion.pdf_path)
-        if pdf_path:
-            conversion.page_count = converter.get_page_count(str(pdf_path))
-            db.commit()
-
         return ApiResponse.ok(
             data=ConversionUploadResponse(
                 id=conversion.id,
@@ -119,21 +124,16 @@ async def upload_pdf(
         # ファイル内容を読み込み
         content = await file.read()
 
+        # 事前スキャン（PDF全体の解析）でイベントループを止めないようスレッドで実行
         conversion_service = ConversionService(db)
-        conversion = conversion_service.create(
+        conversion = await run_in_threadpool(
+            conversion_service.create,
             user_id=current_user.id,
             template_id=template_id,
             filename=file.filename,
             file_content=content
         )
 
-        # ページ数を取得
-        converter = ConverterManager()
-        pdf_path = file_storage.get_file_path(conversion.pdf_path)
-        if pdf_path:
-            conversion.page_count = converter.get_page_count(str(pdf_path))
-            db.commit()
-
         return ApiResponse.ok(
             data=ConversionUploadResponse(
                 id=conversion.id,
@@ -179,6 +179,9 @@ def get_conversion(
                 ),
                 images=[ImageResponse.model_validate(img) for img in conversion.images],
                 error_message=conversion.error_message,
+                routing_reason=conversion.routing_reason,
+                execution_mode=conversion.execution_mode,
+                extraction_source_id=conversion.extraction_source_id,
                 approved_at=conversion.approved_at,
                 created_at=conversion.created_at,
                 updated_at=conversion.updated_at
@@ -188,9 +191,115 @@ def get_conversion(
         raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
 
 
+# SSEの接続維持コメントを送る間隔（秒）
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+def _sse_event(event: StreamEvent) -> str:
+    """SSE形式にエンコード（dataは改行を含むためJSON文字列にする）"""
+    return f"event: {event.event}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+
+
+def _final_event(conversion: Conversion) -> Optional[StreamEvent]:
+    """保存済みの生成結果（生成が終わっていなければNone）"""
+    if conversion.status in (Conversion.STATUS_CONVERTED, Conversion.STATUS_APPROVED):
+        return StreamEvent(EVENT_DONE, conversion.generated_html or "")
+    if conversion.status == Conversion.STATUS_ERROR:
+        return StreamEvent(EVENT_ERROR, conversion.error_message or "")
+    return None
+
+
+def _load_final_event(conversion_id: int) -> Optional[StreamEvent]:
+    """保存済みの生成結果をDBから取得（SSEのイベントループからはスレッドプールで呼ぶ）"""
+    db = SessionLocal()
+    try:
+        conversion = db.query(Conversion).filter(Conversion.id == conversion_id).first()
+        return _final_event(conversion) if conversion is not None else None
+    finally:
+        db.close()
+
+
+@router.get("/{conversion_id}/stream")
+async def stream_generation(
+    conversion_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """生成中のHTMLをSSEで配信（snapshot / status / delta / reset / done / error）
+
+    このプロセスのワーカーで生成中ならストリームを購読し、それ以外（待機中・別プロセスのワーカー）は
+    ストレージの記録ファイルを追跡する。
+    """
+    try:
+        conversion_service = ConversionService(db)
+        conversion = conversion_service.get_by_id(conversion_id, current_user.id)
+    except ConversionNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
+
+    async def follow():
+        async for event in generation_streams.follow(
+            conversion_id,
+            keepalive_seconds=STREAM_KEEPALIVE_SECONDS,
+            load_final=lambda: run_in_threadpool(_load_final_event, conversion_id)
+        ):
+            yield ": keepalive\n\n" if event is None else _sse_event(event)
+
+    stream = generation_streams.get(conversion_id)
+    if stream is not None:
+        async def relay():
+            finished = False
+            async for event in stream.subscribe(keepalive_seconds=STREAM_KEEPALIVE_SECONDS):
+                if event is None:
+                    # 別プロセスのワーカーに引き継がれて終わっていたら保存済みの結果で閉じる
+                    final = await run_in_threadpool(_load_final_event, conversion_id)
+                    if final is not None and final.event == EVENT_DONE:
+                        generation_streams.finish(conversion_id, final.data)
+                    elif final is not None:
+                        generation_streams.fail(conversion_id, final.data)
+                    yield ": keepalive\n\n"
+                else:
+                    finished = event.event in (EVENT_DONE, EVENT_ERROR)
+                    yield _sse_event(event)
+            if not finished:
+                # ジョブが待機中に戻されてストリームが閉じられた: 記録ファイルの追跡に切り替える
+                async for chunk in follow():
+                    yield chunk
+
+        events = relay()
+    elif conversion.status == Conversion.STATUS_CONVERTING:
+        events = follow()
+    else:
+        # 生成が終わっている場合は保存済みの結果を返す
+        final = _final_event(conversion)
+        if final is None:
+            raise HTTPException(
+                status_code=400,
+                detail={"code": "NOT_GENERATING", "message": "HTML生成が実行されていません"}
+            )
+
+        async def replay():
+            yield _sse_event(final)
+
+        events = replay()
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/{conversion_id}/generate", response_model=ApiResponse[ConversionGenerateResponse])
 async def generate_html(
     conversion_id: int,
+    mode: str = Query(
+        Conversion.EXECUTION_SYNC,
+        description="sync: 通常 / batch: Vision APIをBatch APIで送信（割引料金、完了まで最大24時間）"
+    ),
+    priority: Optional[int] = Query(
+        None, ge=Job.PRIORITY_LOW, le=Job.PRIORITY_HIGH,
+        description="ジョブの優先度（大きいほど先に実行、省略時はbatchモードのみ低優先度）"
+    ),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -198,36 +307,35 @@ async def generate_html(
     try:
         conversion_service = ConversionService(db)
         conversion = conversion_service.get_by_id(conversion_id, current_user.id)
-        user_id = current_user.id  # バックグラウンドタスク用にIDを保存
-
-        # バックグラウンドスレッドで変換実行（即座にレスポンスを返す）
-        def run_conversion():
-            bg_db = SessionLocal()
-            try:
-                bg_conversion_service = ConversionService(bg_db)
-                bg_settings_service = SettingsService(bg_db)
-                bg_conversion = bg_conversion_service.get_by_id(conversion_id, user_id)
-                bg_user_settings = bg_settings_service.get_or_create(user_id)
+        conversion_service.set_execution_mode(conversion, mode)
 
-                _process_conversion(bg_db, bg_conversion, bg_user_settings)
-            except Exception as e:
-                logging.error(f"Background conversion failed: {e}")
-            finally:
-                bg_db.close()
+        # ジョブキューに登録（ワーカー数を超える変換は待機する）
+        if priority is None:
+            priority = Job.PRIORITY_LOW if mode == Conversion.EXECUTION_BATCH else Job.PRIORITY_NORMAL
+        job = JobService(db).enqueue(current_user.id, Job.KIND_CONVERSION, conversion.id, priority)
+        # 前回の結果（エラーなど）を待機中の状態として扱わないよう、登録時点で変換中にする
+        conversion_service.set_converting_status(conversion)
 
-        # スレッドでバックグラウンド実行（メインスレッドをブロックしない）
-        thread = threading.Thread(target=run_conversion, daemon=True)
-        thread.start()
+        if job.status == Job.STATUS_QUEUED:
+            # 前回の生成の記録を破棄し、ワーカーが開始するまでは待機中として配信する
+            generation_streams.discard(conversion.id)
+        job_worker_pool.notify()
 
         return ApiResponse.ok(
             data=ConversionGenerateResponse(
                 id=conversion.id,
+                job_id=job.id,
                 status="converting",
-                message="HTML生成を開始しました"
+                message=(
+                    "Batch APIでHTML生成を開始しました（完了まで時間がかかります）"
+                    if mode == Conversion.EXECUTION_BATCH else "HTML生成を開始しました"
+                )
             )
         )
     except ConversionNotFoundException as e:
         raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
+    except ValidationException as e:
+        raise HTTPException(status_code=422, detail={"code": e.code, "message": e.message})
 
 
 def _insert_images_to_html(html: str, image_urls: list, conversion_id: int) -> str:
@@ -258,102 +366,251 @@ def _insert_images_to_html(html: str, image_urls: list, conversion_id: int) -> s
     return html
 
 
-def _process_conversion(db: Session, conversion, user_settings):
-    """変換処理（バックグラウンドスレッドで実行）"""
+def _save_extracted_image(conversion_service: ConversionService, conversion_id: int, img) -> dict:
+    """抽出画像をストレージとDBに保存し、HTML挿入用の情報を返す"""
+    ext = img.mime_type.split("/")[-1]
+    filename = f"page{img.page_number}_{img.order_in_page}.{ext}"
+    with record_stage(STAGE_IMAGE_WRITE):
+        img_path = file_storage.save_image(conversion_id, filename, img.data)
+
+    with record_stage(STAGE_DB_COMMIT):
+        conversion_service.add_image(
+            conversion_id=conversion_id,
+            filename=filename,
+            file_path=img_path,
+            page_number=img.page_number,
+            order_in_page=img.order_in_page,
+            width=img.width,
+            height=img.height,
+            file_size=len(img.data),
+            mime_type=img.mime_type
+        )
+    return {"filename": filename, "width": img.width, "height": img.height}
+
+
+def _image_url_entry(saved: dict, page_number: int, order_in_page: int) -> dict:
+    """HTMLに挿入する画像の情報"""
+    return {
+        "page": page_number,
+        "order": order_in_page,
+        "filename": saved["filename"],
+        "width": saved["width"],
+        "height": saved["height"]
+    }
+
+
+def _process_conversion(
+    db: Session,
+    conversion,
+    user_settings,
+    is_cancelled: Optional[Callable[[], bool]] = None
+) -> bool:
+    """変換処理（ジョブワーカーで実行、成功したらTrue）
+
+    is_cancelledがTrueを返したらページの区切りでJobCancelledExceptionを送出して中断する。
+    失敗時は計測値を保存してから例外を送出する（変換のステータスは更新しない）
+    """
     import asyncio
-    from app.services import ConversionService, HtmlGeneratorService
+    from app.services import (
+        ConversionService, ConverterRouterService, HtmlGeneratorService, VisionBatchService,
+        ConversionBatchRequestStore
+    )
+    from app.converters.batch import using_batch_store
     from app.services.template_service import TemplateService
     from app.core.security import security_service
 
     conversion_service = ConversionService(db)
     conversion_service.set_converting_status(conversion)
+    # 生成中のHTMLをSSEで配信
+    stream = generation_streams.open(conversion.id)
+    stream.set_status("extracting")
+    # ステージごとの処理時間を計測（成功・失敗どちらも保存）
+    recorder = StageRecorder()
+    converter_type = None
+    page_count = 0
+    started = time.perf_counter()
+    CONVERSIONS_RUNNING.inc()
 
     try:
-        # APIキー復号
-        openai_key = ""
-        anthropic_key = ""
-        if user_settings.openai_api_key_enc:
-            openai_key = security_service.decrypt_api_key(user_settings.openai_api_key_enc) or ""
-        if user_settings.anthropic_api_key_enc:
-            anthropic_key = security_service.decrypt_api_key(user_settings.anthropic_api_key_enc) or ""
-
-        # コンバーター設定（requested_converterを優先）
-        converter_type = conversion.requested_converter or user_settings.current_converter
-        converter_manager = ConverterManager(
-            openai_api_key=openai_key,
-            anthropic_api_key=anthropic_key,
-            openai_model=user_settings.openai_model,
-            anthropic_model=user_settings.anthropic_model,
-            default_converter=converter_type
-        )
-
-        # PDF変換（テキスト抽出）
-        pdf_path = file_storage.get_file_path(conversion.pdf_path)
-        result = converter_manager.convert(str(pdf_path))
-
-        # 画像保存（URLリストを収集）
-        image_urls = []
-        for img in result.images:
-            ext = img.mime_type.split("/")[-1]
-            filename = f"page{img.page_number}_{img.order_in_page}.{ext}"
-            img_path = file_storage.save_image(conversion.id, filename, img.data)
-
-            # HTMLに挿入するための情報を記録
-            image_urls.append({
-                "page": img.page_number,
-                "order": img.order_in_page,
-                "filename": filename,
-                "width": img.width,
-                "height": img.height
-            })
-
-            conversion_service.add_image(
-                conversion_id=conversion.id,
-                filename=filename,
-                file_path=img_path,
-                page_number=img.page_number,
-                order_in_page=img.order_in_page,
-                width=img.width,
-                height=img.height,
-                file_size=len(img.data),
-                mime_type=img.mime_type
+        with recording(recorder):
+            # APIキー復号
+            openai_key = ""
+            anthropic_key = ""
+            if user_settings.openai_api_key_enc:
+                openai_key = security_service.decrypt_api_key(user_settings.openai_api_key_enc) or ""
+            if user_settings.anthropic_api_key_enc:
+                anthropic_key = security_service.decrypt_api_key(user_settings.anthropic_api_key_enc) or ""
+
+            # コンバーター設定（requested_converterを優先）
+            converter_type = conversion.requested_converter or user_settings.current_converter
+            if converter_type == ConverterManager.AUTO:
+                # 事前スキャン結果と過去の実績からコンバーターを自動選択
+                if not conversion.is_prescanned:
+                    with record_stage(STAGE_PRESCAN):
+                        conversion_service.prescan(conversion)
+                decision = ConverterRouterService(db).choose(
+                    conversion,
+                    has_openai_key=bool(openai_key),
+                    has_anthropic_key=bool(anthropic_key)
+                )
+                converter_type = decision.converter
+                conversion.routing_reason = decision.reason
+                db.commit()
+
+            converter_manager = converter_registry.get(
+                user_id=conversion.user_id,
+                openai_api_key=openai_key,
+                anthropic_api_key=anthropic_key,
+                openai_model=user_settings.openai_model,
+                anthropic_model=user_settings.anthropic_model
             )
 
-        # テンプレートを取得
-        template_service = TemplateService(db)
-        template = template_service.get_by_id(conversion.template_id, conversion.user_id)
-
-        # LLMでスタイル付きHTML生成
-        html_generator = HtmlGeneratorService(db)
-        try:
-            # 非同期関数を同期的に実行
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # 同じPDF・コンバーターで抽出済みの変換があれば結果を再利用する
+            conversion_service.start_extraction(conversion, converter_manager.extraction_signature(converter_type))
+            source = None
+            if settings.DEDUP_EXTRACTION:
+                source = conversion_service.find_reusable_extraction(conversion)
+                if source is None and conversion_service.find_inflight_extraction(conversion) is not None:
+                    # 先に始まった同じ抽出の完了を待ってから再利用する
+                    raise JobDeferredException(settings.DEDUP_WAIT_SECONDS)
+
+            if source is not None:
+                with record_stage(STAGE_EXTRACTION_REUSE):
+                    conversion_service.copy_extraction(source, conversion)
+                text = conversion.extracted_text
+                image_urls = conversion.image_placement_list
+                page_count = source.page_count or 0
+                # 抽出していないため、自動選択の実績に使う処理時間は記録しない
+                convert_seconds = None
+                logging.info(f"Reusing extraction of conversion {source.id} for conversion {conversion.id}")
+            else:
+                # PDF変換（ページ単位でストリーミング）
+                # 画像はページごとに保存して解放し、ピークメモリを文書全体ではなくページ単位に抑える
+                pdf_path = file_storage.get_file_path(conversion.pdf_path)
+                converter = converter_manager.get_converter(
+                    converter_type, batch=conversion.execution_mode == Conversion.EXECUTION_BATCH
+                )
+                convert_started = time.perf_counter()
+                page_texts = []
+                image_urls = []
+                saved_by_hash = {}
+                saved_by_position = {}
+
+                # Batch APIモードは送信済みのリクエストを保存し、完了待ちの間はジョブを待機中に戻す
+                with using_batch_store(ConversionBatchRequestStore(conversion.id)):
+                    for page_result in recorder.timed_iter(converter.iter_pages(str(pdf_path)), STAGE_EXTRACT):
+                        if is_cancelled is not None and is_cancelled():
+                            raise JobCancelledException()
+                        page_count += 1
+                        page_texts.append(page_result.text)
+
+                        # 画像保存（URLリストを収集）
+                        # 同一画像は1ファイル・1レコードだけ保存し、出現位置ごとに同じファイルを参照する
+                        for img in page_result.images:
+                            content_hash = image_content_hash(img.data)
+                            saved = saved_by_hash.get(content_hash)
+                            if saved is None:
+                                saved = _save_extracted_image(conversion_service, conversion.id, img)
+                                saved_by_hash[content_hash] = saved
+
+                            for position in img.placements:
+                                saved_by_position[position] = saved
+                                image_urls.append(_image_url_entry(saved, *position))
+
+                        for ref in page_result.image_refs:
+                            saved = saved_by_position.get((ref.source_page_number, ref.source_order_in_page))
+                            if saved is not None:
+                                image_urls.append(_image_url_entry(saved, ref.page_number, ref.order_in_page))
+
+                text = converter.join_page_texts(page_texts)
+                convert_seconds = time.perf_counter() - convert_started
+                conversion_service.save_extraction(conversion, text, image_urls)
+                if conversion.execution_mode == Conversion.EXECUTION_BATCH:
+                    VisionBatchService(db).clear(conversion.id)
+
+            if is_cancelled is not None and is_cancelled():
+                raise JobCancelledException()
+
+            # テンプレートを取得
+            template_service = TemplateService(db)
+            template = template_service.get_by_id(conversion.template_id, conversion.user_id)
+
+            # LLMでスタイル付きHTML生成
+            html_generator = HtmlGeneratorService(db)
+            stream.set_status("generating")
             try:
-                html = loop.run_until_complete(
-                    html_generator.generate_styled_html(result.text, template, user_settings)
+                # 非同期関数を同期的に実行
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                try:
+                    with record_stage(STAGE_HTML_GENERATION, measure_cpu=False):
+                        html = loop.run_until_complete(
+                            html_generator.generate_styled_html(text, template, user_settings, stream=stream)
+                        )
+                finally:
+                    loop.close()
+            except Exception as e:
+                logging.warning(f"LLM HTML generation failed, using basic conversion: {e}")
+                # フォールバック: 基本的なHTML化
+                html = html_generator._basic_html_wrap(text)
+
+            # 画像タグをHTMLに挿入
+            if image_urls:
+                html = _insert_images_to_html(html, image_urls, conversion.id)
+
+            with record_stage(STAGE_DB_COMMIT):
+                conversion_service.set_converted_status(
+                    conversion,
+                    html=html,
+                    converter_used=converter_type,
+                    page_count=page_count,
+                    convert_seconds=convert_seconds
                 )
-            finally:
-                loop.close()
-        except Exception as e:
-            logging.warning(f"LLM HTML generation failed, using basic conversion: {e}")
-            # フォールバック: 基本的なHTML化
-            html = html_generator._basic_html_wrap(result.text)
-
-        # 画像タグをHTMLに挿入
-        if image_urls:
-            html = _insert_images_to_html(html, image_urls, conversion.id)
-
-        conversion_service.set_converted_status(
+            generation_streams.finish(conversion.id, html)
+        succeeded = True
+
+    except (JobDeferredException, JobCancelledException):
+        # 待機中に戻す・キャンセル・ワーカーの停止はジョブワーカーが対象の扱いを決めるため、
+        # 変換のステータス・計測値は更新しない。このプロセスのストリームは閉じ、
+        # 購読中のクライアントは記録ファイルの追跡に切り替える
+        generation_streams.detach(conversion.id)
+        raise
+    except Exception as e:
+        logging.error(f"Conversion failed: {e}")
+        db.rollback()
+        succeeded = False
+        failure = e
+    finally:
+        CONVERSIONS_RUNNING.dec()
+
+    observe_conversion(converter_type, succeeded, time.perf_counter() - started, recorder)
+    _save_stage_metrics(db, conversion, recorder, converter_type, page_count, succeeded)
+    if not succeeded:
+        # 変換のエラー・SSEの終了はジョブワーカー（JobHandler.abort）が行う
+        raise failure
+    return succeeded
+
+
+def _save_stage_metrics(
+    db: Session,
+    conversion,
+    recorder: StageRecorder,
+    converter_type: Optional[str],
+    page_count: int,
+    succeeded: bool
+):
+    """ステージ計測を保存（保存に失敗しても変換結果には影響させない）"""
+    try:
+        ConversionMetricsService(db).save(
             conversion,
-            html=html,
-            converter_used=converter_type,
-            page_count=result.page_count
+            recorder,
+            converter=converter_type,
+            page_count=page_count,
+            succeeded=succeeded
         )
-
     except Exception as e:
-        logging.error(f"Conversion failed: {e}")
-        conversion_service.set_error_status(conversion, str(e))
+        db.rollback()
+        logging.warning(f"ステージ計測の保存に失敗しました: conversion_id={conversion.id}: {e}")
 
 
 @router.patch("/{conversion_id}", response_model=ApiResponse[dict])
@@ -0,0 +1,83 @@
+"""
+ジョブAPI
+変換・テンプレート学習ジョブの状態確認とキャンセル
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api.deps import get_db, get_current_user
+from app.models import Job, User
+from app.schemas import ApiResponse, JobResponse, JobListResponse
+from app.services import JobService
+from app.batch import job_handlers
+from app.core.exceptions import JobNotFoundException, JobNotCancellableException
+
+router = APIRouter(prefix="/jobs", tags=["ジョブ"])
+
+
+@router.get("", response_model=ApiResponse[JobListResponse])
+def get_jobs(
+    status: Optional[str] = Query(None, description="ステータスフィルタ（queued / running / completed / failed / cancelled）"),
+    kind: Optional[str] = Query(None, description="種別フィルタ（conversion / learning）"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """ジョブ一覧取得"""
+    jobs, total = JobService(db).get_list(
+        user_id=current_user.id,
+        status=status,
+        kind=kind,
+        page=page,
+        limit=limit
+    )
+
+    return ApiResponse.ok(
+        data=JobListResponse(
+            items=[JobResponse.model_validate(job) for job in jobs],
+            total=total,
+            page=page,
+            limit=limit,
+            has_next=(page * limit) < total
+        )
+    )
+
+
+@router.get("/{job_id}", response_model=ApiResponse[JobResponse])
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """ジョブ詳細取得"""
+    try:
+        job = JobService(db).get_by_id(job_id, current_user.id)
+        return ApiResponse.ok(data=JobResponse.model_validate(job))
+    except JobNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
+
+
+@router.post("/{job_id}/cancel", response_model=ApiResponse[JobResponse])
+def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """ジョブのキャンセル（実行中の変換はページの区切りで中断）"""
+    try:
+        job = JobService(db).cancel(job_id, current_user.id)
+        if job.status == Job.STATUS_CANCELLED:
+            # 実行前にキャンセルしたジョブは対象の後始末をここで行う
+            handler = job_handlers.get(job.kind)
+            if handler is not None:
+                handler.abort(db, job, job.error_message)
+        return ApiResponse.ok(
+            data=JobResponse.model_validate(job),
+            message="キャンセルしました" if job.status == Job.STATUS_CANCELLED else "キャンセルを要求しました"
+        )
+    except JobNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
+    except JobNotCancellableException as e:
+        raise HTTPException(status_code=400, detail={"code": e.code, "message": e.message})
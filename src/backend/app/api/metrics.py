@@ -0,0 +1,59 @@
+"""
+計測API
+変換ステージごとの処理時間の取得・集計
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api.deps import get_db, get_current_user
+from app.models import User
+from app.schemas import (
+    ApiResponse, StageMetricResponse, ConversionMetricsResponse,
+    StageSummaryResponse, MetricsSummaryResponse
+)
+from app.services import ConversionService, ConversionMetricsService
+from app.core.exceptions import ConversionNotFoundException
+
+router = APIRouter(prefix="/metrics", tags=["計測"])
+
+
+@router.get("/summary", response_model=ApiResponse[MetricsSummaryResponse])
+def get_metrics_summary(
+    days: Optional[int] = Query(None, ge=1, description="集計対象の日数（未指定は全期間）"),
+    converter: Optional[str] = Query(None, description="コンバーターで絞り込み"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """コンバーター・ステージ別の1ページあたり処理時間（p50/p95）"""
+    metrics_service = ConversionMetricsService(db)
+    summaries = metrics_service.summary(current_user.id, days=days, converter=converter)
+
+    return ApiResponse.ok(
+        data=MetricsSummaryResponse(
+            items=[StageSummaryResponse(**summary) for summary in summaries]
+        )
+    )
+
+
+@router.get("/conversions/{conversion_id}", response_model=ApiResponse[ConversionMetricsResponse])
+def get_conversion_metrics(
+    conversion_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """変換のステージ別計測値"""
+    try:
+        conversion = ConversionService(db).get_by_id(conversion_id, current_user.id)
+        metrics = ConversionMetricsService(db).get_for_conversion(conversion_id, current_user.id)
+
+        return ApiResponse.ok(
+            data=ConversionMetricsResponse(
+                conversion_id=conversion_id,
+                stages=[StageMetricResponse.model_validate(metric) for metric in metrics],
+                cache_read_tokens=conversion.cache_read_tokens or 0,
+                cache_write_tokens=conversion.cache_write_tokens or 0
+            )
+        )
+    except ConversionNotFoundException as e:
+        raise HTTPException(status_code=404, detail={"code": e.code, "message": e.message})
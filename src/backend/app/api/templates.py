@@ -3,18 +3,18 @@
 テンプレートのCRUD、学習実行
 """
 import json
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.api.deps import get_db, get_current_user
-from app.models import User
-from app.infrastructure.database import SessionLocal
+from app.models import Job, User
 from app.schemas import (
     ApiResponse, TemplateCreate, TemplateResponse,
     TemplateDetailResponse, TemplateListResponse, LearnResponse
 )
-from app.services import TemplateService, LearningService, SettingsService
+from app.services import TemplateService, JobService
+from app.batch import job_worker_pool
 from app.core.exceptions import (
     TemplateNotFoundException, TemplateHasConversionsException,
     TemplateNotReadyException
@@ -124,7 +124,6 @@ def delete_template(
 @router.post("/{template_id}/learn", response_model=ApiResponse[LearnResponse])
 async def learn_template(
     template_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -132,27 +131,15 @@ async def learn_template(
     try:
         template_service = TemplateService(db)
         template = template_service.get_by_id(template_id, current_user.id)
-        user_id = current_user.id  # Save IDs for background task
 
-        # バックグラウンドで学習実行（新しいDBセッションを使用）
-        async def run_learning():
-            bg_db = SessionLocal()
-            try:
-                bg_template_service = TemplateService(bg_db)
-                bg_settings_service = SettingsService(bg_db)
-                bg_template = bg_template_service.get_by_id(template_id, user_id)
-                bg_user_settings = bg_settings_service.get_or_create(user_id)
-
-                learning_service = LearningService(bg_db)
-                await learning_service.learn_from_urls(bg_template, bg_user_settings)
-            finally:
-                bg_db.close()
-
-        background_tasks.add_task(run_learning)
+        # ジョブキューで学習を実行（テンプレートは変換の前提になるため優先する）
+        job = JobService(db).enqueue(current_user.id, Job.KIND_LEARNING, template.id, Job.PRIORITY_HIGH)
+        job_worker_pool.notify()
 
         return ApiResponse.ok(
             data=LearnResponse(
                 id=template.id,
+                job_id=job.id,
                 status="learning",
                 message="学習処理を開始しました"
             )
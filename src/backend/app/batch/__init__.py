@@ -0,0 +1,18 @@
+"""
+ジョブ実行
+DBのジョブキューから変換・テンプレート学習を取り出して実行するワーカー
+"""
+from app.batch.handlers import JobHandler, ConversionJobHandler, LearningJobHandler, job_handlers
+from app.batch.queue import CancelCheck, Heartbeat, JobWorkerPool, job_worker_pool, recover_abandoned_jobs
+
+__all__ = [
+    "JobHandler",
+    "ConversionJobHandler",
+    "LearningJobHandler",
+    "job_handlers",
+    "CancelCheck",
+    "Heartbeat",
+    "JobWorkerPool",
+    "job_worker_pool",
+    "recover_abandoned_jobs"
+]
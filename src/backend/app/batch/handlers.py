@@ -0,0 +1,80 @@
+"""
+ジョブハンドラー
+ジョブの種別ごとの実行処理
+"""
+from abc import ABC, abstractmethod
+from typing import Callable, Dict
+import asyncio
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.models import Conversion, Job, Template
+from app.services import ConversionService, LearningService, SettingsService, TemplateService
+from app.core.exceptions import ConversionNotFoundException, TemplateNotFoundException
+from app.infrastructure.generation_stream import generation_streams
+
+logger = logging.getLogger(__name__)
+
+
+class JobHandler(ABC):
+    """ジョブハンドラーの基底クラス"""
+
+    KIND: str = ""
+
+    @abstractmethod
+    def run(self, db: Session, job: Job, is_cancelled: Callable[[], bool]) -> bool:
+        """ジョブを実行（成功したらTrue）"""
+        pass
+
+    @abstractmethod
+    def abort(self, db: Session, job: Job, message: str):
+        """失敗・キャンセルしたジョブの対象を後始末する（ワーカーの停止で待機中に戻したジョブには呼ばない）"""
+        pass
+
+
+class ConversionJobHandler(JobHandler):
+    """PDF変換・HTML生成"""
+
+    KIND = Job.KIND_CONVERSION
+
+    def run(self, db: Session, job: Job, is_cancelled: Callable[[], bool]) -> bool:
+        from app.api.conversions import _process_conversion
+
+        conversion = db.query(Conversion).filter(Conversion.id == job.target_id).first()
+        if conversion is None:
+            raise ConversionNotFoundException(job.target_id)
+        user_settings = SettingsService(db).get_or_create(job.user_id)
+        return _process_conversion(db, conversion, user_settings, is_cancelled=is_cancelled)
+
+    def abort(self, db: Session, job: Job, message: str):
+        conversion = db.query(Conversion).filter(Conversion.id == job.target_id).first()
+        if conversion is not None and conversion.status == Conversion.STATUS_CONVERTING:
+            ConversionService(db).set_error_status(conversion, message)
+        generation_streams.fail(job.target_id, message)
+
+
+class LearningJobHandler(JobHandler):
+    """テンプレートのURL学習"""
+
+    KIND = Job.KIND_LEARNING
+
+    def run(self, db: Session, job: Job, is_cancelled: Callable[[], bool]) -> bool:
+        template = db.query(Template).filter(Template.id == job.target_id).first()
+        if template is None:
+            raise TemplateNotFoundException(job.target_id)
+        user_settings = SettingsService(db).get_or_create(job.user_id)
+        # 失敗時のテンプレートのエラー化はabortで行う（キャンセル・中断はURLの区切りで確認）
+        asyncio.run(LearningService(db).learn_from_urls(template, user_settings, is_cancelled=is_cancelled))
+        return True
+
+    def abort(self, db: Session, job: Job, message: str):
+        template = db.query(Template).filter(Template.id == job.target_id).first()
+        if template is not None and template.status == Template.STATUS_LEARNING:
+            TemplateService(db).set_error_status(template, message)
+
+
+# 種別ごとのハンドラー
+job_handlers: Dict[str, JobHandler] = {
+    handler.KIND: handler for handler in (ConversionJobHandler(), LearningJobHandler())
+}
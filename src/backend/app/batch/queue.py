@@ -0,0 +1,291 @@
+"""
+ジョブワーカープール
+DBのジョブキューから優先度順にジョブを取り出し、決まった数のワーカースレッドで実行する
+APIサーバー内でも、別プロセスのワーカー（app.batch.worker）でも同じプールを使う
+"""
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import socket
+import threading
+import time
+
+from app.core.config import settings
+from app.infrastructure.database import SessionLocal
+from app.models import Job
+from app.services.job_service import JobService
+from app.batch.handlers import JobHandler, job_handlers
+from app.core.exceptions import JobCancelledException, JobDeferredException
+
+logger = logging.getLogger(__name__)
+
+# 実行中のジョブのキャンセルを確認する間隔（秒）
+CANCEL_CHECK_SECONDS = 2.0
+
+
+class CancelCheck:
+    """実行中のジョブのキャンセル要求を確認する（DBへの問い合わせは一定間隔に抑える）
+
+    interruptedがTrueを返した場合（ワーカーの停止・リース切れ）もキャンセルと同様に中断させる
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        interval: float = CANCEL_CHECK_SECONDS,
+        interrupted: Optional[Callable[[], bool]] = None
+    ):
+        self.job_id = job_id
+        self.interval = interval
+        self.interrupted = interrupted
+        self.cancelled = False
+        self._checked_at = 0.0
+
+    def __call__(self) -> bool:
+        if self.cancelled:
+            return True
+        if self.interrupted is not None and self.interrupted():
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return False
+        self._checked_at = now
+        db = SessionLocal()
+        try:
+            self.cancelled = JobService(db).is_cancel_requested(self.job_id)
+        finally:
+            db.close()
+        return self.cancelled
+
+
+class Heartbeat:
+    """実行中のジョブのリースを一定間隔で延長するスレッド
+
+    リースが他のワーカーに移っていた場合はlostをTrueにして終了する
+    """
+
+    def __init__(self, job_id: int, worker_id: str, interval: Optional[float] = None):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval if interval is not None else settings.JOB_HEARTBEAT_SECONDS
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread = threading.Thread(
+            target=self._run, name=f"job-heartbeat-{self.job_id}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                extended = JobService(db).heartbeat(self.job_id, self.worker_id)
+            except Exception as e:
+                # DBに一時的に接続できない場合は次の間隔で再試行する
+                logger.warning(f"ジョブのリースを延長できませんでした: {self.job_id}: {e}")
+                continue
+            finally:
+                db.close()
+            if not extended:
+                logger.warning(f"ジョブのリースが切れました: {self.job_id}")
+                self.lost = True
+                return
+
+
+def recover_abandoned_jobs():
+    """リースが切れたジョブを待機中に戻し、再実行できないジョブの対象をエラーにする"""
+    db = SessionLocal()
+    try:
+        for job in JobService(db).recover_abandoned():
+            handler = job_handlers.get(job.kind)
+            if handler is not None:
+                handler.abort(db, job, job.error_message)
+    finally:
+        db.close()
+
+
+class JobWorkerPool:
+    """ジョブを実行するワーカースレッドのプール
+
+    同時に実行するジョブ数をワーカー数までに制限する。登録時にnotifyで待機中のワーカーを起こし、
+    それ以外はpoll_secondsごとにキューを確認する。実行中のジョブはハートビートでリースを延長し、
+    別スレッドで他のワーカーのリース切れのジョブを定期的に再登録する。
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        kinds: Optional[List[str]] = None
+    ):
+        self.workers = workers if workers is not None else settings.JOB_WORKERS
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.JOB_POLL_SECONDS
+        self.handlers = handlers if handlers is not None else job_handlers
+        self.kinds = kinds  # 実行するジョブ種別（Noneはすべて）
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads: List[threading.Thread] = []
+        self._reaper: Optional[threading.Thread] = None
+        self._wakeup = threading.Condition()
+        self._pending_wakeups = 0
+        self._stopped = False
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """ワーカースレッドを起動"""
+        if self._threads or not self.workers:
+            return
+        self._stopped = False
+        self._stop_event.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(f"{self.worker_prefix}:{index}",),
+                name=f"job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        self._reaper = threading.Thread(target=self._reap, name="job-reaper", daemon=True)
+        self._reaper.start()
+        logger.info(f"ジョブワーカーを起動しました（{self.workers}スレッド）")
+
+    def notify(self, count: int = 1):
+        """ジョブの登録を通知して待機中のワーカーを起こす（ジョブ数とワーカー数の少ない方）"""
+        count = min(count, self.workers)
+        if count <= 0:
+            return
+        with self._wakeup:
+            self._pending_wakeups += count
+            self._wakeup.notify(count)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """ワーカーを停止
+
+        実行中のジョブには中断を要求し、ページの区切りで止まったジョブは待機中に戻して
+        他のワーカーに引き継ぐ。timeout秒以内に止まらなかったジョブはリース切れ後に再実行される。
+        """
+        timeout = timeout if timeout is not None else settings.JOB_SHUTDOWN_SECONDS
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+        self._stop_event.set()
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        running = sum(1 for thread in self._threads if thread.is_alive())
+        if running:
+            logger.warning(f"実行中のジョブ{running}件の中断を待たずに停止します（リース切れ後に再実行されます）")
+        if self._reaper is not None:
+            self._reaper.join(timeout=1.0)
+        self._threads = []
+        self._reaper = None
+
+    def _wait(self):
+        """通知があるかpoll_seconds経過するまで待つ"""
+        with self._wakeup:
+            if self._pending_wakeups == 0 and not self._stopped:
+                self._wakeup.wait(timeout=self.poll_seconds)
+            self._pending_wakeups = max(0, self._pending_wakeups - 1)
+
+    def _run(self, worker_id: str):
+        """ジョブを取り出して実行し続ける"""
+        while not self._stopped:
+            try:
+                executed = self.run_next(worker_id)
+            except Exception as e:
+                logger.error(f"ジョブの取り出しに失敗しました: {e}")
+                executed = False
+            if not executed:
+                self._wait()
+
+    def _reap(self):
+        """リース切れのジョブを定期的に再登録する"""
+        interval = max(settings.JOB_LEASE_SECONDS / 2, self.poll_seconds)
+        while True:
+            try:
+                recover_abandoned_jobs()
+            except Exception as e:
+                logger.error(f"中断されたジョブの再登録に失敗しました: {e}")
+            if self._stop_event.wait(interval):
+                return
+
+    def run_next(self, worker_id: str) -> bool:
+        """待機中のジョブを1件実行（ジョブがなければFalse）"""
+        db = SessionLocal()
+        try:
+            job_service = JobService(db)
+            job = job_service.claim_next(worker_id, self.kinds)
+            if job is None:
+                return False
+            self._execute(db, job_service, job)
+            return True
+        finally:
+            db.close()
+
+    def _execute(self, db, job_service: JobService, job: Job):
+        """ジョブを実行して結果を記録"""
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            job_service.fail(job, f"不明なジョブ種別: {job.kind}")
+            return
+
+        logger.info(f"ジョブを開始します: {job}（{job.attempts}回目）")
+        heartbeat = Heartbeat(job.id, job.worker_id)
+        cancel_check = CancelCheck(job.id, interrupted=lambda: self._stopped or heartbeat.lost)
+        error_message = None
+        deferred: Optional[JobDeferredException] = None
+        interrupted = False
+        with heartbeat:
+            try:
+                succeeded = handler.run(db, job, cancel_check)
+            except JobDeferredException as e:
+                succeeded = False
+                deferred = e
+            except JobCancelledException:
+                # キャンセル要求・ワーカーの停止・リース切れで中断した（対象の扱いは下で決める）
+                db.rollback()
+                succeeded = False
+                interrupted = True
+            except Exception as e:
+                db.rollback()
+                logger.error(f"ジョブが失敗しました: {job}: {e}")
+                succeeded = False
+                error_message = str(e)
+
+        if heartbeat.lost:
+            # 他のワーカーが再実行しているため結果は記録せず、対象・SSEにも触れない
+            logger.warning(f"リースが切れたジョブを中断しました: {job}")
+            return
+        if deferred is not None:
+            # 同じ入力の処理が終わるまで待機中に戻す（キャンセル要求は次の実行で確認する）
+            if job_service.release(job, delay=deferred.retry_after):
+                logger.info(f"ジョブを{deferred.retry_after:g}秒後に再実行します: {job}（{deferred.message}）")
+            return
+        if succeeded:
+            job_service.complete(job)
+        elif cancel_check.cancelled:
+            # ユーザーのキャンセル（中断前に失敗していた場合はそのエラーを残す）
+            handler.abort(db, job, error_message or "キャンセルされました")
+            job_service.mark_cancelled(job)
+        elif interrupted and self._stopped:
+            # ワーカーの停止で中断したジョブは対象をそのままにして他のワーカーに引き継ぐ
+            if job_service.release(job):
+                logger.info(f"ジョブを待機中に戻しました: {job}")
+            return
+        else:
+            error_message = error_message or ("ジョブが中断されました" if interrupted else "処理に失敗しました")
+            handler.abort(db, job, error_message)
+            job_service.fail(job, error_message)
+        logger.info(f"ジョブが終了しました: {job}")
+
+
+# シングルトンインスタンス
+job_worker_pool = JobWorkerPool()
@@ -0,0 +1,105 @@
+"""
+ジョブワーカー
+APIサーバーとは別のプロセスでジョブキューの変換・テンプレート学習を実行する
+
+    python -m app.batch.worker [--workers N] [--kind conversion]
+
+データベースとストレージディレクトリ（STORAGE_PATH）はAPIサーバーと共有する。
+--metrics-port（WORKER_METRICS_PORT）を指定するとワーカーのメトリクスをPrometheus形式で公開する。
+APIサーバーで実行しない場合はJOB_WORKERS=0にする。
+SIGTERM・SIGINTで実行中のジョブを中断して待機中に戻してから終了する（2回目のシグナルで即座に終了）。
+"""
+from typing import List, Optional
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from app.core.config import settings
+from app.infrastructure.database import init_db
+from app.models import Job
+from app.converters.parallel import shutdown_page_pool
+from app.converters.batch import vision_batch_scheduler
+from app.infrastructure.api_clients import api_client_pool
+from app.infrastructure.monitoring import start_metrics_server
+from app.batch.queue import JobWorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(prog="python -m app.batch.worker", description="RePage PDF ジョブワーカー")
+    parser.add_argument(
+        "--workers", type=int, default=max(settings.JOB_WORKERS, 1),
+        help="同時に実行するジョブ数"
+    )
+    parser.add_argument(
+        "--kind", action="append", choices=[Job.KIND_CONVERSION, Job.KIND_LEARNING],
+        help="実行するジョブ種別（複数指定可、省略時はすべて）"
+    )
+    parser.add_argument(
+        "--poll-seconds", type=float, default=settings.JOB_POLL_SECONDS,
+        help="待機中のジョブを確認する間隔（秒）"
+    )
+    parser.add_argument(
+        "--shutdown-seconds", type=float, default=settings.JOB_SHUTDOWN_SECONDS,
+        help="停止時に実行中のジョブの中断を待つ時間（秒）"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=settings.WORKER_METRICS_PORT,
+        help="メトリクスを公開するポート（0で公開しない）"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ワーカーを起動して停止シグナルまでジョブを実行"""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if settings.DEBUG else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    if args.workers < 1:
+        logger.error("--workersは1以上を指定してください")
+        return 2
+
+    init_db()
+    pool = JobWorkerPool(workers=args.workers, poll_seconds=args.poll_seconds, kinds=args.kind)
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"停止シグナルを受信しました（{signal.Signals(signum).name}）")
+        # 2回目のシグナルでは中断を待たずに終了する
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        stop_requested.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    metrics_server = None
+    if settings.METRICS_ENABLED and args.metrics_port:
+        metrics_server = start_metrics_server(args.metrics_port, settings.WORKER_METRICS_HOST)
+        logger.info(f"メトリクスを公開しています: http://{settings.WORKER_METRICS_HOST}:{args.metrics_port}/metrics")
+
+    pool.start()
+    logger.info(f"実行するジョブ種別: {', '.join(args.kind) if args.kind else 'すべて'}")
+    # シグナルハンドラーはメインスレッドで実行されるため、短い間隔で待つ
+    while not stop_requested.wait(1.0):
+        pass
+
+    logger.info("実行中のジョブを中断して停止します")
+    pool.shutdown(timeout=args.shutdown_seconds)
+    shutdown_page_pool()
+    vision_batch_scheduler.shutdown()
+    api_client_pool.close()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    logger.info("ジョブワーカーを停止しました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,17 +3,26 @@ PDFコンバーター
 Strategy Patternによる複数コンバーター切り替え
 """
 from app.converters.base import (
-    ConverterInterface, ExtractedImage, Table, ConversionResult
+    ConverterInterface, ExtractedImage, ImageReference, Table, ConversionResult, PageResult,
+    attach_image_references, image_content_hash, merge_duplicate_images
 )
+from app.converters.document import PdfDocument, PdfSource, open_document
 from app.converters.pymupdf_converter import PyMuPDFConverter
 from app.converters.pdfplumber_converter import PdfPlumberConverter
+from app.converters.vision_base import VisionConverter
 from app.converters.openai_converter import OpenAIVisionConverter
 from app.converters.claude_converter import ClaudeVisionConverter
+from app.converters.hybrid_converter import HybridConverter
+from app.converters.composite_converter import CompositeConverter
 from app.converters.manager import ConverterManager
+from app.converters.registry import ConverterRegistry, converter_registry
 
 __all__ = [
-    "ConverterInterface", "ExtractedImage", "Table", "ConversionResult",
+    "ConverterInterface", "ExtractedImage", "Table", "ConversionResult", "PageResult",
+    "ImageReference", "attach_image_references", "image_content_hash", "merge_duplicate_images",
+    "PdfDocument", "PdfSource", "open_document",
     "PyMuPDFConverter", "PdfPlumberConverter",
-    "OpenAIVisionConverter", "ClaudeVisionConverter",
-    "ConverterManager"
+    "VisionConverter", "OpenAIVisionConverter", "ClaudeVisionConverter", "HybridConverter",
+    "CompositeConverter",
+    "ConverterManager", "ConverterRegistry", "converter_registry"
 ]
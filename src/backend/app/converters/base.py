@@ -3,19 +3,75 @@
 Strategy Patternの抽象クラス定義
 """
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
 
+from app.converters.document import PdfSource, open_document
 
 @dataclass
 class ExtractedImage:
-    """抽出画像データクラス"""
+    """抽出画像データクラス
+
+    同じ画像が複数箇所に現れる場合は1つにまとめ、
+    2箇所目以降の(page_number, order_in_page)をoccurrencesに持つ
+    """
     data: bytes
     page_number: int
     order_in_page: int
     width: int
     height: int
     mime_type: str
+    occurrences: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def placements(self) -> List[Tuple[int, int]]:
+        """この画像が現れるすべての位置（ページ順）"""
+        return sorted([(self.page_number, self.order_in_page)] + self.occurrences)
+
+    def add_occurrence(self, other: "ExtractedImage"):
+        """同一画像の出現位置を追加"""
+        self.occurrences.append((other.page_number, other.order_in_page))
+        self.occurrences.extend(other.occurrences)
+
+
+@dataclass
+class ImageReference:
+    """抽出済み画像の再出現（画像データを持たずに最初の出現位置を参照する）"""
+    page_number: int
+    order_in_page: int
+    source_page_number: int
+    source_order_in_page: int
+
+
+def image_content_hash(data: bytes) -> str:
+    """画像データの内容ハッシュ"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def merge_duplicate_images(images: List[ExtractedImage]) -> List[ExtractedImage]:
+    """内容が同一の画像を最初の1つにまとめる（出現位置はoccurrencesに移す）"""
+    unique: Dict[str, ExtractedImage] = {}
+    for image in images:
+        key = image_content_hash(image.data)
+        first = unique.get(key)
+        if first is None:
+            unique[key] = image
+        else:
+            first.add_occurrence(image)
+    return list(unique.values())
+
+
+def attach_image_references(
+    images: List[ExtractedImage], image_refs: List[ImageReference]
+) -> List[ExtractedImage]:
+    """再出現の参照を、参照先画像のoccurrencesに移す"""
+    by_position = {(img.page_number, img.order_in_page): img for img in images}
+    for ref in image_refs:
+        source = by_position.get((ref.source_page_number, ref.source_order_in_page))
+        if source is not None:
+            source.occurrences.append((ref.page_number, ref.order_in_page))
+    return images
 
 
 @dataclass
@@ -26,6 +82,19 @@ class Table:
     page_number: int
 
 
+@dataclass
+class PageResult:
+    """ページ単位の抽出結果データクラス
+
+    image_refsは、それより前のページで抽出済みの画像がこのページに再出現した位置
+    """
+    page_number: int
+    text: str
+    images: List[ExtractedImage]
+    tables: List[Table]
+    image_refs: List[ImageReference] = field(default_factory=list)
+
+
 @dataclass
 class ConversionResult:
     """変換結果データクラス"""
@@ -39,30 +108,55 @@ class ConverterInterface(ABC):
     """コンバーター抽象基底クラス"""
 
     @abstractmethod
-    def extract_text(self, pdf_path: str) -> str:
+    def extract_text(self, source: PdfSource) -> str:
         """PDFからテキストを抽出"""
         pass
 
     @abstractmethod
-    def extract_images(self, pdf_path: str) -> List[ExtractedImage]:
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
         """PDFから画像を抽出"""
         pass
 
     @abstractmethod
-    def extract_tables(self, pdf_path: str) -> List[Table]:
+    def extract_tables(self, source: PdfSource) -> List[Table]:
         """PDFから表を抽出"""
         pass
 
     @abstractmethod
-    def get_page_count(self, pdf_path: str) -> int:
+    def get_page_count(self, source: PdfSource) -> int:
         """ページ数を取得"""
         pass
 
-    def convert(self, pdf_path: str) -> ConversionResult:
-        """PDF変換を実行（テンプレートメソッド）"""
-        return ConversionResult(
-            text=self.extract_text(pdf_path),
-            images=self.extract_images(pdf_path),
-            tables=self.extract_tables(pdf_path),
-            page_count=self.get_page_count(pdf_path)
-        )
+    def convert(self, source: PdfSource) -> ConversionResult:
+        """PDF変換を実行（テンプレートメソッド）
+
+        PDFは1度だけ開き、同じセッションを全ステージに渡す
+        """
+        with open_document(source) as doc:
+            return ConversionResult(
+                text=self.extract_text(doc),
+                images=self.extract_images(doc),
+                tables=self.extract_tables(doc),
+                page_count=self.get_page_count(doc)
+            )
+
+    def iter_pages(self, source: PdfSource) -> Iterator[PageResult]:
+        """ページ単位の結果をページ順に返す（ストリーミング）
+
+        既定の実装は文書全体を変換してからページごとに分けるため、メモリは削減されない。
+        テキストは先頭ページにまとめて入れる（join_page_textsで元の全文に戻る）。
+        """
+        with open_document(source) as doc:
+            result = self.convert(doc)
+
+        for page_number in range(1, result.page_count + 1):
+            yield PageResult(
+                page_number=page_number,
+                text=result.text if page_number == 1 else "",
+                images=[img for img in result.images if img.page_number == page_number],
+                tables=[table for table in result.tables if table.page_number == page_number]
+            )
+
+    def join_page_texts(self, texts: List[str]) -> str:
+        """iter_pagesで得たページ単位のテキストを文書全体のテキストに結合"""
+        return "\n\n".join(text for text in texts if text)
@@ -0,0 +1,445 @@
+"""
+Vision Batch API
+ページ単位のVisionリクエストをプロバイダーのBatch API（非同期・割引料金）でまとめて処理する
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import io
+import json
+import logging
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.infrastructure.rate_limiter import is_retryable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRequest:
+    """Batch APIに送る1ページ分のリクエスト"""
+    custom_id: str
+    params: Dict[str, Any]  # プロバイダーのリクエストボディ（model・messages・max_tokens）
+    size: int = 0  # リクエストのおおよそのバイト数
+
+    @classmethod
+    def create(cls, params: Dict[str, Any]) -> "BatchRequest":
+        """custom_idを採番してリクエストを作成"""
+        return cls(
+            custom_id=uuid.uuid4().hex,
+            params=params,
+            size=len(json.dumps(params, ensure_ascii=False))
+        )
+
+
+class BatchFailedException(Exception):
+    """Batchが失敗・期限切れ・キャンセルになった"""
+    pass
+
+
+# 保存済みリクエストのステータス（VisionBatchRequest.STATUS_*と同じ値）
+REQUEST_SUBMITTED = "submitted"
+REQUEST_COMPLETED = "completed"
+REQUEST_FAILED = "failed"
+
+
+@dataclass
+class StoredBatchRequest:
+    """保存済みのBatchリクエスト（1ページ分）"""
+    page_index: int
+    custom_id: str
+    batch_id: Optional[str]  # Batchの作成前はNone
+    status: str  # submitted / completed / failed
+    created_at: datetime
+    cache_key: Optional[str] = None
+    content: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class BatchRequestStore(ABC):
+    """送信済みのBatchリクエストの保存先（変換ごと）
+
+    変換の処理中にusing_batch_store()で設定すると、Visionコンバーターは完了を待たずに
+    VisionBatchPendingExceptionを送出し、ジョブの再実行時に保存済みのリクエストから結果を取得する。
+    Batchの作成結果はBatch送信スレッドから書き込むため、スレッドセーフに実装する。
+    """
+
+    @abstractmethod
+    def load(self, request_key: str) -> Dict[int, StoredBatchRequest]:
+        """プロンプトごとの保存済みリクエスト（ページ番号がキー）"""
+        pass
+
+    @abstractmethod
+    def add(self, request_key: str, provider: str, requests: List[Tuple[int, Optional[str], BatchRequest]]):
+        """送信待ちに追加したリクエストを保存（ページ番号・キャッシュキー・リクエスト）"""
+        pass
+
+    @abstractmethod
+    def set_batch_id(self, custom_ids: List[str], batch_id: str):
+        """Batchの作成後にBatch IDを保存"""
+        pass
+
+    @abstractmethod
+    def set_results(self, contents: Dict[str, Optional[str]]):
+        """custom_idごとの応答を保存"""
+        pass
+
+    @abstractmethod
+    def set_failed(self, custom_ids: List[str], message: str):
+        """Batchの作成に失敗したリクエストを記録"""
+        pass
+
+    @abstractmethod
+    def remove(self, custom_ids: List[str]):
+        """リクエストを削除（次の実行で送り直す）"""
+        pass
+
+
+_current_store: ContextVar[Optional[BatchRequestStore]] = ContextVar("batch_request_store", default=None)
+
+
+def get_batch_store() -> Optional[BatchRequestStore]:
+    """現在の保存先を取得"""
+    return _current_store.get()
+
+
+@contextmanager
+def using_batch_store(store: Optional[BatchRequestStore]) -> Iterator[Optional[BatchRequestStore]]:
+    """ブロック内のBatchリクエストを指定した保存先に保存する"""
+    token = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(token)
+
+
+class VisionBatchClient(ABC):
+    """プロバイダーのBatch APIクライアント
+
+    SDKクライアントを受け取るため、base_urlをローカルのスタンドインサーバーに向けたクライアントで
+    テストできる。
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    @abstractmethod
+    def create(self, requests: List[BatchRequest]) -> str:
+        """Batchを作成してIDを返す"""
+        pass
+
+    @abstractmethod
+    def is_done(self, batch_id: str) -> bool:
+        """Batchが完了したかどうか（失敗・期限切れはBatchFailedException）"""
+        pass
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """custom_idごとの応答テキスト（失敗したリクエストはNone、結果にないリクエストも失敗として扱う）"""
+        pass
+
+
+class AnthropicBatchClient(VisionBatchClient):
+    """Anthropic Message Batches API"""
+
+    def create(self, requests: List[BatchRequest]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[{"custom_id": r.custom_id, "params": r.params} for r in requests]
+        )
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        # 期限切れ・キャンセルされたリクエストも結果に含まれる（resultsでNoneになる）
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        contents: Dict[str, Optional[str]] = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                contents[entry.custom_id] = entry.result.message.content[0].text
+            else:
+                logger.warning(f"Batchリクエストが失敗: {entry.custom_id} ({entry.result.type})")
+                contents[entry.custom_id] = None
+        return contents
+
+
+class OpenAIBatchClient(VisionBatchClient):
+    """OpenAI Batch API（JSONLファイルをアップロードして作成）"""
+
+    ENDPOINT = "/v1/chat/completions"
+    FAILED_STATUSES = {"failed", "expired", "cancelled"}
+
+    def create(self, requests: List[BatchRequest]) -> str:
+        lines = [
+            json.dumps({"custom_id": r.custom_id, "method": "POST", "url": self.ENDPOINT, "body": r.params})
+            for r in requests
+        ]
+        input_file = self.client.files.create(
+            file=("batch.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window="24h"
+        )
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in self.FAILED_STATUSES and not batch.output_file_id and not batch.error_file_id:
+            raise BatchFailedException(f"OpenAI Batch {batch_id} が終了しました: {batch.status}")
+        return batch.status == "completed" or batch.status in self.FAILED_STATUSES
+
+    def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        batch = self.client.batches.retrieve(batch_id)
+        contents: Dict[str, Optional[str]] = {}
+        # 失敗したリクエスト（期限切れで処理されなかったものを含む）は出力ファイルではなくエラーファイルに入る
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200:
+                    contents[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    logger.warning(f"Batchリクエストが失敗: {entry['custom_id']} ({entry.get('error')})")
+                    contents[entry["custom_id"]] = None
+        return contents
+
+
+# (プロバイダー, APIキーのハッシュ, モデル): OpenAIのBatchは1モデルのみのため分ける
+GroupKey = Tuple[str, str, str]
+
+# 完了したBatchの応答を保持する件数（同じBatchに含まれる変換で使い回す）
+RESULT_CACHE_SIZE = 4
+# 送信待ちのリクエストが作成されないまま経過したら送り直すまでの猶予（秒、collect_secondsに加える）
+SUBMIT_GRACE_SECONDS = 300
+
+
+@dataclass
+class _PendingGroup:
+    """送信待ちのリクエスト"""
+    client: VisionBatchClient
+    created_at: float
+    entries: List[Tuple[BatchRequest, Future, Optional[BatchRequestStore]]] = field(default_factory=list)
+    size: int = 0
+
+
+class VisionBatchScheduler:
+    """複数の変換のページリクエストをまとめてBatch APIに送る
+
+    リクエストはプロバイダー・APIキー・モデルごとに集め、最初のリクエストから
+    collect_seconds経過するか、件数・サイズの上限に達したら1つのBatchとして送信する。
+    送信したBatchのIDはFutureと保存先（BatchRequestStore）に渡す。Batchの完了は呼び出し側が
+    check()で確認するため、完了待ちの間ジョブのワーカーを占有しない。
+    """
+
+    def __init__(
+        self,
+        collect_seconds: Optional[float] = None,
+        poll_seconds: Optional[float] = None,
+        max_requests: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.collect_seconds = collect_seconds if collect_seconds is not None else settings.VISION_BATCH_COLLECT_SECONDS
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.VISION_BATCH_POLL_SECONDS
+        self.max_requests = max_requests or settings.VISION_BATCH_MAX_REQUESTS
+        self.max_bytes = max_bytes or settings.VISION_BATCH_MAX_MB * 1024 * 1024
+
+        self._pending: Dict[GroupKey, _PendingGroup] = {}
+        self._ready: List[Tuple[GroupKey, _PendingGroup]] = []
+        self._queued_ids: set = set()
+        self._checked_at: "OrderedDict[str, float]" = OrderedDict()
+        self._results: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def submit_timeout(self) -> float:
+        """送信待ちのリクエストがBatchとして作成されるまでの最大の待ち時間（秒）"""
+        return self.collect_seconds + SUBMIT_GRACE_SECONDS
+
+    def submit(
+        self,
+        group_key: GroupKey,
+        client: VisionBatchClient,
+        requests: List[BatchRequest],
+        store: Optional[BatchRequestStore] = None
+    ) -> List[Future]:
+        """リクエストを送信待ちに追加（リクエスト順に、作成したBatchのIDを返すFuture）"""
+        futures = []
+        with self._lock:
+            self._ensure_thread()
+            for request in requests:
+                group = self._pending.get(group_key)
+                if group is None or self._is_full(group, request):
+                    if group is not None:
+                        self._ready.append((group_key, self._pending.pop(group_key)))
+                    group = _PendingGroup(client=client, created_at=time.monotonic())
+                    self._pending[group_key] = group
+                future: Future = Future()
+                group.entries.append((request, future, store))
+                group.size += request.size
+                self._queued_ids.add(request.custom_id)
+                futures.append(future)
+        self._wakeup.set()
+        return futures
+
+    def is_queued(self, custom_id: str) -> bool:
+        """このプロセスで送信待ちのリクエストかどうか"""
+        with self._lock:
+            return custom_id in self._queued_ids
+
+    def check(self, client: VisionBatchClient, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Batchの完了を確認し、完了していればcustom_idごとの応答を返す（未完了はNone）
+
+        同じBatchを含む変換が続けて確認するため、poll_seconds以内の再確認はAPIを呼ばず、
+        完了したBatchの応答はプロセス内で使い回す。失敗・期限切れはBatchFailedException。
+        """
+        now = time.monotonic()
+        with self._lock:
+            contents = self._results.get(batch_id)
+            if contents is not None:
+                self._results.move_to_end(batch_id)
+                return contents
+            checked_at = self._checked_at.get(batch_id)
+            if checked_at is not None and now - checked_at < self.poll_seconds:
+                return None
+            self._checked_at[batch_id] = now
+            self._checked_at.move_to_end(batch_id)
+            while len(self._checked_at) > self.max_requests:
+                self._checked_at.popitem(last=False)
+
+        if not client.is_done(batch_id):
+            return None
+        contents = client.results(batch_id)
+        logger.info(f"Batchが完了しました: {batch_id}")
+        with self._lock:
+            self._checked_at.pop(batch_id, None)
+            self._results[batch_id] = contents
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return contents
+
+    def _is_full(self, group: _PendingGroup, request: BatchRequest) -> bool:
+        """上限を超えるかどうか"""
+        return (
+            len(group.entries) >= self.max_requests
+            or (bool(group.entries) and group.size + request.size > self.max_bytes)
+        )
+
+    def _ensure_thread(self):
+        """送信スレッドを起動（ロック内で呼ぶ）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="vision-batch", daemon=True)
+            self._thread.start()
+
+    def _flush(self, group_key: GroupKey, group: _PendingGroup, retry: bool = True):
+        """送信待ちのリクエストをBatchとして送信"""
+        requests = [request for request, _, _ in group.entries]
+        try:
+            batch_id = group.client.create(requests)
+        except Exception as e:
+            if retry and is_retryable(e):
+                # 次の周期で再送信する
+                logger.warning(f"Batchの作成に失敗しました（再試行します）: {e}")
+                with self._lock:
+                    self._ready.append((group_key, group))
+                return
+            if retry:
+                logger.error(f"Batchの作成に失敗しました: {e}")
+                self._finish(group, error=e)
+            else:
+                # 停止時に送信できなかったリクエストはジョブの再実行で送り直す
+                logger.warning(f"Batchの作成に失敗しました（再実行時に送り直します）: {e}")
+                self._finish(group, resend=True)
+            return
+
+        logger.info(f"Batchを送信しました: {group_key[0]} {batch_id}（{len(requests)}件）")
+        self._finish(group, batch_id=batch_id)
+
+    def _finish(
+        self,
+        group: _PendingGroup,
+        batch_id: Optional[str] = None,
+        error: Optional[Exception] = None,
+        resend: bool = False
+    ):
+        """送信の結果をFutureと保存先に通知"""
+        with self._lock:
+            for request, _, _ in group.entries:
+                self._queued_ids.discard(request.custom_id)
+
+        stores: Dict[int, Tuple[BatchRequestStore, List[str]]] = {}
+        for request, future, store in group.entries:
+            if store is not None:
+                stores.setdefault(id(store), (store, []))[1].append(request.custom_id)
+            if resend:
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(batch_id)
+
+        for store, custom_ids in stores.values():
+            try:
+                if resend:
+                    store.remove(custom_ids)
+                elif error is not None:
+                    store.set_failed(custom_ids, str(error))
+                else:
+                    store.set_batch_id(custom_ids, batch_id)
+            except Exception as e:
+                # 保存できなかったリクエストは送信待ちのまま期限切れになり、再実行時に送り直す
+                logger.error(f"Batchリクエストの保存に失敗しました: {e}")
+
+    def _run(self):
+        """集め終わった送信待ちのリクエストを送信し続ける"""
+        while not self._stopped:
+            now = time.monotonic()
+            with self._lock:
+                for group_key in [
+                    key for key, group in self._pending.items()
+                    if now - group.created_at >= self.collect_seconds
+                ]:
+                    self._ready.append((group_key, self._pending.pop(group_key)))
+                ready, self._ready = self._ready, []
+
+            # ネットワーク処理はロックの外で行う
+            for group_key, group in ready:
+                self._flush(group_key, group)
+
+            self._wakeup.wait(timeout=min(self.collect_seconds, 5.0))
+            self._wakeup.clear()
+
+    def shutdown(self):
+        """送信スレッドを停止（送信待ちのリクエストは待たずに送信し、完了は再実行したジョブが確認する）"""
+        with self._lock:
+            self._stopped = True
+            ready = list(self._pending.items()) + self._ready
+            self._pending.clear()
+            self._ready = []
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10.0)
+        for group_key, group in ready:
+            self._flush(group_key, group, retry=False)
+
+
+# シングルトンインスタンス
+vision_batch_scheduler = VisionBatchScheduler()
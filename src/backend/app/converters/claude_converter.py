@@ -2,81 +2,67 @@
 Claude Visionコンバーター
 Claude Vision APIを使用した画像認識ベースのPDF処理
 """
-from typing import List, Optional
-import base64
-import fitz  # PyMuPDF for PDF to image conversion
+from typing import Optional
 import anthropic
 
-from app.converters.base import ConverterInterface, ExtractedImage, Table, ConversionResult
+from app.converters.batch import AnthropicBatchClient, VisionBatchClient
+from app.converters.page_encoder import EncodedPage, PageEncoder
+from app.converters.vision_base import VisionConverter
+from app.infrastructure.api_clients import api_client_pool
+from app.infrastructure.vision_cache import VisionCache
 
 
-# 構造化プロンプト（日本語文書向け）
-EXTRACTION_PROMPT = """あなたは日本語文書のOCR専門家です。この画像から正確にテキストを抽出し、以下のMarkdown形式で構造化してください。
-
-【出力形式】
-# 大見出し（最も大きいフォント）
-## 中見出し（次に大きいフォント）
-### 小見出し（太字や強調）
-
-通常の段落テキスト
-
-- 箇条書き項目（・●○などで始まるもの）
-- 箇条書き項目
-
-1. 番号付きリスト（(1) ① などで始まるもの）
-2. 番号付きリスト
-
-> 引用や重要な囲み
-
-【日本語文書特有の注意事項】
-- 法令番号（例：昭和45年法律第84号、平成25年法律第65号）は正確に抽出
-- 括弧（（）「」）は全角を維持
-- 漢数字（第一、第二）と算用数字を混同しない
-- 「第１」「第２」などの章番号は全角数字を維持
-- 段落の途中で改行しない
-
-テキストを抽出してください："""
-
-
-class ClaudeVisionConverter(ConverterInterface):
+class ClaudeVisionConverter(VisionConverter):
     """Claude Vision APIを使用したコンバーター"""
 
-    # 画像解像度スケール（3倍で高精度OCR）
-    RESOLUTION_SCALE = 3
-    # 最大画像サイズ（ピクセル）
-    MAX_IMAGE_DIMENSION = 4096
-
-    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307"):
-        self.api_key = api_key
-        self.model = model
-        self._client: Optional[anthropic.Anthropic] = None
+    PROVIDER = "anthropic"
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "claude-3-haiku-20240307",
+        concurrency: int = VisionConverter.DEFAULT_CONCURRENCY,
+        combined: bool = True,
+        cache: Optional[VisionCache] = None,
+        encoder: Optional[PageEncoder] = None,
+        batch: bool = False,
+        batch_client: Optional[VisionBatchClient] = None
+    ):
+        super().__init__(
+            api_key=api_key, model=model, concurrency=concurrency,
+            combined=combined, cache=cache, encoder=encoder,
+            batch=batch, batch_client=batch_client
+        )
 
     @property
     def client(self) -> anthropic.Anthropic:
-        """Anthropicクライアントを取得（遅延初期化）"""
-        if self._client is None:
-            self._client = anthropic.Anthropic(api_key=self.api_key)
-        return self._client
-
-    def _pdf_page_to_base64(self, pdf_path: str, page_num: int) -> str:
-        """PDFページをBase64画像に変換（高解像度）"""
-        doc = fitz.open(pdf_path)
-        page = doc[page_num]
-
-        # 3倍の解像度でレンダリング（OCR精度向上）
-        scale = self.RESOLUTION_SCALE
-        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
-
-        # サイズ上限チェック（4096px以上なら縮小）
-        if pix.width > self.MAX_IMAGE_DIMENSION or pix.height > self.MAX_IMAGE_DIMENSION:
-            ratio = self.MAX_IMAGE_DIMENSION / max(pix.width, pix.height)
-            new_scale = scale * ratio
-            pix = page.get_pixmap(matrix=fitz.Matrix(new_scale, new_scale))
-
-        img_data = pix.tobytes("png")
-
-        doc.close()
-        return base64.b64encode(img_data).decode("utf-8")
+        """Anthropicクライアントを取得（APIキーごとに共有）"""
+        return super().client
+
+    def _create_client(self) -> anthropic.Anthropic:
+        """Anthropicクライアントを作成"""
+        # リトライはレートリミッターで行う
+        return anthropic.Anthropic(
+            api_key=self.api_key, max_retries=0, http_client=api_client_pool.http_client(anthropic)
+        )
+
+    def _create_async_client(self) -> anthropic.AsyncAnthropic:
+        """非同期Anthropicクライアントを作成"""
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key, max_retries=0, http_client=api_client_pool.async_http_client(anthropic)
+        )
+
+    def _create_batch_client(self) -> AnthropicBatchClient:
+        """Message Batches APIクライアントを作成"""
+        return AnthropicBatchClient(self.client)
+
+    def _batch_params(self, prompt: str, image: EncodedPage, max_tokens: int) -> dict:
+        """Batch APIに送る1ページ分のリクエストボディ"""
+        return {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "messages": self._build_messages(prompt, image)
+        }
 
     def _get_max_tokens(self) -> int:
         """モデルに応じたmax_tokensを返す"""
@@ -86,116 +72,53 @@ class ClaudeVisionConverter(ConverterInterface):
         else:
             return 8000
 
-    def extract_text(self, pdf_path: str) -> str:
-        """PDFからテキストを抽出（Vision APIを使用）"""
-        doc = fitz.open(pdf_path)
-        page_count = len(doc)
-        doc.close()
-
-        text_parts = []
-
-        for page_num in range(page_count):
-            base64_image = self._pdf_page_to_base64(pdf_path, page_num)
-
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self._get_max_tokens(),  # モデルに応じて動的に設定
-                messages=[
+    def _build_messages(self, prompt: str, image: EncodedPage) -> list:
+        """リクエストメッセージを作成（全ページ共通のプロンプトを先頭に置いてキャッシュ対象にする）"""
+        return [
+            {
+                "role": "user",
+                "content": [
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": EXTRACTION_PROMPT
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": base64_image
-                                }
-                            }
-                        ]
-                    }
-                ]
-            )
-
-            extracted_text = response.content[0].text
-            if extracted_text:
-                text_parts.append(f"--- Page {page_num + 1} ---\n{extracted_text}")
-
-        return "\n\n".join(text_parts)
-
-    def extract_images(self, pdf_path: str) -> List[ExtractedImage]:
-        """PDFから画像を抽出（PyMuPDFを使用）"""
-        # 画像抽出はPyMuPDFに委譲
-        from app.converters.pymupdf_converter import PyMuPDFConverter
-        pymupdf = PyMuPDFConverter()
-        return pymupdf.extract_images(pdf_path)
-
-    def extract_tables(self, pdf_path: str) -> List[Table]:
-        """PDFから表を抽出（Vision APIを使用）"""
-        doc = fitz.open(pdf_path)
-        page_count = len(doc)
-        doc.close()
-
-        tables = []
-
-        for page_num in range(page_count):
-            base64_image = self._pdf_page_to_base64(pdf_path, page_num)
-
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                messages=[
+                        "type": "text",
+                        "text": prompt,
+                        "cache_control": {"type": "ephemeral"}
+                    },
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """この画像に表がある場合、すべての表を抽出してください。
-                                各表は以下のJSON形式で出力してください:
-                                {"tables": [{"headers": ["列1", "列2"], "rows": [["値1", "値2"], ...]}]}
-                                表がない場合は {"tables": []} を返してください。"""
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": base64_image
-                                }
-                            }
-                        ]
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": image.mime_type,
+                            "data": image.base64
+                        }
                     }
                 ]
-            )
-
-            try:
-                import json
-                content = response.content[0].text
-                # JSONを抽出
-                if "{" in content and "}" in content:
-                    json_start = content.find("{")
-                    json_end = content.rfind("}") + 1
-                    json_str = content[json_start:json_end]
-                    data = json.loads(json_str)
+            }
+        ]
 
-                    for table_data in data.get("tables", []):
-                        tables.append(Table(
-                            headers=table_data.get("headers", []),
-                            rows=table_data.get("rows", []),
-                            page_number=page_num + 1
-                        ))
-            except (json.JSONDecodeError, KeyError):
-                continue
-
-        return tables
-
-    def get_page_count(self, pdf_path: str) -> int:
-        """ページ数を取得"""
-        doc = fitz.open(pdf_path)
-        count = len(doc)
-        doc.close()
-        return count
+    def _request(self, prompt: str, image: EncodedPage, max_tokens: int) -> Optional[str]:
+        """1ページ分のリクエストを送信（同期）"""
+        response = self.rate_limiter.call(
+            lambda: self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=self._build_messages(prompt, image)
+            ),
+            input_tokens=self._estimate_input_tokens(prompt, image),
+            max_tokens=max_tokens
+        )
+        return response.content[0].text
+
+    async def _arequest(
+        self, client: anthropic.AsyncAnthropic, prompt: str, image: EncodedPage, max_tokens: int
+    ) -> Optional[str]:
+        """1ページ分のリクエストを送信（非同期）"""
+        response = await self.rate_limiter.call_async(
+            lambda: client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=self._build_messages(prompt, image)
+            ),
+            input_tokens=self._estimate_input_tokens(prompt, image),
+            max_tokens=max_tokens
+        )
+        return response.content[0].text
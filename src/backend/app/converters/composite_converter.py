@@ -0,0 +1,85 @@
+"""
+コンポジットコンバーター
+テキストと画像はPyMuPDFで抽出し、表候補ページのみpdfplumberで表を抽出する
+"""
+from typing import Iterator, List, Optional
+import logging
+
+from app.converters.base import ConverterInterface, ExtractedImage, Table, ConversionResult, PageResult
+from app.converters.document import PdfDocument, PdfSource, open_document
+from app.converters.page_analysis import is_table_candidate
+from app.converters.pdfplumber_converter import PdfPlumberConverter
+from app.converters.pymupdf_converter import PyMuPDFConverter
+
+logger = logging.getLogger(__name__)
+
+
+class CompositeConverter(ConverterInterface):
+    """PyMuPDFとpdfplumberを組み合わせたコンバーター"""
+
+    def __init__(
+        self,
+        local: Optional[PyMuPDFConverter] = None,
+        table_converter: Optional[PdfPlumberConverter] = None
+    ):
+        # 表はpdfplumberで抽出するため、PyMuPDF側の表検出は行わない
+        self.local = local or PyMuPDFConverter(detect_tables=False)
+        self.table_converter = table_converter or PdfPlumberConverter()
+
+    def get_table_pages(self, doc: PdfDocument) -> List[int]:
+        """表を抽出するページ（0始まり）を判定"""
+        return [
+            page_num for page_num in range(doc.page_count)
+            if is_table_candidate(doc.fitz_doc[page_num])
+        ]
+
+    def _extract_page_tables(self, doc: PdfDocument, page_num: int) -> List[Table]:
+        """pdfplumberで1ページ分の表を抽出"""
+        page = doc.plumber_pdf.pages[page_num]
+        tables = self.table_converter._extract_page_tables(page, page_num)
+        page.flush_cache()
+        return tables
+
+    def convert(self, source: PdfSource) -> ConversionResult:
+        """PDF変換を実行"""
+        with open_document(source) as doc:
+            return self.local.merge_page_results(list(self.iter_pages(doc)), doc.page_count)
+
+    def iter_pages(self, source: PdfSource) -> Iterator[PageResult]:
+        """ページ単位の結果をページ順に返す（表候補ページのみpdfplumberで表を抽出）"""
+        with open_document(source) as doc:
+            table_pages = set(self.get_table_pages(doc))
+            logger.info(f"コンポジット変換: 表候補 {len(table_pages)}/{doc.page_count}ページ")
+
+            for page_result in self.local.iter_page_results(doc, range(doc.page_count)):
+                page_num = page_result.page_number - 1
+                if page_num in table_pages:
+                    page_result.tables = self._extract_page_tables(doc, page_num)
+                yield page_result
+
+    def join_page_texts(self, texts: List[str]) -> str:
+        """ページ単位のテキストを結合（PyMuPDFと同じ）"""
+        return self.local.join_page_texts(texts)
+
+    def extract_text(self, source: PdfSource) -> str:
+        """PDFからテキストを抽出（PyMuPDFを使用）"""
+        return self.local.extract_text(source)
+
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
+        """PDFから画像を抽出（PyMuPDFを使用）"""
+        return self.local.extract_images(source)
+
+    def extract_tables(self, source: PdfSource) -> List[Table]:
+        """PDFから表を抽出（表候補ページのみpdfplumberを使用）"""
+        tables = []
+
+        with open_document(source) as doc:
+            for page_num in self.get_table_pages(doc):
+                tables.extend(self._extract_page_tables(doc, page_num))
+
+        return tables
+
+    def get_page_count(self, source: PdfSource) -> int:
+        """ページ数を取得"""
+        with open_document(source) as doc:
+            return doc.page_count
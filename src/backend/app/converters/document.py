@@ -0,0 +1,124 @@
+"""
+PDFドキュメントセッション
+1回の変換でPDFを1度だけ開き、全ステージ・全コンバーターで共有する
+"""
+import logging
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+
+class PdfDocument:
+    """PDFドキュメントセッション
+
+    可能な場合はファイルをメモリマップし、PyMuPDFとpdfplumberの両方から
+    同じマッピングを参照する（ページキャッシュを共有し、コピーしない）。
+    """
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = str(pdf_path)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._buffer: Optional[memoryview] = None
+        self._fitz_doc: Optional[fitz.Document] = None
+        self._plumber_pdf = None
+        self._open()
+
+    def _open(self):
+        """PDFを開く（メモリマップ優先、失敗時はパス指定）"""
+        try:
+            self._file = open(self.pdf_path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buffer = memoryview(self._mmap)
+            self._fitz_doc = fitz.open(stream=self._buffer, filetype="pdf")
+        except (OSError, ValueError) as e:
+            # 空ファイルやmmap非対応のファイルシステムではパス指定で開く
+            logger.debug(f"メモリマップを使用できません（{e}）。パス指定で開きます: {self.pdf_path}")
+            self._release_mapping()
+            self._fitz_doc = fitz.open(self.pdf_path)
+
+    @property
+    def fitz_doc(self) -> fitz.Document:
+        """PyMuPDFドキュメントを取得"""
+        if self._fitz_doc is None:
+            raise ValueError("ドキュメントは既に閉じられています")
+        return self._fitz_doc
+
+    @property
+    def plumber_pdf(self):
+        """pdfplumberドキュメントを取得（遅延オープン、同じマッピングを共有）"""
+        if self._plumber_pdf is None:
+            import pdfplumber
+            if self._mmap is not None:
+                # 解析はマッピングから行い、画像レンダリング（pypdfium2）はパスを使う
+                self._plumber_pdf = pdfplumber.PDF(
+                    self._mmap,
+                    path=Path(self.pdf_path),
+                    stream_is_external=True
+                )
+            else:
+                self._plumber_pdf = pdfplumber.open(self.pdf_path)
+        return self._plumber_pdf
+
+    @property
+    def page_count(self) -> int:
+        """ページ数"""
+        return len(self.fitz_doc)
+
+    def close(self):
+        """ドキュメントを閉じてマッピングを解放"""
+        if self._plumber_pdf is not None:
+            self._plumber_pdf.close()
+            self._plumber_pdf = None
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+        self._release_mapping()
+
+    def _release_mapping(self):
+        """メモリマップとファイルハンドルを解放"""
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "PdfDocument":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"<PdfDocument(path={self.pdf_path}, mmap={self._mmap is not None})>"
+
+
+# コンバーターが受け付けるPDF指定（パスまたは開いたセッション）
+PdfSource = Union[str, PdfDocument]
+
+
+@contextmanager
+def open_document(source: PdfSource) -> Iterator[PdfDocument]:
+    """PDFセッションを取得
+
+    既に開いたセッションが渡された場合はそのまま使い（閉じない）、
+    パスが渡された場合はこのブロックの間だけ開く。
+    """
+    if isinstance(source, PdfDocument):
+        yield source
+        return
+
+    doc = PdfDocument(str(source))
+    try:
+        yield doc
+    finally:
+        doc.close()
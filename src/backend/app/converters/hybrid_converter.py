@@ -0,0 +1,100 @@
+"""
+ハイブリッドコンバーター
+テキスト層のあるページはPyMuPDFでローカル抽出し、テキスト層のないページのみVision APIに送る
+"""
+from typing import Iterator, List, Optional
+import logging
+
+from app.converters.base import ConverterInterface, ExtractedImage, Table, ConversionResult, PageResult
+from app.converters.document import PdfDocument, PdfSource, open_document
+from app.converters.page_analysis import has_text_layer
+from app.converters.pymupdf_converter import PyMuPDFConverter
+from app.converters.vision_base import VisionConverter
+
+logger = logging.getLogger(__name__)
+
+
+class HybridConverter(ConverterInterface):
+    """PyMuPDFとVision APIを組み合わせたコンバーター"""
+
+    def __init__(self, vision: Optional[VisionConverter] = None, local: Optional[PyMuPDFConverter] = None):
+        self.vision = vision
+        self.local = local or PyMuPDFConverter()
+
+    def with_batch_mode(self) -> "HybridConverter":
+        """テキスト層のないページをBatch APIで処理するコピーを返す"""
+        if self.vision is None:
+            return self
+        return HybridConverter(vision=self.vision.with_batch_mode(), local=self.local)
+
+    def get_vision_pages(self, doc: PdfDocument) -> List[int]:
+        """Vision APIで処理するページ（0始まり）を判定"""
+        return [
+            page_num for page_num in range(doc.page_count)
+            if not has_text_layer(doc.fitz_doc[page_num])
+        ]
+
+    def convert(self, source: PdfSource) -> ConversionResult:
+        """PDF変換を実行（ページごとにローカル抽出とVision APIを振り分け）"""
+        with open_document(source) as doc:
+            return self.local.merge_page_results(list(self.iter_pages(doc)), doc.page_count)
+
+    def iter_pages(self, source: PdfSource) -> Iterator[PageResult]:
+        """ページ単位の結果をページ順に返す
+
+        Vision APIの応答（テキストと表）を先に取得し、ローカル抽出と画像抽出はページごとに行う
+        """
+        with open_document(source) as doc:
+            vision_pages = self.get_vision_pages(doc)
+            if vision_pages and self.vision is None:
+                # APIキー未設定時はすべてローカルで抽出する
+                logger.warning(
+                    f"Visionコンバーターが未設定のため、テキスト層のない{len(vision_pages)}ページもローカルで抽出します"
+                )
+                vision_pages = []
+
+            vision_page_set = set(vision_pages)
+            local_pages = [p for p in range(doc.page_count) if p not in vision_page_set]
+            logger.info(
+                f"ハイブリッド変換: ローカル{len(local_pages)}ページ / Vision {len(vision_pages)}ページ"
+            )
+
+            vision_contents = {}
+            if vision_pages:
+                vision_contents = dict(zip(vision_pages, self.vision._request_pages_content(doc, vision_pages)))
+            local_results = self.local.iter_page_results(doc, local_pages)
+
+            for page_num in range(doc.page_count):
+                if page_num not in vision_contents:
+                    yield next(local_results)
+                    continue
+
+                text, tables = vision_contents.pop(page_num)
+                yield PageResult(
+                    page_number=page_num + 1,
+                    # PyMuPDF4LLMのページチャンクと同じく、ページ末尾に空行を付ける
+                    text=f"{text.strip()}\n\n" if text else "",
+                    images=self.local._extract_page_images(doc.fitz_doc, page_num),
+                    tables=tables
+                )
+
+    def join_page_texts(self, texts: List[str]) -> str:
+        """ページ単位のテキストを結合（PyMuPDFと同じ）"""
+        return self.local.join_page_texts(texts)
+
+    def extract_text(self, source: PdfSource) -> str:
+        """PDFからテキストを抽出"""
+        return self.convert(source).text
+
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
+        """PDFから画像を抽出（PyMuPDFを使用）"""
+        return self.local.extract_images(source)
+
+    def extract_tables(self, source: PdfSource) -> List[Table]:
+        """PDFから表を抽出"""
+        return self.convert(source).tables
+
+    def get_page_count(self, source: PdfSource) -> int:
+        """ページ数を取得"""
+        with open_document(source) as doc:
+            return doc.page_count
@@ -2,19 +2,26 @@
 コンバーターマネージャー
 Strategy Patternの実行管理
 """
-from typing import Dict, Optional
+from typing import Dict, Iterator, Optional
+import threading
 
-from app.converters.base import ConverterInterface, ConversionResult
+from app.converters.base import ConverterInterface, ConversionResult, PageResult
 from app.converters.pymupdf_converter import PyMuPDFConverter
 from app.converters.pdfplumber_converter import PdfPlumberConverter
 from app.converters.openai_converter import OpenAIVisionConverter
 from app.converters.claude_converter import ClaudeVisionConverter
+from app.converters.hybrid_converter import HybridConverter
+from app.converters.composite_converter import CompositeConverter
+from app.converters.page_encoder import PageEncoder
 from app.core.exceptions import UnknownConverterException
+from app.infrastructure.vision_cache import VisionCache
 
 
 class ConverterManager:
     """コンバーター管理クラス"""
 
+    AUTO = "auto"
+
     CONVERTER_INFO = {
         "pymupdf": {
             "name": "PyMuPDF",
@@ -31,6 +38,19 @@ class ConverterManager:
         "claude": {
             "name": "Claude Vision",
             "description": "画像認識ベース（API課金）"
+        },
+        "hybrid": {
+            "name": "Hybrid",
+            "description": "テキスト層のないページのみ画像認識（API課金）"
+        },
+        "composite": {
+            "name": "Composite",
+            "description": "高速・表候補ページのみpdfplumberで表抽出"
+        },
+        # autoは変換時にConverterRouterServiceが実際のコンバーターを選ぶ（インスタンスは作らない）
+        AUTO: {
+            "name": "Auto",
+            "description": "文書に合わせて自動選択"
         }
     }
 
@@ -40,38 +60,90 @@ class ConverterManager:
         anthropic_api_key: str = "",
         openai_model: str = "gpt-4o-mini",
         anthropic_model: str = "claude-3-haiku-20240307",
-        default_converter: str = "pymupdf"
+        default_converter: str = "pymupdf",
+        parallel_workers: int = 0,
+        vision_concurrency: int = 4,
+        vision_combined: bool = True,
+        vision_cache: Optional[VisionCache] = None,
+        vision_encoder: Optional[PageEncoder] = None
     ):
         self.openai_api_key = openai_api_key
         self.anthropic_api_key = anthropic_api_key
         self.openai_model = openai_model
         self.anthropic_model = anthropic_model
         self.current_type = default_converter
+        self.parallel_workers = parallel_workers
+        self.vision_concurrency = vision_concurrency
+        self.vision_combined = vision_combined
+        self.vision_cache = vision_cache
+        self.vision_encoder = vision_encoder
 
-        # コンバーターインスタンスをキャッシュ
+        # コンバーターインスタンスをキャッシュ（複数スレッドの変換処理で共有する）
         self._converters: Dict[str, Optional[ConverterInterface]] = {}
+        self._lock = threading.RLock()
 
     def _get_or_create_converter(self, converter_type: str) -> ConverterInterface:
         """コンバーターインスタンスを取得または作成"""
-        if converter_type not in self._converters:
-            if converter_type == "pymupdf":
-                self._converters[converter_type] = PyMuPDFConverter()
-            elif converter_type == "pdfplumber":
-                self._converters[converter_type] = PdfPlumberConverter()
-            elif converter_type == "openai":
-                self._converters[converter_type] = OpenAIVisionConverter(
-                    api_key=self.openai_api_key,
-                    model=self.openai_model
-                )
-            elif converter_type == "claude":
-                self._converters[converter_type] = ClaudeVisionConverter(
-                    api_key=self.anthropic_api_key,
-                    model=self.anthropic_model
-                )
-            else:
-                raise UnknownConverterException(converter_type)
-
-        return self._converters[converter_type]
+        with self._lock:
+            if converter_type not in self._converters:
+                if converter_type == "pymupdf":
+                    self._converters[converter_type] = PyMuPDFConverter(workers=self.parallel_workers)
+                elif converter_type == "pdfplumber":
+                    self._converters[converter_type] = PdfPlumberConverter(workers=self.parallel_workers)
+                elif converter_type == "openai":
+                    self._converters[converter_type] = OpenAIVisionConverter(
+                        api_key=self.openai_api_key,
+                        model=self.openai_model,
+                        concurrency=self.vision_concurrency,
+                        combined=self.vision_combined,
+                        cache=self.vision_cache,
+                        encoder=self.vision_encoder
+                    )
+                elif converter_type == "claude":
+                    self._converters[converter_type] = ClaudeVisionConverter(
+                        api_key=self.anthropic_api_key,
+                        model=self.anthropic_model,
+                        concurrency=self.vision_concurrency,
+                        combined=self.vision_combined,
+                        cache=self.vision_cache,
+                        encoder=self.vision_encoder
+                    )
+                elif converter_type == "hybrid":
+                    self._converters[converter_type] = HybridConverter(
+                        vision=self._get_hybrid_vision_converter(),
+                        local=self._get_or_create_converter("pymupdf")
+                    )
+                elif converter_type == "composite":
+                    self._converters[converter_type] = CompositeConverter(
+                        local=PyMuPDFConverter(detect_tables=False),
+                        table_converter=self._get_or_create_converter("pdfplumber")
+                    )
+                else:
+                    raise UnknownConverterException(converter_type)
+
+            return self._converters[converter_type]
+
+    def _get_hybrid_vision_converter(self) -> Optional[ConverterInterface]:
+        """ハイブリッド変換で使うVisionコンバーターを取得（Claude優先、APIキー未設定ならNone）"""
+        if self.anthropic_api_key:
+            return self._get_or_create_converter("claude")
+        if self.openai_api_key:
+            return self._get_or_create_converter("openai")
+        return None
+
+    def extraction_signature(self, converter_type: str) -> str:
+        """抽出結果を左右する設定（コンバーターと使用するVisionモデル）を表す文字列"""
+        if converter_type == "openai":
+            return f"openai:{self.openai_model}"
+        if converter_type == "claude":
+            return f"claude:{self.anthropic_model}"
+        if converter_type == "hybrid":
+            # ハイブリッド変換はClaude優先で、どちらのAPIキーもなければローカル抽出のみ
+            if self.anthropic_api_key:
+                return f"hybrid:{self.extraction_signature('claude')}"
+            if self.openai_api_key:
+                return f"hybrid:{self.extraction_signature('openai')}"
+        return converter_type
 
     def set_converter(self, converter_type: str):
         """使用するコンバーターを設定"""
@@ -79,16 +151,24 @@ class ConverterManager:
             raise UnknownConverterException(converter_type)
         self.current_type = converter_type
 
-    def get_converter(self, converter_type: Optional[str] = None) -> ConverterInterface:
-        """コンバーターを取得"""
+    def get_converter(self, converter_type: Optional[str] = None, batch: bool = False) -> ConverterInterface:
+        """コンバーターを取得（batch=TrueでVision APIのリクエストをBatch APIで送る）"""
         target_type = converter_type or self.current_type
-        return self._get_or_create_converter(target_type)
+        converter = self._get_or_create_converter(target_type)
+        if batch and hasattr(converter, "with_batch_mode"):
+            converter = converter.with_batch_mode()
+        return converter
 
     def convert(self, pdf_path: str, converter_type: Optional[str] = None) -> ConversionResult:
         """PDF変換を実行"""
         converter = self.get_converter(converter_type)
         return converter.convert(pdf_path)
 
+    def iter_pages(self, pdf_path: str, converter_type: Optional[str] = None) -> Iterator[PageResult]:
+        """PDF変換をページ単位で実行（ストリーミング）"""
+        converter = self.get_converter(converter_type)
+        return converter.iter_pages(pdf_path)
+
     def get_page_count(self, pdf_path: str) -> int:
         """ページ数を取得（PyMuPDFを使用）"""
         pymupdf = self._get_or_create_converter("pymupdf")
@@ -111,16 +191,19 @@ class ConverterManager:
         openai_api_key: Optional[str] = None,
         anthropic_api_key: Optional[str] = None
     ):
-        """APIキーを更新"""
-        if openai_api_key is not None:
-            self.openai_api_key = openai_api_key
-            # OpenAIコンバーターのキャッシュをクリア
-            self._converters.pop("openai", None)
-
-        if anthropic_api_key is not None:
-            self.anthropic_api_key = anthropic_api_key
-            # Claudeコンバーターのキャッシュをクリア
-            self._converters.pop("claude", None)
+        """APIキーを更新（変更前のキーのAPIクライアントは実行中の変換で使われているため、プールで期限切れにする）"""
+        with self._lock:
+            if openai_api_key is not None:
+                self.openai_api_key = openai_api_key
+                # OpenAIコンバーターのキャッシュをクリア
+                self._converters.pop("openai", None)
+                self._converters.pop("hybrid", None)
+
+            if anthropic_api_key is not None:
+                self.anthropic_api_key = anthropic_api_key
+                # Claudeコンバーターのキャッシュをクリア
+                self._converters.pop("claude", None)
+                self._converters.pop("hybrid", None)
 
     def update_models(
         self,
@@ -128,10 +211,13 @@ class ConverterManager:
         anthropic_model: Optional[str] = None
     ):
         """モデルを更新"""
-        if openai_model is not None:
-            self.openai_model = openai_model
-            self._converters.pop("openai", None)
-
-        if anthropic_model is not None:
-            self.anthropic_model = anthropic_model
-            self._converters.pop("claude", None)
+        with self._lock:
+            if openai_model is not None:
+                self.openai_model = openai_model
+                self._converters.pop("openai", None)
+                self._converters.pop("hybrid", None)
+
+            if anthropic_model is not None:
+                self.anthropic_model = anthropic_model
+                self._converters.pop("claude", None)
+                self._converters.pop("hybrid", None)
@@ -0,0 +1,116 @@
+"""
+ページ解析
+PyMuPDFでページの特徴（テキスト層の有無・表の有無など）を判定する
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Set, Tuple
+import unicodedata
+
+import fitz  # PyMuPDF
+
+# テキスト層ありとみなす最小文字数（空白を除く）
+MIN_TEXT_CHARS = 20
+# 文字化けとみなす文字の割合の上限
+MAX_GARBLED_RATIO = 0.1
+
+# 文字化けとみなすUnicodeカテゴリ（制御文字・私用領域・サロゲート・未割り当て）
+_GARBLED_CATEGORIES = {"Cc", "Co", "Cs", "Cn"}
+
+
+def _is_garbled_char(char: str) -> bool:
+    """文字化け（ToUnicode欠落など）による文字か判定"""
+    return char == "\ufffd" or unicodedata.category(char) in _GARBLED_CATEGORIES
+
+
+def has_text_layer(page: fitz.Page) -> bool:
+    """ページに抽出可能なテキスト層があるか判定
+
+    文字数が少ない（スキャン画像のみ等）場合や、
+    文字化けした文字の割合が高い場合はテキスト層なしとみなす。
+    """
+    chars = [c for c in page.get_text("text") if not c.isspace()]
+    if len(chars) < MIN_TEXT_CHARS:
+        return False
+
+    garbled = sum(1 for c in chars if _is_garbled_char(c))
+    return garbled / len(chars) <= MAX_GARBLED_RATIO
+
+
+# 表候補とみなす罫線の最小本数（水平・垂直それぞれ、位置の異なるもの）
+MIN_RULED_LINES = 3
+# 罫線とみなす線分の最小長（pt）と、水平・垂直とみなす傾きの許容幅（pt）
+MIN_RULE_LENGTH = 10
+RULE_TOLERANCE = 1.0
+# 罫線なしの表とみなす、列の揃ったテキスト行の最小数と最小列数
+MIN_ALIGNED_ROWS = 3
+MIN_ALIGNED_COLUMNS = 3
+# 同じ行・同じ列とみなす座標の丸め幅（pt）
+ROW_TOLERANCE = 3
+COLUMN_TOLERANCE = 4
+
+
+def _ruled_line_positions(page: fitz.Page) -> Tuple[Set[int], Set[int]]:
+    """ベクター図形から水平・垂直の罫線位置（y座標・x座標）を収集"""
+    horizontal: Set[int] = set()
+    vertical: Set[int] = set()
+
+    def add_segment(p1: fitz.Point, p2: fitz.Point):
+        if abs(p1.y - p2.y) <= RULE_TOLERANCE and abs(p1.x - p2.x) >= MIN_RULE_LENGTH:
+            horizontal.add(round(p1.y))
+        elif abs(p1.x - p2.x) <= RULE_TOLERANCE and abs(p1.y - p2.y) >= MIN_RULE_LENGTH:
+            vertical.add(round(p1.x))
+
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                add_segment(item[1], item[2])
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.height <= RULE_TOLERANCE or rect.width <= RULE_TOLERANCE:
+                    # 細い矩形は1本の罫線として扱う
+                    center = (rect.tl + rect.br) / 2
+                    if rect.height <= RULE_TOLERANCE:
+                        add_segment(fitz.Point(rect.x0, center.y), fitz.Point(rect.x1, center.y))
+                    else:
+                        add_segment(fitz.Point(center.x, rect.y0), fitz.Point(center.x, rect.y1))
+                else:
+                    # それ以外はセルの枠として4辺を数える
+                    add_segment(rect.tl, rect.tr)
+                    add_segment(rect.bl, rect.br)
+                    add_segment(rect.tl, rect.bl)
+                    add_segment(rect.tr, rect.br)
+
+    return horizontal, vertical
+
+
+def _has_aligned_columns(page: fitz.Page) -> bool:
+    """テキスト行が複数の列に揃って並んでいるか判定（罫線なしの表）"""
+    # 同じ高さに並ぶテキスト行の左端x座標を集める
+    rows: Dict[int, Set[int]] = defaultdict(set)
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            if not "".join(span["text"] for span in line["spans"]).strip():
+                continue
+            x0, _, _, y1 = line["bbox"]
+            rows[round(y1 / ROW_TOLERANCE)].add(round(x0 / COLUMN_TOLERANCE))
+
+    multi_column_rows = [xs for xs in rows.values() if len(xs) >= MIN_ALIGNED_COLUMNS]
+    if len(multi_column_rows) < MIN_ALIGNED_ROWS:
+        return False
+
+    # 複数行で共通する列位置が一定数以上あれば表とみなす
+    column_counts = Counter(x for xs in multi_column_rows for x in xs)
+    aligned_columns = [x for x, count in column_counts.items() if count >= MIN_ALIGNED_ROWS]
+    return len(aligned_columns) >= MIN_ALIGNED_COLUMNS
+
+
+def is_table_candidate(page: fitz.Page) -> bool:
+    """ページに表が含まれる可能性があるか判定
+
+    水平・垂直の罫線がそれぞれ一定数以上ある場合、
+    または複数のテキスト行が3列以上に揃って並んでいる場合に表候補とする。
+    """
+    horizontal, vertical = _ruled_line_positions(page)
+    if len(horizontal) >= MIN_RULED_LINES and len(vertical) >= MIN_RULED_LINES:
+        return True
+    return _has_aligned_columns(page)
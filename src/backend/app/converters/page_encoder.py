@@ -0,0 +1,168 @@
+"""
+ページ画像エンコーダー
+Vision APIに送るページ画像の解像度・色数・形式・サイズを調整する
+"""
+from dataclasses import dataclass
+import base64
+import io
+import logging
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageChops, ImageStat
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EncodedPage:
+    """エンコード済みページ画像"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+
+    @property
+    def base64(self) -> str:
+        """Base64文字列"""
+        return base64.b64encode(self.data).decode("utf-8")
+
+
+class PageEncoder:
+    """ページ画像エンコーダー
+
+    最終的な解像度をレンダリング前に決め、1回だけレンダリングする。
+    写真を含まないページとスキャンした文書のページはグレースケールPNG（上限超過時は2値PNG）、
+    写真を含むページはJPEG/WebPで圧縮し、1ページあたりのバイト数上限に収める。
+    """
+
+    # 写真ページとみなす画像の面積比（ページ面積に対する割合）
+    PHOTO_AREA_RATIO = 0.2
+    # ページ全体を覆う画像とみなす面積比（スキャンしたページの判定）
+    FULL_PAGE_AREA_RATIO = 0.9
+    # 色の判定に使う縮小画像の長辺（ピクセル）
+    COLOR_SAMPLE_SIZE = 128
+    # 色の量（画素ごとのRGBの最大値と最小値の差の平均）がこれ以下のページはモノクロとみなす
+    MONOCHROME_MAX_CHROMA = 12
+    # 2値化のしきい値
+    BILEVEL_THRESHOLD = 160
+    # 上限超過時の品質・解像度の下限と縮小率
+    MIN_QUALITY = 40
+    QUALITY_STEP = 15
+    MIN_SCALE = 1.0
+    SCALE_STEP = 0.8
+
+    MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+    def __init__(
+        self,
+        scale: float = 3,
+        max_dimension: int = 4096,
+        max_bytes: int = 1536 * 1024,
+        quality: int = 80,
+        photo_format: str = "jpeg"
+    ):
+        self.scale = scale
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.photo_format = photo_format if photo_format in ("jpeg", "webp") else "jpeg"
+
+    def _initial_scale(self, page: fitz.Page) -> float:
+        """最大画像サイズを超えない解像度スケールを計算"""
+        longest = max(page.rect.width, page.rect.height)
+        if longest * self.scale > self.max_dimension:
+            return self.max_dimension / longest
+        return self.scale
+
+    def is_photo_page(self, page: fitz.Page) -> bool:
+        """写真（ラスター画像）が一定以上の面積を占めるページか判定"""
+        page_area = abs(page.rect)
+        if not page_area:
+            return False
+
+        image_area = 0.0
+        for img in page.get_images(full=True):
+            for rect in page.get_image_rects(img[0]):
+                image_area += abs(rect & page.rect)
+        return image_area / page_area >= self.PHOTO_AREA_RATIO
+
+    def is_scanned_text_page(self, page: fitz.Page) -> bool:
+        """スキャンした文書のページか判定
+
+        テキスト層のないページ全体を覆う1枚の画像、または色の少ない（モノクロの）ページを対象とする
+        """
+        images = page.get_images(full=True)
+        if len(images) == 1 and not page.get_text("text").strip():
+            page_area = abs(page.rect)
+            image_area = sum(abs(rect & page.rect) for rect in page.get_image_rects(images[0][0]))
+            if page_area and image_area / page_area >= self.FULL_PAGE_AREA_RATIO:
+                return True
+        return self._is_monochrome(page)
+
+    def _is_monochrome(self, page: fitz.Page) -> bool:
+        """縮小レンダリングした画像の色の量でモノクロのページか判定"""
+        scale = self.COLOR_SAMPLE_SIZE / max(page.rect.width, page.rect.height, 1)
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csRGB, alpha=False)
+        r, g, b = Image.frombytes("RGB", (pix.width, pix.height), pix.samples).split()
+        chroma = ImageChops.subtract(
+            ImageChops.lighter(ImageChops.lighter(r, g), b),
+            ImageChops.darker(ImageChops.darker(r, g), b)
+        )
+        return ImageStat.Stat(chroma).mean[0] <= self.MONOCHROME_MAX_CHROMA
+
+    def encode(self, page: fitz.Page) -> EncodedPage:
+        """ページをレンダリングしてエンコード"""
+        # スキャンした文書のページは写真ではなく文字主体のページとして扱う
+        photo = self.is_photo_page(page) and not self.is_scanned_text_page(page)
+        scale = self._initial_scale(page)
+
+        while True:
+            colorspace = fitz.csRGB if photo else fitz.csGRAY
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=colorspace, alpha=False)
+            mode = "RGB" if photo else "L"
+            img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+            if photo:
+                encoded = self._encode_photo(img)
+            else:
+                encoded = self._encode_text(img)
+
+            if len(encoded.data) <= self.max_bytes or scale * self.SCALE_STEP < self.MIN_SCALE:
+                break
+            # 品質を下げても上限を超える場合は解像度を下げて再レンダリング
+            scale *= self.SCALE_STEP
+
+        logger.info(
+            f"ページ{page.number + 1}の画像: {encoded.mime_type} {encoded.width}x{encoded.height} "
+            f"{len(encoded.data)} bytes (scale={scale:.2f})"
+        )
+        return encoded
+
+    def _encode_text(self, img: Image.Image) -> EncodedPage:
+        """文字主体のページをグレースケールPNG（上限超過時は2値PNG）でエンコード"""
+        data = self._save(img, "png")
+        if len(data) > self.max_bytes:
+            bilevel = img.point(lambda v: 255 if v > self.BILEVEL_THRESHOLD else 0).convert("1")
+            data = self._save(bilevel, "png")
+        return EncodedPage(data=data, mime_type=self.MIME_TYPES["png"], width=img.width, height=img.height)
+
+    def _encode_photo(self, img: Image.Image) -> EncodedPage:
+        """写真を含むページをJPEG/WebPでエンコード（上限超過時は品質を下げる）"""
+        quality = self.quality
+        data = self._save(img, self.photo_format, quality)
+        while len(data) > self.max_bytes and quality - self.QUALITY_STEP >= self.MIN_QUALITY:
+            quality -= self.QUALITY_STEP
+            data = self._save(img, self.photo_format, quality)
+        return EncodedPage(
+            data=data, mime_type=self.MIME_TYPES[self.photo_format], width=img.width, height=img.height
+        )
+
+    @staticmethod
+    def _save(img: Image.Image, fmt: str, quality: int = 0) -> bytes:
+        """PIL画像を指定形式でバイト列に変換"""
+        buf = io.BytesIO()
+        if fmt == "png":
+            img.save(buf, format="PNG")
+        else:
+            img.save(buf, format=fmt.upper(), quality=quality)
+        return buf.getvalue()
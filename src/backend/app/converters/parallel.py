@@ -0,0 +1,233 @@
+"""
+ページ並列実行
+ページ範囲をプロセスプールに分散して抽出し、結果をページ順にマージする
+"""
+import logging
+import math
+import multiprocessing
+import threading
+from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Type
+
+from app.converters.base import (
+    ConverterInterface, ConversionResult, PageResult, attach_image_references, merge_duplicate_images
+)
+from app.converters.document import PdfDocument, PdfSource, open_document
+
+logger = logging.getLogger(__name__)
+
+
+# プロセスプール（プロセス起動コストを変換ごとに払わないよう常駐させる）
+# ワーカー数ごとに持つ（実行中の変換が使っているプールを別のワーカー数の変換が閉じないようにする）
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def get_page_pool(max_workers: int) -> ProcessPoolExecutor:
+    """ワーカー数に対応する常駐プロセスプールを取得（初回呼び出し時に作成）"""
+    with _pool_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            # uvicornのスレッドを引き継がないようspawnで起動する
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pools[max_workers] = pool
+            logger.info(f"ページ並列用プロセスプールを起動: workers={max_workers}")
+        return pool
+
+
+def shutdown_page_pool(max_workers: Optional[int] = None):
+    """常駐プロセスプールを終了（ワーカー数を省略した場合はすべて）"""
+    with _pool_lock:
+        if max_workers is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            pools = [_pools.pop(max_workers)] if max_workers in _pools else []
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_page_ranges(page_count: int, shards: int) -> List[range]:
+    """ページを連続した範囲に均等分割"""
+    shards = max(1, min(shards, page_count))
+    size, remainder = divmod(page_count, shards)
+
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < remainder else 0)
+        ranges.append(range(start, stop))
+        start = stop
+    return ranges
+
+
+def _convert_shard(
+    converter_cls: Type["PageShardedConverter"],
+    options: Dict[str, Any],
+    pdf_path: str,
+    pages: List[int],
+    context: Optional[Dict[str, Any]] = None
+) -> List[PageResult]:
+    """ワーカープロセスでコンバーターを同じオプションで作り直し、ページ範囲を抽出"""
+    return converter_cls(**options).convert_pages(pdf_path, pages, context)
+
+
+class PageShardedConverter(ConverterInterface):
+    """ページ範囲単位で分割実行できるコンバーター
+
+    workersが2以上かつページ数がPARALLEL_MIN_PAGES以上の場合、
+    ページ範囲をプロセスプールに送り、結果をページ順にマージする。
+    文書全体に依存する情報（見出しレベルの対応表など）はdocument_contextで親プロセスが1回だけ求め、
+    各範囲に渡すため、分割実行でも逐次実行と同じ結果になる。
+    """
+
+    # これより少ないページ数ではプロセス間転送のほうが高くつくため逐次実行
+    PARALLEL_MIN_PAGES = 8
+    # ストリーミング時に1回でワーカーに渡す最大ページ数
+    STREAM_SHARD_PAGES = 16
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers
+
+    @abstractmethod
+    def convert_pages(
+        self,
+        source: PdfSource,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> List[PageResult]:
+        """指定ページ（0始まり）を抽出してページ単位の結果を返す
+
+        contextはdocument_contextの戻り値（省略時は必要に応じて文書全体から求める）
+        """
+        pass
+
+    def shard_options(self) -> Dict[str, Any]:
+        """ワーカープロセスでコンバーターを作り直すためのコンストラクタ引数（pickle可能な値のみ）"""
+        return {}
+
+    def document_context(self, doc: PdfDocument) -> Optional[Dict[str, Any]]:
+        """文書全体で1回だけ求めて各ページ範囲に渡す情報（既定はなし）"""
+        return None
+
+    def iter_page_results(
+        self,
+        doc: PdfDocument,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> Iterator[PageResult]:
+        """指定ページの結果を1ページずつ返す（既定は1ページずつconvert_pagesを呼ぶ）"""
+        for page_num in pages:
+            yield from self.convert_pages(doc, [page_num], context)
+
+    def merge_page_results(self, page_results: List[PageResult], page_count: int) -> ConversionResult:
+        """ページ単位の結果をページ順にマージ"""
+        page_results = sorted(page_results, key=lambda r: r.page_number)
+        images = attach_image_references(
+            [img for r in page_results for img in r.images],
+            [ref for r in page_results for ref in r.image_refs]
+        )
+        return ConversionResult(
+            text=self.join_page_texts([r.text for r in page_results]),
+            images=merge_duplicate_images(images),
+            tables=[table for r in page_results for table in r.tables],
+            page_count=page_count
+        )
+
+    def convert(self, source: PdfSource) -> ConversionResult:
+        """PDF変換を実行（条件を満たせばページ並列）"""
+        with open_document(source) as doc:
+            page_count = doc.page_count
+            if self.workers > 1 and page_count >= self.PARALLEL_MIN_PAGES:
+                try:
+                    return self._convert_parallel(doc.pdf_path, page_count, self.document_context(doc))
+                except BrokenProcessPool as e:
+                    # ワーカーが異常終了した場合はプールを作り直し、今回は逐次実行
+                    logger.warning(f"プロセスプールが異常終了しました: {e}。逐次実行にフォールバック")
+                    shutdown_page_pool(self.workers)
+            return super().convert(doc)
+
+    def iter_pages(self, source: PdfSource) -> Iterator[PageResult]:
+        """ページ単位の結果をページ順に返す（条件を満たせばページ並列）"""
+        with open_document(source) as doc:
+            page_count = doc.page_count
+            next_page = 0
+            context = None
+            if self.workers > 1 and page_count >= self.PARALLEL_MIN_PAGES:
+                context = self.document_context(doc)
+                try:
+                    for page_result in self._iter_parallel(doc.pdf_path, page_count, context):
+                        next_page = page_result.page_number
+                        yield page_result
+                except BrokenProcessPool as e:
+                    # 未処理のページから逐次実行で続ける
+                    logger.warning(f"プロセスプールが異常終了しました: {e}。逐次実行にフォールバック")
+                    shutdown_page_pool(self.workers)
+                else:
+                    return
+            yield from self.iter_page_results(doc, range(next_page, page_count), context)
+
+    def _submit_shard(
+        self,
+        pool: ProcessPoolExecutor,
+        pdf_path: str,
+        page_range: range,
+        context: Optional[Dict[str, Any]]
+    ):
+        """ページ範囲をプロセスプールに送る（コンストラクタ引数と文書全体の情報も渡す）"""
+        return pool.submit(
+            _convert_shard, type(self), self.shard_options(), pdf_path, list(page_range), context
+        )
+
+    def _iter_parallel(
+        self,
+        pdf_path: str,
+        page_count: int,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Iterator[PageResult]:
+        """ページ範囲をプロセスプールで並列抽出し、ページ順に返す
+
+        メモリを抑えるため、範囲はSTREAM_SHARD_PAGES以下に分け、同時に処理する範囲はworkers個までとする
+        """
+        pool = get_page_pool(self.workers)
+        shard_count = max(self.workers, math.ceil(page_count / self.STREAM_SHARD_PAGES))
+        shards = iter(split_page_ranges(page_count, shard_count))
+
+        pending = deque(
+            self._submit_shard(pool, pdf_path, page_range, context)
+            for page_range in islice(shards, self.workers)
+        )
+        while pending:
+            page_results = pending.popleft().result()
+            page_range = next(shards, None)
+            if page_range is not None:
+                pending.append(self._submit_shard(pool, pdf_path, page_range, context))
+            yield from page_results
+
+    def _convert_parallel(
+        self,
+        pdf_path: str,
+        page_count: int,
+        context: Optional[Dict[str, Any]] = None
+    ) -> ConversionResult:
+        """ページ範囲をプロセスプールで並列抽出"""
+        pool = get_page_pool(self.workers)
+        shards = split_page_ranges(page_count, self.workers)
+
+        futures = [self._submit_shard(pool, pdf_path, page_range, context) for page_range in shards]
+
+        page_results: List[PageResult] = []
+        for future in futures:
+            page_results.extend(future.result())
+
+        logger.info(
+            f"{type(self).__name__}: {page_count}ページを{len(shards)}分割で並列抽出"
+        )
+        return self.merge_page_results(page_results, page_count)
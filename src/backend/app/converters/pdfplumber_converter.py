@@ -2,100 +2,220 @@
 pdfplumberコンバーター
 表抽出に強いPDF処理
 """
-from typing import List
-import pdfplumber
+from typing import Any, Dict, List, Optional, Sequence
 import io
-from PIL import Image
 
-from app.converters.base import ConverterInterface, ExtractedImage, Table, ConversionResult
+from app.converters.base import ExtractedImage, Table, ConversionResult, PageResult, merge_duplicate_images
+from app.converters.document import PdfSource, open_document
+from app.converters.parallel import PageShardedConverter
 
 
-class PdfPlumberConverter(ConverterInterface):
+class PdfPlumberConverter(PageShardedConverter):
     """pdfplumberを使用したコンバーター"""
 
-    def extract_text(self, pdf_path: str) -> str:
+    # 画像切り出しの解像度（dpi）
+    IMAGE_RESOLUTION = 150
+
+    def __init__(self, workers: int = 0, render_once: bool = True):
+        super().__init__(workers=workers)
+        # Trueの場合、ページを1回だけレンダリングして画像領域を切り出す
+        self.render_once = render_once
+
+    def extract_text(self, source: PdfSource) -> str:
         """PDFからテキストを抽出"""
         text_parts = []
 
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if text and text.strip():
-                    text_parts.append(f"--- Page {page_num + 1} ---\n{text}")
+        with open_document(source) as doc:
+            for page_num, page in enumerate(doc.plumber_pdf.pages):
+                text = self._extract_page_text(page, page_num)
+                if text:
+                    text_parts.append(text)
+                # セッションを共有するためページのキャッシュは都度解放
+                page.flush_cache()
 
         return "\n\n".join(text_parts)
 
-    def extract_images(self, pdf_path: str) -> List[ExtractedImage]:
+    def _extract_page_text(self, page, page_num: int) -> str:
+        """1ページ分のテキストを抽出（空ページは空文字）"""
+        text = page.extract_text()
+        if text and text.strip():
+            return f"--- Page {page_num + 1} ---\n{text}"
+        return ""
+
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
         """PDFから画像を抽出"""
         images = []
 
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_images = page.images
-
-                for img_index, img in enumerate(page_images):
-                    try:
-                        # pdfplumberの画像情報から画像を抽出
-                        # 注意: pdfplumberは直接バイナリを提供しないので、
-                        # ページを画像としてレンダリングする方法を使用
-                        x0, y0, x1, y1 = img["x0"], img["top"], img["x1"], img["bottom"]
-                        width = int(x1 - x0)
-                        height = int(y1 - y0)
-
-                        # 画像が小さすぎる場合はスキップ
-                        if width < 10 or height < 10:
-                            continue
-
-                        # ページの該当部分を切り出し
-                        cropped = page.crop((x0, y0, x1, y1))
-                        pil_image = cropped.to_image(resolution=150).original
-
-                        # バイト列に変換
-                        img_buffer = io.BytesIO()
-                        pil_image.save(img_buffer, format="PNG")
-                        img_data = img_buffer.getvalue()
-
-                        images.append(ExtractedImage(
-                            data=img_data,
-                            page_number=page_num + 1,
-                            order_in_page=img_index,
-                            width=width,
-                            height=height,
-                            mime_type="image/png"
-                        ))
-                    except Exception:
-                        continue
+        with open_document(source) as doc:
+            for page_num, page in enumerate(doc.plumber_pdf.pages):
+                images.extend(self._extract_page_images(page, page_num))
+                page.flush_cache()
+
+        return merge_duplicate_images(images)
+
+    def _extract_page_images(self, page, page_num: int) -> List[ExtractedImage]:
+        """1ページ分の画像を抽出"""
+        if self.render_once:
+            return self._extract_page_images_render_once(page, page_num)
+
+        images = []
+
+        for img_index, img in enumerate(page.images):
+            try:
+                # pdfplumberの画像情報から画像を抽出
+                # 注意: pdfplumberは直接バイナリを提供しないので、
+                # ページを画像としてレンダリングする方法を使用
+                x0, y0, x1, y1 = img["x0"], img["top"], img["x1"], img["bottom"]
+                width = int(x1 - x0)
+                height = int(y1 - y0)
+
+                # 画像が小さすぎる場合はスキップ
+                if width < 10 or height < 10:
+                    continue
+
+                # ページの該当部分を切り出し
+                cropped = page.crop((x0, y0, x1, y1))
+                pil_image = cropped.to_image(resolution=self.IMAGE_RESOLUTION).original
+
+                images.append(self._to_extracted_image(pil_image, page_num, img_index, width, height))
+            except Exception:
+                continue
+
+        return images
+
+    def _extract_page_images_render_once(self, page, page_num: int) -> List[ExtractedImage]:
+        """1ページ分の画像を抽出（ページを1回だけレンダリングして各領域を切り出す）"""
+        # レンダリング前に、小さすぎる領域と他の画像に完全に覆われる領域を除外
+        regions = []
+        for img_index, img in enumerate(page.images):
+            bbox = (img["x0"], img["top"], img["x1"], img["bottom"])
+            width = int(bbox[2] - bbox[0])
+            height = int(bbox[3] - bbox[1])
+            if width < 10 or height < 10:
+                continue
+            regions.append((img_index, bbox, width, height))
+
+        regions = [
+            region for i, region in enumerate(regions)
+            if not any(self._covers(other[1], region[1], j < i) for j, other in enumerate(regions) if j != i)
+        ]
+        if not regions:
+            return []
+
+        page_image = page.to_image(resolution=self.IMAGE_RESOLUTION).original
+        # pdfplumber.display.PageImageと同じスケール・座標変換で切り出す
+        scale = page_image.size[0] / (page.cropbox[2] - page.cropbox[0])
+
+        images = []
+        for img_index, bbox, width, height in regions:
+            try:
+                cropped = page.crop(bbox)
+                pil_image = page_image.crop(self._pixel_box(cropped, scale))
+                images.append(self._to_extracted_image(pil_image, page_num, img_index, width, height))
+            except Exception:
+                continue
 
         return images
 
-    def extract_tables(self, pdf_path: str) -> List[Table]:
+    @staticmethod
+    def _covers(outer, inner, keep_earlier: bool) -> bool:
+        """outerがinnerを完全に覆うか（同一領域の場合は先に現れたものだけを残す）"""
+        if tuple(outer) == tuple(inner):
+            return keep_earlier
+        return (
+            outer[0] <= inner[0] and outer[1] <= inner[1]
+            and outer[2] >= inner[2] and outer[3] >= inner[3]
+        )
+
+    @staticmethod
+    def _pixel_box(cropped, scale: float):
+        """切り出したページ範囲をページ画像上のピクセル座標に変換"""
+        bbox = cropped.bbox
+
+        def reproject(x, top):
+            return int((x - bbox[0]) * scale), int((top - bbox[1]) * scale)
+
+        crop_x0, crop_top = reproject(cropped.cropbox[0], cropped.cropbox[1])
+        bbox_x1, bbox_bottom = reproject(bbox[2], bbox[3])
+        return (-crop_x0, -crop_top, bbox_x1 - crop_x0, bbox_bottom - crop_top)
+
+    @staticmethod
+    def _to_extracted_image(pil_image, page_num: int, img_index: int, width: int, height: int) -> ExtractedImage:
+        """PIL画像をPNGのExtractedImageに変換"""
+        # バイト列に変換
+        img_buffer = io.BytesIO()
+        pil_image.save(img_buffer, format="PNG")
+
+        return ExtractedImage(
+            data=img_buffer.getvalue(),
+            page_number=page_num + 1,
+            order_in_page=img_index,
+            width=width,
+            height=height,
+            mime_type="image/png"
+        )
+
+    def extract_tables(self, source: PdfSource) -> List[Table]:
         """PDFから表を抽出"""
         tables = []
 
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_tables = page.extract_tables()
+        with open_document(source) as doc:
+            for page_num, page in enumerate(doc.plumber_pdf.pages):
+                tables.extend(self._extract_page_tables(page, page_num))
+                page.flush_cache()
+
+        return tables
+
+    def _extract_page_tables(self, page, page_num: int) -> List[Table]:
+        """1ページ分の表を抽出"""
+        tables = []
 
-                for table_data in page_tables:
-                    if not table_data or len(table_data) < 2:
-                        continue
+        for table_data in page.extract_tables():
+            if not table_data or len(table_data) < 2:
+                continue
 
-                    # 最初の行をヘッダーとして扱う
-                    headers = [str(cell) if cell else "" for cell in table_data[0]]
-                    rows = [
-                        [str(cell) if cell else "" for cell in row]
-                        for row in table_data[1:]
-                    ]
+            # 最初の行をヘッダーとして扱う
+            headers = [str(cell) if cell else "" for cell in table_data[0]]
+            rows = [
+                [str(cell) if cell else "" for cell in row]
+                for row in table_data[1:]
+            ]
 
-                    tables.append(Table(
-                        headers=headers,
-                        rows=rows,
-                        page_number=page_num + 1
-                    ))
+            tables.append(Table(
+                headers=headers,
+                rows=rows,
+                page_number=page_num + 1
+            ))
 
         return tables
 
-    def get_page_count(self, pdf_path: str) -> int:
+    def get_page_count(self, source: PdfSource) -> int:
         """ページ数を取得"""
-        with pdfplumber.open(pdf_path) as pdf:
-            return len(pdf.pages)
+        with open_document(source) as doc:
+            return doc.page_count
+
+    def shard_options(self) -> Dict[str, Any]:
+        """ワーカープロセスでも同じ画像切り出し方式を使う"""
+        return {"render_once": self.render_once}
+
+    def convert_pages(
+        self,
+        source: PdfSource,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> List[PageResult]:
+        """指定ページを抽出（ページ並列実行用、文書全体の情報は使わない）"""
+        page_results = []
+
+        with open_document(source) as doc:
+            for page_num in pages:
+                page = doc.plumber_pdf.pages[page_num]
+                page_results.append(PageResult(
+                    page_number=page_num + 1,
+                    text=self._extract_page_text(page, page_num),
+                    images=self._extract_page_images(page, page_num),
+                    tables=self._extract_page_tables(page, page_num)
+                ))
+                page.flush_cache()
+
+        return page_results
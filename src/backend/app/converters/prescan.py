@@ -0,0 +1,88 @@
+"""
+PDF事前スキャン
+アップロード時にPDFを1回だけ走査し、後段（コンバーター選択・コスト見積り・重複判定）で使う特徴を集める
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+import hashlib
+import logging
+
+from app.converters.document import PdfSource, open_document
+from app.converters.page_analysis import has_text_layer, is_table_candidate
+
+logger = logging.getLogger(__name__)
+
+# ファイルハッシュ計算時の読み込み単位
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class PagePrescan:
+    """ページ単位の事前スキャン結果"""
+    width: float
+    height: float
+    has_text: bool
+    image_count: int
+    table_candidate: bool
+
+
+@dataclass
+class PrescanResult:
+    """PDF事前スキャン結果"""
+    content_hash: str
+    page_count: int
+    pages: List[PagePrescan] = field(default_factory=list)
+
+    @property
+    def text_page_count(self) -> int:
+        """テキスト層のあるページ数"""
+        return sum(1 for page in self.pages if page.has_text)
+
+    @property
+    def image_count(self) -> int:
+        """画像の総数（ページごとの配置数の合計）"""
+        return sum(page.image_count for page in self.pages)
+
+    @property
+    def table_page_count(self) -> int:
+        """表候補ページ数"""
+        return sum(1 for page in self.pages if page.table_candidate)
+
+    def pages_to_list(self) -> List[Dict[str, Any]]:
+        """ページ単位の結果を辞書のリストに変換（JSON保存用）"""
+        return [asdict(page) for page in self.pages]
+
+
+def compute_content_hash(pdf_path: str) -> str:
+    """ファイル内容のSHA-256ハッシュを計算"""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prescan_pdf(source: PdfSource) -> PrescanResult:
+    """PDFを1回走査して特徴を集める"""
+    with open_document(source) as doc:
+        pages = []
+        for page in doc.fitz_doc:
+            pages.append(PagePrescan(
+                width=round(page.rect.width, 2),
+                height=round(page.rect.height, 2),
+                has_text=has_text_layer(page),
+                image_count=len(page.get_images(full=True)),
+                table_candidate=is_table_candidate(page)
+            ))
+
+        result = PrescanResult(
+            content_hash=compute_content_hash(doc.pdf_path),
+            page_count=doc.page_count,
+            pages=pages
+        )
+
+    logger.info(
+        f"事前スキャン: {result.page_count}ページ（テキスト層 {result.text_page_count}、"
+        f"表候補 {result.table_page_count}、画像 {result.image_count}）"
+    )
+    return result
@@ -2,103 +2,314 @@
 PyMuPDFコンバーター
 高速・軽量なPDF処理（PyMuPDF4LLMによる構造化抽出対応）
 """
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 import fitz  # PyMuPDF
-import io
 import logging
-from PIL import Image
 
-from app.converters.base import ConverterInterface, ExtractedImage, Table, ConversionResult
+from app.converters.base import (
+    ExtractedImage, ImageReference, Table, ConversionResult, PageResult,
+    attach_image_references, merge_duplicate_images
+)
+from app.converters.document import PdfDocument, PdfSource, open_document
+from app.converters.parallel import PageShardedConverter
 
 logger = logging.getLogger(__name__)
 
 
-class PyMuPDFConverter(ConverterInterface):
+class _DocumentHeaders:
+    """文書全体のフォントサイズから求めた見出しレベルの対応表"""
+
+    def __init__(self, header_sizes: List[int], body_limit: float):
+        # 見出しとみなすフォントサイズ（大きい順、最大6段階）
+        self.header_sizes = header_sizes
+        self.body_limit = body_limit
+
+    def level(self, fontsize: int) -> int:
+        """レイアウト解析で見出しと判定された領域の見出しレベル（本文サイズの見出しは最下位の段階）"""
+        if fontsize in self.header_sizes:
+            return self.header_sizes.index(fontsize) + 1
+        return min(len(self.header_sizes) + 1, 6)
+
+    def get_header_id(self, span: dict, page=None) -> str:
+        """PyMuPDF4LLM（レイアウト解析なし）のhdr_info: スパンのMarkdown見出し接頭辞"""
+        fontsize = round(span["size"])
+        if fontsize <= self.body_limit or fontsize not in self.header_sizes:
+            return ""
+        return "#" * self.level(fontsize) + " "
+
+
+class PyMuPDFConverter(PageShardedConverter):
     """PyMuPDFを使用したコンバーター（PyMuPDF4LLMによる構造化抽出対応）"""
 
-    def extract_text(self, pdf_path: str) -> str:
-        """PDFからテキストを抽出（PyMuPDF4LLMで構造化Markdown形式）"""
+    def __init__(self, workers: int = 0, detect_tables: bool = True):
+        super().__init__(workers=workers)
+        # Falseの場合は表検出を行わない（表を別のコンバーターで抽出する場合）
+        self.detect_tables = detect_tables
+
+    def shard_options(self) -> Dict[str, Any]:
+        """ワーカープロセスでも同じ表検出の設定を使う"""
+        return {"detect_tables": self.detect_tables}
+
+    def document_context(self, doc: PdfDocument) -> Optional[Dict[str, Any]]:
+        """文書全体のフォントサイズから見出しレベルの対応表を求める（ページ範囲ごとの抽出で共有）"""
         try:
-            # PyMuPDF4LLMを使用して構造化されたMarkdownを抽出
-            import pymupdf4llm
-            md_text = pymupdf4llm.to_markdown(pdf_path)
-            logger.info(f"PyMuPDF4LLMで構造化テキストを抽出: {len(md_text)} chars")
-            return md_text
+            from pymupdf4llm.helpers.pymupdf_rag import IdentifyHeaders
         except ImportError:
-            logger.warning("pymupdf4llmがインストールされていません。従来の方式にフォールバック")
-            return self._extract_text_legacy(pdf_path)
-        except Exception as e:
-            logger.warning(f"PyMuPDF4LLMでエラー発生: {e}。従来の方式にフォールバック")
-            return self._extract_text_legacy(pdf_path)
+            return None
+
+        headers = IdentifyHeaders(doc.fitz_doc)
+        return {
+            "header_sizes": sorted(headers.header_id, reverse=True),
+            "body_limit": headers.body_limit
+        }
+
+    def extract_text(self, source: PdfSource) -> str:
+        """PDFからテキストを抽出（PyMuPDF4LLMで構造化Markdown形式）
+
+        ページ単位の抽出と同じ見出しレベルになるよう、ページチャンクを連結する
+        """
+        with open_document(source) as doc:
+            try:
+                # PyMuPDF4LLMを使用して構造化されたMarkdownを抽出
+                md_text = self.join_page_texts(
+                    self._extract_page_texts_llm(doc, range(doc.page_count), self.document_context(doc))
+                )
+                logger.info(f"PyMuPDF4LLMで構造化テキストを抽出: {len(md_text)} chars")
+                return md_text
+            except ImportError:
+                logger.warning("pymupdf4llmがインストールされていません。従来の方式にフォールバック")
+                return self._extract_text_legacy(doc)
+            except Exception as e:
+                logger.warning(f"PyMuPDF4LLMでエラー発生: {e}。従来の方式にフォールバック")
+                return self._extract_text_legacy(doc)
 
-    def _extract_text_legacy(self, pdf_path: str) -> str:
+    def _extract_text_legacy(self, source: PdfSource) -> str:
         """従来のテキスト抽出（フォールバック用）"""
-        doc = fitz.open(pdf_path)
         text_parts = []
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text("text")
-            if text.strip():
-                text_parts.append(f"--- Page {page_num + 1} ---\n{text}")
+        with open_document(source) as doc:
+            for page_num in range(doc.page_count):
+                page = doc.fitz_doc[page_num]
+                text = page.get_text("text")
+                if text.strip():
+                    text_parts.append(f"--- Page {page_num + 1} ---\n{text}")
 
-        doc.close()
         return "\n\n".join(text_parts)
 
-    def extract_images(self, pdf_path: str) -> List[ExtractedImage]:
-        """PDFから画像を抽出"""
-        doc = fitz.open(pdf_path)
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
+        """PDFから画像を抽出（同一画像は1つにまとめる）"""
         images = []
+        image_refs: List[ImageReference] = []
+        seen_xrefs: Dict[int, Tuple[int, int]] = {}
+
+        with open_document(source) as pdf:
+            for page_num in range(pdf.page_count):
+                images.extend(self._extract_page_images(pdf.fitz_doc, page_num, seen_xrefs, image_refs))
+
+        return merge_duplicate_images(attach_image_references(images, image_refs))
+
+    def _extract_page_images(
+        self,
+        doc: fitz.Document,
+        page_num: int,
+        seen_xrefs: Optional[Dict[int, Tuple[int, int]]] = None,
+        image_refs: Optional[List[ImageReference]] = None
+    ) -> List[ExtractedImage]:
+        """1ページ分の画像を抽出
+
+        seen_xrefs（xref→最初の出現位置）に抽出済みのxrefがあれば画像データを取り出さず、
+        image_refsに再出現の参照だけを追加する
+        """
+        images = []
+        page = doc[page_num]
+        image_list = page.get_images(full=True)
+
+        for img_index, img_info in enumerate(image_list):
+            xref = img_info[0]
+            if seen_xrefs is not None and xref in seen_xrefs:
+                source_page_number, source_order = seen_xrefs[xref]
+                image_refs.append(ImageReference(
+                    page_number=page_num + 1,
+                    order_in_page=img_index,
+                    source_page_number=source_page_number,
+                    source_order_in_page=source_order
+                ))
+                continue
+
+            try:
+                base_image = doc.extract_image(xref)
+                image_data = base_image["image"]
+                image_ext = base_image["ext"]
+
+                # MIMEタイプを決定
+                mime_map = {
+                    "png": "image/png",
+                    "jpeg": "image/jpeg",
+                    "jpg": "image/jpeg",
+                    "gif": "image/gif",
+                    "bmp": "image/bmp"
+                }
+                mime_type = mime_map.get(image_ext.lower(), "image/png")
+
+                # 画像サイズはメタデータから取得（デコードしない）
+                image = ExtractedImage(
+                    data=image_data,
+                    page_number=page_num + 1,
+                    order_in_page=img_index,
+                    width=base_image["width"],
+                    height=base_image["height"],
+                    mime_type=mime_type
+                )
+            except Exception:
+                # 画像抽出に失敗した場合はスキップ
+                continue
+
+            images.append(image)
+            if seen_xrefs is not None:
+                seen_xrefs[xref] = (image.page_number, image.order_in_page)
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            image_list = page.get_images(full=True)
-
-            for img_index, img_info in enumerate(image_list):
-                xref = img_info[0]
-                try:
-                    base_image = doc.extract_image(xref)
-                    image_data = base_image["image"]
-                    image_ext = base_image["ext"]
-
-                    # 画像サイズを取得
-                    img = Image.open(io.BytesIO(image_data))
-                    width, height = img.size
-
-                    # MIMEタイプを決定
-                    mime_map = {
-                        "png": "image/png",
-                        "jpeg": "image/jpeg",
-                        "jpg": "image/jpeg",
-                        "gif": "image/gif",
-                        "bmp": "image/bmp"
-                    }
-                    mime_type = mime_map.get(image_ext.lower(), "image/png")
-
-                    images.append(ExtractedImage(
-                        data=image_data,
-                        page_number=page_num + 1,
-                        order_in_page=img_index,
-                        width=width,
-                        height=height,
-                        mime_type=mime_type
-                    ))
-                except Exception:
-                    # 画像抽出に失敗した場合はスキップ
-                    continue
-
-        doc.close()
         return images
 
-    def extract_tables(self, pdf_path: str) -> List[Table]:
-        """PDFから表を抽出（PyMuPDFでは簡易実装）"""
-        # PyMuPDFには高度な表抽出機能がないため、空のリストを返す
-        # 表抽出が必要な場合はpdfplumberを使用することを推奨
-        return []
+    def extract_tables(self, source: PdfSource) -> List[Table]:
+        """PDFから表を抽出（PyMuPDFの表検出を使用）"""
+        tables = []
+        if not self.detect_tables:
+            return tables
+
+        with open_document(source) as doc:
+            for page_num in range(doc.page_count):
+                tables.extend(self._extract_page_tables(doc.fitz_doc, page_num))
+
+        return tables
 
-    def get_page_count(self, pdf_path: str) -> int:
+    def _extract_page_tables(self, doc: fitz.Document, page_num: int) -> List[Table]:
+        """1ページ分の表を抽出"""
+        tables = []
+
+        page = doc[page_num]
+        # 罫線（ベクター図形）のないページには罫線ベースの表がないため、表検出を省略する
+        if not page.get_drawings():
+            return tables
+
+        try:
+            found = page.find_tables()
+        except Exception as e:
+            # 表検出に失敗したページはスキップ
+            logger.warning(f"ページ{page_num + 1}の表検出でエラー発生: {e}")
+            return tables
+
+        for table in found.tables:
+            table_data = table.extract()
+            if not table_data or len(table_data) < 2:
+                continue
+
+            # 最初の行をヘッダーとして扱う（pdfplumberと同じ形式）
+            headers = [str(cell) if cell else "" for cell in table_data[0]]
+            rows = [
+                [str(cell) if cell else "" for cell in row]
+                for row in table_data[1:]
+            ]
+
+            tables.append(Table(
+                headers=headers,
+                rows=rows,
+                page_number=page_num + 1
+            ))
+
+        return tables
+
+    def get_page_count(self, source: PdfSource) -> int:
         """ページ数を取得"""
-        doc = fitz.open(pdf_path)
-        count = len(doc)
-        doc.close()
-        return count
+        with open_document(source) as doc:
+            return doc.page_count
+
+    def convert_pages(
+        self,
+        source: PdfSource,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> List[PageResult]:
+        """指定ページを抽出（ページ並列実行用）"""
+        with open_document(source) as doc:
+            return list(self.iter_page_results(doc, pages, context))
+
+    def iter_page_results(
+        self,
+        doc: PdfDocument,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> Iterator[PageResult]:
+        """指定ページの結果を1ページずつ返す
+
+        見出しレベルは文書全体の対応表（context、省略時はここで求める）で決め、
+        テキストは対象ページ全体で先に抽出し、画像はページごとに抽出する
+        """
+        pages = list(pages)
+        texts = self._extract_page_texts(doc, pages, context) if pages else []
+        seen_xrefs: Dict[int, Tuple[int, int]] = {}
+
+        for page_num, text in zip(pages, texts):
+            image_refs: List[ImageReference] = []
+            images = self._extract_page_images(doc.fitz_doc, page_num, seen_xrefs, image_refs)
+            yield PageResult(
+                page_number=page_num + 1,
+                text=text,
+                images=images,
+                tables=self._extract_page_tables(doc.fitz_doc, page_num) if self.detect_tables else [],
+                image_refs=image_refs
+            )
+
+    def _extract_page_texts(
+        self,
+        doc: PdfDocument,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """指定ページのテキストをページ単位で抽出"""
+        try:
+            if context is None:
+                context = self.document_context(doc)
+            return self._extract_page_texts_llm(doc, pages, context)
+        except ImportError:
+            logger.warning("pymupdf4llmがインストールされていません。従来の方式にフォールバック")
+        except Exception as e:
+            logger.warning(f"PyMuPDF4LLMでエラー発生: {e}。従来の方式にフォールバック")
+
+        texts = []
+        for page_num in pages:
+            text = doc.fitz_doc[page_num].get_text("text")
+            # join_page_texts は区切りなしで連結するため、ページ末尾に空行を含める
+            texts.append(f"--- Page {page_num + 1} ---\n{text}\n\n" if text.strip() else "")
+        return texts
+
+    def _extract_page_texts_llm(
+        self,
+        doc: PdfDocument,
+        pages: Sequence[int],
+        context: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        """PyMuPDF4LLMでページ単位のMarkdownを抽出（見出しレベルは文書全体の対応表で決める）"""
+        import pymupdf4llm
+
+        headers = _DocumentHeaders(**context) if context else None
+        if hasattr(pymupdf4llm, "IdentifyHeaders"):
+            # レイアウト解析なし: 見出し判定にフォントサイズの対応表を渡す
+            chunks = pymupdf4llm.to_markdown(
+                doc.fitz_doc, pages=list(pages), page_chunks=True, hdr_info=headers
+            )
+            return [chunk["text"] for chunk in chunks]
+
+        # レイアウト解析あり: 見出しレベルは解析したページ内で決まるため、文書全体の対応表で付け直す
+        # （解析と出力のオプションは pymupdf4llm.to_markdown と同じ）
+        from pymupdf4llm.helpers.document_layout import parse_document
+        parsed = parse_document(doc.fitz_doc, pages=list(pages), force_text=True, use_ocr=True)
+        if headers is not None:
+            for page in parsed.pages:
+                for box in page.boxes:
+                    if box.boxclass in ("title", "section-header"):
+                        box.header_level = headers.level(box.max_fontsize)
+        return [chunk["text"] for chunk in parsed.to_markdown(page_chunks=True)]
+
+    def join_page_texts(self, texts: List[str]) -> str:
+        """ページ単位のテキストを結合（PyMuPDF4LLMのページチャンクは区切りなしで連結）"""
+        return "".join(texts)
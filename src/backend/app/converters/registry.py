@@ -0,0 +1,104 @@
+"""
+コンバーターレジストリ
+ConverterManagerをユーザーごとにプロセス全体で共有し、コンバーターとAPIクライアントを使い回す
+"""
+from typing import Dict, Optional
+import logging
+import threading
+
+from app.converters.manager import ConverterManager
+from app.converters.page_encoder import PageEncoder
+from app.core.config import settings
+from app.infrastructure.vision_cache import vision_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ConverterRegistry:
+    """ConverterManagerのレジストリ
+
+    ユーザーIDごとにConverterManagerを1つだけ作成して保持する。
+    APIキー・モデルが変わった場合は該当コンバーターを破棄して作り直す。
+    user_idがNoneのマネージャーはページ数取得などAPIキー不要の処理に使う。
+    """
+
+    def __init__(self):
+        self._managers: Dict[Optional[int], ConverterManager] = {}
+        self._lock = threading.Lock()
+
+    def _create_manager(self) -> ConverterManager:
+        """アプリ設定からConverterManagerを作成"""
+        return ConverterManager(
+            openai_model=settings.OPENAI_MODEL,
+            anthropic_model=settings.ANTHROPIC_MODEL,
+            default_converter=settings.DEFAULT_CONVERTER,
+            parallel_workers=settings.CONVERTER_WORKERS,
+            vision_concurrency=settings.VISION_CONCURRENCY,
+            vision_combined=settings.VISION_COMBINED_EXTRACTION,
+            vision_cache=vision_cache if settings.VISION_CACHE_ENABLED else None,
+            vision_encoder=PageEncoder(
+                max_bytes=settings.VISION_IMAGE_MAX_KB * 1024,
+                quality=settings.VISION_IMAGE_QUALITY,
+                photo_format=settings.VISION_PHOTO_FORMAT
+            )
+        )
+
+    def get(
+        self,
+        user_id: Optional[int] = None,
+        openai_api_key: Optional[str] = None,
+        anthropic_api_key: Optional[str] = None,
+        openai_model: Optional[str] = None,
+        anthropic_model: Optional[str] = None
+    ) -> ConverterManager:
+        """ConverterManagerを取得（指定したAPIキー・モデルと異なる場合は更新）"""
+        with self._lock:
+            manager = self._managers.get(user_id)
+            if manager is None:
+                manager = self._create_manager()
+                self._managers[user_id] = manager
+                logger.info(f"ConverterManagerを作成: user_id={user_id}")
+
+        # 別プロセスで設定が更新された場合もここで反映される
+        self.update_api_keys(user_id, openai_api_key, anthropic_api_key)
+        self.update_models(user_id, openai_model, anthropic_model)
+        return manager
+
+    def update_api_keys(
+        self,
+        user_id: Optional[int],
+        openai_api_key: Optional[str] = None,
+        anthropic_api_key: Optional[str] = None
+    ):
+        """APIキーの変更を反映（変更があったコンバーターとAPIクライアントを破棄）"""
+        manager = self._managers.get(user_id)
+        if manager is None:
+            return
+        manager.update_api_keys(
+            openai_api_key=openai_api_key if openai_api_key != manager.openai_api_key else None,
+            anthropic_api_key=anthropic_api_key if anthropic_api_key != manager.anthropic_api_key else None
+        )
+
+    def update_models(
+        self,
+        user_id: Optional[int],
+        openai_model: Optional[str] = None,
+        anthropic_model: Optional[str] = None
+    ):
+        """モデルの変更を反映（変更があったコンバーターを破棄）"""
+        manager = self._managers.get(user_id)
+        if manager is None:
+            return
+        manager.update_models(
+            openai_model=openai_model if openai_model != manager.openai_model else None,
+            anthropic_model=anthropic_model if anthropic_model != manager.anthropic_model else None
+        )
+
+    def evict(self, user_id: Optional[int] = None):
+        """ConverterManagerを破棄"""
+        with self._lock:
+            self._managers.pop(user_id, None)
+
+
+# シングルトンインスタンス
+converter_registry = ConverterRegistry()
@@ -0,0 +1,614 @@
+"""
+Visionコンバーター基底クラス
+OpenAI/Claude Visionで共通のページレンダリング・非同期並列リクエスト処理
+"""
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import copy
+import hashlib
+import time
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+import asyncio
+import contextvars
+import json
+import logging
+
+from app.converters.base import (
+    ConverterInterface, ConversionResult, ExtractedImage, ImageReference, PageResult, Table,
+    attach_image_references, merge_duplicate_images
+)
+from app.converters.batch import (
+    REQUEST_COMPLETED, REQUEST_FAILED, BatchFailedException, BatchRequest, VisionBatchClient,
+    VisionBatchScheduler, get_batch_store, vision_batch_scheduler
+)
+from app.converters.document import PdfDocument, PdfSource, open_document
+from app.converters.page_encoder import EncodedPage, PageEncoder
+from app.infrastructure.api_clients import api_client_pool
+from app.infrastructure.monitoring import observe_api_call
+from app.infrastructure.rate_limiter import (
+    ProviderScheduler, api_rate_limiter, estimate_image_tokens, estimate_text_tokens
+)
+from app.infrastructure.stage_metrics import (
+    STAGE_RENDER, STAGE_VISION_API, STAGE_VISION_BATCH_WAIT, STAGE_VISION_CACHE_HIT, StageRecorder,
+    count_stage, get_recorder, record_stage, recording
+)
+from app.infrastructure.vision_cache import VisionCache
+from app.core.exceptions import VisionBatchPendingException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# 構造化プロンプト（日本語文書向け）
+EXTRACTION_PROMPT = """あなたは日本語文書のOCR専門家です。この画像から正確にテキストを抽出し、以下のMarkdown形式で構造化してください。
+
+【出力形式】
+# 大見出し（最も大きいフォント）
+## 中見出し（次に大きいフォント）
+### 小見出し（太字や強調）
+
+通常の段落テキスト
+
+- 箇条書き項目（・●○などで始まるもの）
+- 箇条書き項目
+
+1. 番号付きリスト（(1) ① などで始まるもの）
+2. 番号付きリスト
+
+> 引用や重要な囲み
+
+【日本語文書特有の注意事項】
+- 法令番号（例：昭和45年法律第84号、平成25年法律第65号）は正確に抽出
+- 括弧（（）「」）は全角を維持
+- 漢数字（第一、第二）と算用数字を混同しない
+- 「第１」「第２」などの章番号は全角数字を維持
+- 段落の途中で改行しない
+
+テキストを抽出してください："""
+
+# 表抽出プロンプト
+TABLE_EXTRACTION_PROMPT = """この画像に表がある場合、すべての表を抽出してください。
+                                各表は以下のJSON形式で出力してください:
+                                {"tables": [{"headers": ["列1", "列2"], "rows": [["値1", "値2"], ...]}]}
+                                表がない場合は {"tables": []} を返してください。"""
+
+# テキストと表を1回で抽出する場合の区切り行
+COMBINED_TABLES_MARKER = "===TABLES==="
+
+# テキスト・表の同時抽出プロンプト
+COMBINED_EXTRACTION_PROMPT = EXTRACTION_PROMPT.rsplit("\n", 1)[0] + f"""
+【表の出力】
+Markdownの後に「{COMBINED_TABLES_MARKER}」という1行を出力し、続けてこの画像内のすべての表を以下のJSON形式で出力してください:
+{{"tables": [{{"headers": ["列1", "列2"], "rows": [["値1", "値2"], ...]}}]}}
+表がない場合も「{COMBINED_TABLES_MARKER}」の後に {{"tables": []}} を出力してください。
+
+テキストと表を抽出してください："""
+
+
+def run_coroutine_sync(coro: Awaitable[T]) -> T:
+    """コルーチンを同期的に実行
+
+    プールした非同期クライアントを使い回すため、常に共有イベントループ上で実行する。
+    """
+    return api_client_pool.run(coro)
+
+
+class VisionConverter(ConverterInterface):
+    """Vision APIを使用したコンバーターの基底クラス
+
+    concurrencyが2以上の場合は非同期クライアントでページを並列にリクエストする。
+    ページのレンダリングは専用スレッドで行い、API応答待ちと並行して進める。
+    結果は常にページ順に返す。
+    APIクライアントはAPIキーごとにプールしたものを使い、接続を変換間で使い回す。
+    リクエストはAPIキーごとのレートリミッターを通し、429・5xxはリミッターがリトライする。
+    combinedが有効な場合、convert()は1ページにつき1回のリクエストでテキストと表を取得する。
+    batchが有効な場合はページのリクエストをBatch APIで送る。変換ジョブでは完了を待たずにジョブを待機中に戻し、
+    再実行時に保存済みのリクエストから結果を取得する（保存先がなければ完了まで待つ）。
+    """
+
+    # 画像解像度スケール（3倍で高精度OCR、最終的な値はPageEncoderが決める）
+    RESOLUTION_SCALE = 3
+    # 最大画像サイズ（ピクセル）
+    MAX_IMAGE_DIMENSION = 4096
+    # テキスト抽出・表抽出のmax_tokens
+    TEXT_MAX_TOKENS = 8000
+    TABLE_MAX_TOKENS = 4000
+    # 同時リクエスト数の既定値
+    DEFAULT_CONCURRENCY = 4
+    # クライアントプールのプロバイダー名
+    PROVIDER = ""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        combined: bool = True,
+        cache: Optional[VisionCache] = None,
+        encoder: Optional[PageEncoder] = None,
+        batch: bool = False,
+        batch_client: Optional[VisionBatchClient] = None,
+        batch_scheduler: Optional[VisionBatchScheduler] = None
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.combined = combined
+        self.cache = cache
+        self.encoder = encoder or PageEncoder(
+            scale=self.RESOLUTION_SCALE, max_dimension=self.MAX_IMAGE_DIMENSION
+        )
+        self.batch = batch
+        # テストではローカルのスタンドインサーバーに向けたクライアントを渡す
+        self._batch_client = batch_client
+        self.batch_scheduler = batch_scheduler or vision_batch_scheduler
+
+    def with_batch_mode(self) -> "VisionConverter":
+        """Batch APIで処理するコピーを返す（キャッシュ・クライアントは共有）"""
+        converter = copy.copy(self)
+        converter.batch = True
+        return converter
+
+    @property
+    def batch_client(self) -> VisionBatchClient:
+        """Batch APIクライアントを取得（プールのクライアントを包むため保持せず、取得のたびに作る）"""
+        if self._batch_client is not None:
+            return self._batch_client
+        return self._create_batch_client()
+
+    @property
+    def client(self) -> Any:
+        """同期クライアントを取得（APIキーごとに共有）"""
+        return api_client_pool.get(self.PROVIDER, self.api_key, self._create_client)
+
+    @property
+    def rate_limiter(self) -> ProviderScheduler:
+        """APIキーごとのレートリミッターを取得（変換・HTML生成で共有）"""
+        return api_rate_limiter.get(self.PROVIDER, self.api_key)
+
+    @staticmethod
+    def _estimate_input_tokens(prompt: str, image: EncodedPage) -> int:
+        """1ページ分のリクエストの入力トークン数を概算"""
+        return estimate_text_tokens(prompt) + estimate_image_tokens(image.width, image.height)
+
+    @abstractmethod
+    def _create_client(self) -> Any:
+        """同期クライアントを作成"""
+        pass
+
+    @abstractmethod
+    def _create_async_client(self) -> Any:
+        """非同期クライアントを作成"""
+        pass
+
+    @abstractmethod
+    def _create_batch_client(self) -> VisionBatchClient:
+        """Batch APIクライアントを作成"""
+        pass
+
+    @abstractmethod
+    def _batch_params(self, prompt: str, image: EncodedPage, max_tokens: int) -> Dict[str, Any]:
+        """Batch APIに送る1ページ分のリクエストボディ"""
+        pass
+
+    @abstractmethod
+    def _request(self, prompt: str, image: EncodedPage, max_tokens: int) -> Optional[str]:
+        """1ページ分のリクエストを送信（同期）"""
+        pass
+
+    @abstractmethod
+    async def _arequest(
+        self, client: Any, prompt: str, image: EncodedPage, max_tokens: int
+    ) -> Optional[str]:
+        """1ページ分のリクエストを送信（非同期）"""
+        pass
+
+    def _get_max_tokens(self) -> int:
+        """テキスト抽出のmax_tokensを返す"""
+        return self.TEXT_MAX_TOKENS
+
+    def _render_page(self, doc: PdfDocument, page_num: int) -> EncodedPage:
+        """PDFページを送信用の画像にエンコード"""
+        with record_stage(STAGE_RENDER):
+            return self.encoder.encode(doc.fitz_doc[page_num])
+
+    def _timed_request(self, prompt: str, image: EncodedPage, max_tokens: int) -> Optional[str]:
+        """リクエストを送信して処理時間・エラーを記録（同期）"""
+        with record_stage(STAGE_VISION_API, measure_cpu=False), observe_api_call(self.PROVIDER, "vision"):
+            return self._request(prompt, image, max_tokens)
+
+    async def _atimed_request(
+        self, client: Any, prompt: str, image: EncodedPage, max_tokens: int
+    ) -> Optional[str]:
+        """リクエストを送信して処理時間・エラーを記録（非同期）"""
+        with record_stage(STAGE_VISION_API, measure_cpu=False), observe_api_call(self.PROVIDER, "vision"):
+            return await self._arequest(client, prompt, image, max_tokens)
+
+    def _request_page(self, prompt: str, image: EncodedPage, max_tokens: int) -> Optional[str]:
+        """1ページ分の応答を取得（キャッシュ優先、同期）"""
+        if self.cache is None:
+            return self._timed_request(prompt, image, max_tokens)
+
+        key = self.cache.make_key(image.data, self.model, prompt)
+        content = self.cache.get(key)
+        if content is None:
+            content = self._timed_request(prompt, image, max_tokens)
+            self.cache.set(key, content)
+        else:
+            count_stage(STAGE_VISION_CACHE_HIT)
+        return content
+
+    async def _arequest_page(
+        self, client: Any, prompt: str, image: EncodedPage, max_tokens: int
+    ) -> Optional[str]:
+        """1ページ分の応答を取得（キャッシュ優先、非同期）"""
+        if self.cache is None:
+            return await self._atimed_request(client, prompt, image, max_tokens)
+
+        key = self.cache.make_key(image.data, self.model, prompt)
+        content = self.cache.get(key)
+        if content is None:
+            content = await self._atimed_request(client, prompt, image, max_tokens)
+            self.cache.set(key, content)
+        else:
+            count_stage(STAGE_VISION_CACHE_HIT)
+        return content
+
+    def _map_pages(
+        self, doc: PdfDocument, pages: List[int], prompt: str, max_tokens: int
+    ) -> List[Optional[str]]:
+        """各ページをレンダリングしてリクエストし、応答をページ順に返す"""
+        if self.batch:
+            return self._map_pages_batch(doc, pages, prompt, max_tokens)
+        if self.concurrency <= 1 or len(pages) <= 1:
+            # 応答を受け取り終えるまでクライアントを借りておく（_requestはself.clientで同じクライアントを使う）
+            with api_client_pool.lease(self.PROVIDER, self.api_key, self._create_client):
+                return [
+                    self._request_page(prompt, self._render_page(doc, page_num), max_tokens)
+                    for page_num in pages
+                ]
+        # 共有イベントループのスレッドには計測の記録先を明示的に引き継ぐ
+        return run_coroutine_sync(
+            self._amap_pages(doc, pages, prompt, max_tokens, recorder=get_recorder())
+        )
+
+    def _map_pages_batch(
+        self, doc: PdfDocument, pages: List[int], prompt: str, max_tokens: int
+    ) -> List[Optional[str]]:
+        """Batch APIで各ページの応答を取得してページ順に返す
+
+        送信済みのリクエストは保存先（using_batch_store）から引き継ぎ、未完了のページがあれば
+        VisionBatchPendingExceptionを送出する（未送信のページは送信待ちに追加してから送出する）。
+        """
+        store = get_batch_store()
+        if store is None:
+            return self._wait_pages_batch(doc, pages, prompt, max_tokens)
+
+        request_key = self._batch_request_key(prompt)
+        stored = store.load(request_key)
+        contents: List[Optional[str]] = [None] * len(pages)
+        unsent: List[Tuple[int, int]] = []
+        completed: Dict[str, Optional[str]] = {}
+        failed: List[str] = []
+        pending = 0
+        batch_contents: Dict[str, Optional[Dict[str, Optional[str]]]] = {}
+        for index, page_num in enumerate(pages):
+            entry = stored.get(page_num)
+            if entry is None:
+                unsent.append((index, page_num))
+            elif entry.status == REQUEST_COMPLETED:
+                contents[index] = entry.content
+            elif entry.status == REQUEST_FAILED:
+                # 次の生成で送り直せるよう削除してから失敗させる
+                store.remove([e.custom_id for e in stored.values() if e.status == REQUEST_FAILED])
+                raise BatchFailedException(entry.error_message or "Batchの作成に失敗しました")
+            elif entry.batch_id is None:
+                age = (datetime.utcnow() - entry.created_at).total_seconds()
+                if self.batch_scheduler.is_queued(entry.custom_id) or age < self.batch_scheduler.submit_timeout:
+                    pending += 1
+                else:
+                    # 送信待ちのままワーカーが停止した
+                    store.remove([entry.custom_id])
+                    unsent.append((index, page_num))
+            else:
+                if entry.batch_id not in batch_contents:
+                    try:
+                        with observe_api_call(self.PROVIDER, "vision_batch"):
+                            batch_contents[entry.batch_id] = self.batch_scheduler.check(
+                                self.batch_client, entry.batch_id
+                            )
+                    except BatchFailedException:
+                        store.remove([e.custom_id for e in stored.values() if e.batch_id == entry.batch_id])
+                        raise
+                results = batch_contents[entry.batch_id]
+                if results is None:
+                    pending += 1
+                    continue
+                content = results.get(entry.custom_id)
+                if content is None:
+                    # 失敗したリクエスト・結果に含まれないリクエストは空のページとして完了にしない
+                    failed.append(entry.custom_id)
+                    continue
+                contents[index] = content
+                completed[entry.custom_id] = content
+                if self.cache is not None and entry.cache_key is not None:
+                    self.cache.set(entry.cache_key, content)
+
+        if completed:
+            store.set_results(completed)
+        if failed:
+            # 次の生成で送り直せるよう削除してから失敗させる（取得できたページは保存済み）
+            store.remove(failed)
+            raise BatchFailedException(f"Batchで{len(failed)}ページの応答を取得できませんでした")
+
+        requests: List[Tuple[int, Optional[str], BatchRequest]] = []
+        for index, page_num in unsent:
+            image = self._render_page(doc, page_num)
+            key = self.cache.make_key(image.data, self.model, prompt) if self.cache is not None else None
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                count_stage(STAGE_VISION_CACHE_HIT)
+                contents[index] = cached
+                continue
+            requests.append((page_num, key, BatchRequest.create(self._batch_params(prompt, image, max_tokens))))
+        if requests:
+            # 保存してから送信待ちに追加する（Batch IDは作成後に送信スレッドが保存する）
+            store.add(request_key, self.PROVIDER, requests)
+            self.batch_scheduler.submit(
+                self._batch_group_key(), self.batch_client, [r for _, _, r in requests], store=store
+            )
+            logger.info(f"Batch APIに{len(requests)}ページを送信待ちに追加しました（{self.PROVIDER}）")
+            pending += len(requests)
+
+        if pending:
+            raise VisionBatchPendingException(self.batch_scheduler.poll_seconds, pending)
+        return contents
+
+    def _wait_pages_batch(
+        self, doc: PdfDocument, pages: List[int], prompt: str, max_tokens: int
+    ) -> List[Optional[str]]:
+        """キャッシュにないページをBatch APIで送り、完了まで待って応答をページ順に返す（保存先がない場合）"""
+        contents: List[Optional[str]] = [None] * len(pages)
+        requests: List[Tuple[int, Optional[str], BatchRequest]] = []
+        for index, page_num in enumerate(pages):
+            image = self._render_page(doc, page_num)
+            key = self.cache.make_key(image.data, self.model, prompt) if self.cache is not None else None
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                count_stage(STAGE_VISION_CACHE_HIT)
+                contents[index] = cached
+                continue
+            requests.append((index, key, BatchRequest.create(self._batch_params(prompt, image, max_tokens))))
+
+        if not requests:
+            return contents
+
+        futures = self.batch_scheduler.submit(
+            self._batch_group_key(), self.batch_client, [r for _, _, r in requests]
+        )
+        logger.info(f"Batch APIに{len(requests)}ページを送信待ちに追加しました（{self.PROVIDER}）")
+
+        with record_stage(STAGE_VISION_BATCH_WAIT, measure_cpu=False), \
+                observe_api_call(self.PROVIDER, "vision_batch"):
+            batch_ids = [future.result(timeout=self.batch_scheduler.submit_timeout) for future in futures]
+            results: Dict[str, Dict[str, Optional[str]]] = {}
+            for batch_id in dict.fromkeys(batch_ids):
+                while True:
+                    batch_results = self.batch_scheduler.check(self.batch_client, batch_id)
+                    if batch_results is not None:
+                        results[batch_id] = batch_results
+                        break
+                    time.sleep(self.batch_scheduler.poll_seconds)
+
+        failed = 0
+        for (index, key, request), batch_id in zip(requests, batch_ids):
+            content = results[batch_id].get(request.custom_id)
+            if content is None:
+                # 失敗したリクエスト・結果に含まれないリクエストは空のページにしない
+                failed += 1
+                continue
+            contents[index] = content
+            if key is not None:
+                self.cache.set(key, content)
+        if failed:
+            raise BatchFailedException(f"Batchで{failed}ページの応答を取得できませんでした")
+        return contents
+
+    def _batch_group_key(self) -> Tuple[str, str, str]:
+        """Batchにまとめる単位（プロバイダー・APIキーのハッシュ・モデル）"""
+        return (self.PROVIDER, hashlib.sha256(self.api_key.encode("utf-8")).hexdigest(), self.model)
+
+    def _batch_request_key(self, prompt: str) -> str:
+        """保存済みのリクエストを引き継ぐ単位（プロバイダー・モデル・プロンプト）"""
+        return hashlib.sha256(f"{self.PROVIDER}:{self.model}:{prompt}".encode("utf-8")).hexdigest()
+
+    async def _amap_pages(
+        self,
+        doc: PdfDocument,
+        pages: List[int],
+        prompt: str,
+        max_tokens: int,
+        recorder: Optional[StageRecorder] = None
+    ) -> List[Optional[str]]:
+        """ページを並列にリクエスト（レンダリングは単一スレッドでパイプライン実行）"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # fitz.Documentはスレッドセーフではないため、レンダリングは1スレッドに限定する
+        render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vision-render")
+
+        async def process(client: Any, page_num: int) -> Optional[str]:
+            async with semaphore:
+                image = await loop.run_in_executor(
+                    render_executor, contextvars.copy_context().run, self._render_page, doc, page_num
+                )
+                return await self._arequest_page(client, prompt, image, max_tokens)
+
+        try:
+            # 非同期クライアントはAPIキーごとに共有し、全ページの応答を受け取り終えるまで借りておく
+            with recording(recorder), \
+                    api_client_pool.lease_async(self.PROVIDER, self.api_key, self._create_async_client) as client:
+                return list(await asyncio.gather(*(process(client, page_num) for page_num in pages)))
+        finally:
+            render_executor.shutdown(wait=True)
+
+    def extract_text(self, source: PdfSource) -> str:
+        """PDFからテキストを抽出（Vision APIを使用）"""
+        max_tokens = self._get_max_tokens()
+
+        with open_document(source) as doc:
+            pages = list(range(doc.page_count))
+            responses = self._map_pages(doc, pages, EXTRACTION_PROMPT, max_tokens)
+
+        return self._join_page_texts(pages, responses)
+
+    def _join_page_texts(self, pages: List[int], texts: List[Optional[str]]) -> str:
+        """ページごとのテキストにページ見出しを付けて結合"""
+        text_parts = []
+        for page_num, extracted_text in zip(pages, texts):
+            if extracted_text:
+                text_parts.append(f"--- Page {page_num + 1} ---\n{extracted_text}")
+
+        return "\n\n".join(text_parts)
+
+    def extract_images(self, source: PdfSource) -> List[ExtractedImage]:
+        """PDFから画像を抽出（PyMuPDFを使用）"""
+        # 画像抽出はPyMuPDFに委譲（開いたセッションをそのまま渡す）
+        from app.converters.pymupdf_converter import PyMuPDFConverter
+        pymupdf = PyMuPDFConverter()
+        return pymupdf.extract_images(source)
+
+    def extract_tables(self, source: PdfSource) -> List[Table]:
+        """PDFから表を抽出（Vision APIを使用）"""
+        max_tokens = self.TABLE_MAX_TOKENS
+
+        with open_document(source) as doc:
+            pages = list(range(doc.page_count))
+            responses = self._map_pages(doc, pages, TABLE_EXTRACTION_PROMPT, max_tokens)
+
+        tables = []
+        for page_num, content in zip(pages, responses):
+            tables.extend(self._parse_tables(content, page_num))
+
+        return tables
+
+    def _parse_tables(self, content: Optional[str], page_num: int) -> List[Table]:
+        """応答から表のJSONを取り出してTableに変換"""
+        tables = []
+        try:
+            # JSONを抽出
+            if content and "{" in content and "}" in content:
+                json_start = content.find("{")
+                json_end = content.rfind("}") + 1
+                json_str = content[json_start:json_end]
+                data = json.loads(json_str)
+
+                for table_data in data.get("tables", []):
+                    tables.append(Table(
+                        headers=table_data.get("headers", []),
+                        rows=table_data.get("rows", []),
+                        page_number=page_num + 1
+                    ))
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+        return tables
+
+    def _split_combined_response(
+        self, content: Optional[str], page_num: int
+    ) -> Tuple[Optional[str], List[Table]]:
+        """同時抽出の応答をMarkdownテキストと表に分割"""
+        if not content or COMBINED_TABLES_MARKER not in content:
+            # 区切り行がない場合は全体をテキストとして扱う
+            return content, []
+
+        text, tables_part = content.rsplit(COMBINED_TABLES_MARKER, 1)
+        return text.rstrip(), self._parse_tables(tables_part, page_num)
+
+    def _request_pages_content(
+        self, doc: PdfDocument, pages: List[int]
+    ) -> List[Tuple[Optional[str], List[Table]]]:
+        """指定ページのテキストと表をVision APIで取得"""
+        if self.combined:
+            responses = self._map_pages(doc, pages, COMBINED_EXTRACTION_PROMPT, self._get_max_tokens())
+            contents = [
+                self._split_combined_response(content, page_num)
+                for page_num, content in zip(pages, responses)
+            ]
+        else:
+            # Batch APIの完了待ちでも、表のリクエストを同じBatchに含められるよう先に送信する
+            pending: Optional[VisionBatchPendingException] = None
+            try:
+                texts = self._map_pages(doc, pages, EXTRACTION_PROMPT, self._get_max_tokens())
+            except VisionBatchPendingException as e:
+                pending = e
+            table_responses = self._map_pages(doc, pages, TABLE_EXTRACTION_PROMPT, self.TABLE_MAX_TOKENS)
+            if pending is not None:
+                raise pending
+            contents = [
+                (text, self._parse_tables(content, page_num))
+                for page_num, text, content in zip(pages, texts, table_responses)
+            ]
+
+        if self.cache is not None:
+            logger.info(f"Visionキャッシュ: {self.cache.stats()}")
+        return contents
+
+    def _iter_page_results(self, doc: PdfDocument, pages: Sequence[int]) -> Iterator[PageResult]:
+        """Vision APIの応答を先に取得し、画像はページごとに抽出して返す"""
+        from app.converters.pymupdf_converter import PyMuPDFConverter
+        pages = list(pages)
+        contents = self._request_pages_content(doc, pages)
+
+        # 画像抽出はPyMuPDFに委譲
+        pymupdf = PyMuPDFConverter()
+        seen_xrefs: Dict[int, Tuple[int, int]] = {}
+        for page_num, (text, tables) in zip(pages, contents):
+            image_refs: List[ImageReference] = []
+            images = pymupdf._extract_page_images(doc.fitz_doc, page_num, seen_xrefs, image_refs)
+            yield PageResult(
+                page_number=page_num + 1,
+                text=text or "",
+                images=images,
+                tables=tables,
+                image_refs=image_refs
+            )
+
+    def convert_pages(self, source: PdfSource, pages: Sequence[int]) -> List[PageResult]:
+        """指定ページ（0始まり）をVision APIで抽出してページ単位の結果を返す"""
+        with open_document(source) as doc:
+            return list(self._iter_page_results(doc, pages))
+
+    def iter_pages(self, source: PdfSource) -> Iterator[PageResult]:
+        """ページ単位の結果をページ順に返す（テキストにはページ見出しを付ける）"""
+        with open_document(source) as doc:
+            for page_result in self._iter_page_results(doc, range(doc.page_count)):
+                if page_result.text:
+                    page_result.text = f"--- Page {page_result.page_number} ---\n{page_result.text}"
+                yield page_result
+
+    def convert(self, source: PdfSource) -> ConversionResult:
+        """PDF変換を実行（combined有効時はテキストと表を1回のリクエストで抽出）"""
+        if not self.combined:
+            return super().convert(source)
+
+        with open_document(source) as doc:
+            pages = list(range(doc.page_count))
+            page_results = self.convert_pages(doc, pages)
+            images = attach_image_references(
+                [img for r in page_results for img in r.images],
+                [ref for r in page_results for ref in r.image_refs]
+            )
+
+            return ConversionResult(
+                text=self._join_page_texts(pages, [r.text for r in page_results]),
+                images=merge_duplicate_images(images),
+                tables=[table for r in page_results for table in r.tables],
+                page_count=doc.page_count
+            )
+
+    def get_page_count(self, source: PdfSource) -> int:
+        """ページ数を取得"""
+        with open_document(source) as doc:
+            return doc.page_count
@@ -24,6 +24,7 @@ class Settings(BaseSettings):
     # Storage
     STORAGE_PATH: str = "./storage"
     MAX_UPLOAD_SIZE: int = 52428800  # 50MB
+    BATCH_MAX_FILES: int = 500  # 一括アップロードで受け付けるPDFの最大件数
 
     # JWT
     JWT_SECRET_KEY: str = "change-this-secret-key-in-production"
@@ -32,6 +33,50 @@ class Settings(BaseSettings):
 
     # Converters
     DEFAULT_CONVERTER: str = "pymupdf"
+    AUTO_MIN_QUALITY: float = 0.8  # 自動選択（auto）で候補に求める品質スコア（0〜1）
+    AUTO_HISTORY_SIZE: int = 50  # 自動選択で処理時間の推定に使う直近の変換数
+    CONVERTER_WORKERS: int = 0  # ページ並列実行のワーカープロセス数（0または1で逐次実行）
+    VISION_CONCURRENCY: int = 4  # Vision APIへの同時リクエスト数（1で逐次実行）
+    VISION_COMBINED_EXTRACTION: bool = True  # テキストと表を1ページ1回のリクエストで抽出
+    VISION_CACHE_ENABLED: bool = True  # Vision応答をディスクにキャッシュ
+    VISION_CACHE_MAX_MB: int = 512  # Vision応答キャッシュの上限サイズ（MB）
+    VISION_IMAGE_MAX_KB: int = 1536  # Vision APIに送るページ画像1枚あたりの上限サイズ（KB）
+    VISION_IMAGE_QUALITY: int = 80  # 写真を含むページのJPEG/WebP品質
+    VISION_PHOTO_FORMAT: str = "jpeg"  # 写真を含むページの形式（jpeg / webp）
+    VISION_BATCH_COLLECT_SECONDS: float = 60  # Batch APIモードでリクエストを集めてから送信するまでの秒数
+    VISION_BATCH_POLL_SECONDS: float = 60  # Batch APIの完了を確認する間隔（秒）
+    VISION_BATCH_MAX_REQUESTS: int = 10000  # 1つのBatchに含めるリクエスト数の上限
+    VISION_BATCH_MAX_MB: int = 100  # 1つのBatchのおおよそのサイズ上限（MB、画像を含む）
+    API_HTTP2: bool = True  # APIクライアントでHTTP/2を使用（h2パッケージがある場合のみ）
+    API_MAX_CONNECTIONS: int = 20  # APIクライアント1つあたりの最大接続数
+    API_KEEPALIVE_EXPIRY: float = 60  # アイドル接続を保持する秒数
+    API_CLIENT_IDLE_SECONDS: float = 1800  # 使われなくなったAPIクライアントを閉じるまでの秒数（APIキー変更後の古いキーなど）
+    OPENAI_RPM: int = 500  # OpenAIの1分あたりのリクエスト数上限（0で無制限）
+    OPENAI_TPM: int = 200000  # OpenAIの1分あたりのトークン数上限（0で無制限）
+    ANTHROPIC_RPM: int = 50  # Anthropicの1分あたりのリクエスト数上限（0で無制限）
+    ANTHROPIC_TPM: int = 50000  # Anthropicの1分あたりの入力トークン数上限（0で無制限）
+    API_MAX_CONCURRENCY: int = 16  # APIキーあたりの同時リクエスト数の上限（429・レイテンシに応じて自動調整）
+    API_MAX_RETRIES: int = 5  # 429・5xx・接続エラー時のリトライ回数
+    API_RETRY_BASE_SECONDS: float = 1.0  # リトライ待ちの基準秒数（指数バックオフ＋ジッター）
+    API_RETRY_MAX_SECONDS: float = 60.0  # リトライ待ちの上限秒数
+
+    # Job Queue
+    JOB_WORKERS: int = 2  # アプリ内で変換・学習ジョブを実行するワーカースレッド数（0で実行しない）
+    JOB_POLL_SECONDS: float = 2.0  # 待機中のジョブを確認する間隔（秒）
+    JOB_MAX_ATTEMPTS: int = 3  # 中断されたジョブを再実行する回数の上限
+    JOB_LEASE_SECONDS: int = 60  # 実行中のジョブのリース期間（ハートビートがこの間途切れたら再実行する）
+    JOB_HEARTBEAT_SECONDS: float = 15.0  # リースを延長する間隔（秒）
+    JOB_SHUTDOWN_SECONDS: float = 30.0  # 停止時に実行中のジョブの中断を待つ時間（秒）
+
+    # Deduplication
+    DEDUP_EXTRACTION: bool = True  # 同じPDF・コンバーターの変換の抽出結果を再利用する
+    DEDUP_WAIT_SECONDS: float = 5.0  # 同じPDFの抽出が実行中のとき、完了を確認し直すまでの間隔（秒）
+
+    # Monitoring
+    METRICS_ENABLED: bool = True  # /metrics でPrometheus形式のメトリクスを公開
+    METRICS_QUEUE_DEPTH_SECONDS: float = 15.0  # /metrics で待機中のジョブ数を集計し直す間隔（秒）
+    WORKER_METRICS_PORT: int = 0  # ジョブワーカーがメトリクスを公開するポート（0で公開しない）
+    WORKER_METRICS_HOST: str = "127.0.0.1"  # ジョブワーカーがメトリクスを公開するアドレス
 
     # LLM Models
     OPENAI_MODEL: str = "gpt-4o-mini"
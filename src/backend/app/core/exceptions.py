@@ -128,6 +128,60 @@ class ConversionNotFoundException(NotFoundException):
         )
 
 
+class ConversionBatchNotFoundException(NotFoundException):
+    """一括アップロードが見つからない"""
+
+    def __init__(self, batch_id: int):
+        super().__init__(
+            message=f"一括アップロードID {batch_id} が見つかりません",
+            code="CONVERSION_BATCH_NOT_FOUND"
+        )
+
+
+# ジョブ関連
+class JobNotFoundException(NotFoundException):
+    """ジョブが見つからない"""
+
+    def __init__(self, job_id: int):
+        super().__init__(
+            message=f"ジョブID {job_id} が見つかりません",
+            code="JOB_NOT_FOUND"
+        )
+
+
+class JobNotCancellableException(BadRequestException):
+    """終了済みのジョブはキャンセルできない"""
+
+    def __init__(self, job_id: int):
+        super().__init__(
+            message=f"ジョブID {job_id} は終了しているためキャンセルできません",
+            code="JOB_NOT_CANCELLABLE"
+        )
+
+
+class JobCancelledException(AppException):
+    """実行中のジョブがキャンセルされた"""
+
+    def __init__(self, message: str = "ジョブがキャンセルされました"):
+        super().__init__(code="JOB_CANCELLED", message=message, status_code=409)
+
+
+class JobDeferredException(AppException):
+    """同じ入力の処理が実行中のため、ジョブを後で実行し直す"""
+
+    def __init__(self, retry_after: float, message: str = "同じPDFの変換が実行中のため完了を待ちます"):
+        super().__init__(code="JOB_DEFERRED", message=message, status_code=409)
+        self.retry_after = retry_after
+
+
+class VisionBatchPendingException(JobDeferredException):
+    """Batch APIの完了を待つため、ジョブを待機中に戻して後で実行し直す"""
+
+    def __init__(self, retry_after: float, pending_count: int):
+        super().__init__(retry_after, message=f"Batch APIの完了を待ちます（{pending_count}件）")
+        self.pending_count = pending_count
+
+
 # ファイル関連
 class FileTooLargeException(BadRequestException):
     """ファイルサイズ超過"""
@@ -149,6 +203,23 @@ class InvalidFileTypeException(BadRequestException):
         )
 
 
+class TooManyFilesException(BadRequestException):
+    """一括アップロードのファイル数超過"""
+
+    def __init__(self, max_files: int):
+        super().__init__(
+            message=f"一度にアップロードできるPDFは{max_files}件までです",
+            code="TOO_MANY_FILES"
+        )
+
+
+class InvalidArchiveException(BadRequestException):
+    """ZIPファイルを読み込めない・PDFが含まれていない"""
+
+    def __init__(self, message: str = "ZIPファイルを読み込めません"):
+        super().__init__(message=message, code="INVALID_ARCHIVE")
+
+
 # コンバーター関連
 class ConverterException(InternalServerException):
     """コンバーターエラー"""
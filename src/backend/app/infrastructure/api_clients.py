@@ -0,0 +1,280 @@
+"""
+APIクライアントプール
+OpenAI/AnthropicのクライアントをAPIキーごとに共有し、HTTP接続（TLSセッション）を使い回す
+"""
+import asyncio
+import contextvars
+import hashlib
+import importlib.util
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (プロバイダー, 同期/非同期, APIキーのハッシュ)
+ClientKey = Tuple[str, str, str]
+
+
+class ApiClientPool:
+    """APIキー単位のクライアントプール
+
+    同期クライアントはスレッド間で共有する。非同期クライアントは作成したイベントループに
+    紐づくため、常駐スレッドの共有イベントループ上でのみ使用する。
+    HTTPクライアントは各SDKのDefaultHttpxClientで作成し、キープアライブ時間を延ばす。
+    HTTP/2はh2パッケージがインストールされている場合のみ有効にする。
+    クライアントは同じAPIキーを使うすべての変換・HTML生成・学習で共有するため、APIキーの変更時には
+    閉じず、idle_seconds以上使われなかったものを閉じる。リクエスト中はlease系のメソッドで借りておき、
+    借りられているクライアントは閉じない（返却時点から未使用の時間を数える）。
+    """
+
+    def __init__(
+        self,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        idle_seconds: Optional[float] = None
+    ):
+        if http2 is None:
+            http2 = settings.API_HTTP2
+        # HTTP/2はオプション依存（httpx[http2]）
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.max_connections = max_connections or settings.API_MAX_CONNECTIONS
+        self.keepalive_expiry = keepalive_expiry if keepalive_expiry is not None else settings.API_KEEPALIVE_EXPIRY
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.API_CLIENT_IDLE_SECONDS
+
+        self._clients: Dict[ClientKey, Any] = {}
+        self._last_used: Dict[ClientKey, float] = {}
+        # 貸出中の数（0のキーは持たない）
+        self._leases: Dict[ClientKey, int] = {}
+        self._last_expired = time.monotonic()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _make_key(provider: str, kind: str, api_key: str) -> ClientKey:
+        """プールのキーを作成（APIキーはハッシュで保持）"""
+        return provider, kind, hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def _http_client_options(self, sdk: ModuleType) -> Dict[str, Any]:
+        """SDKのHTTPクライアントに渡す接続設定（LimitsはSDKが使うhttpxの型で作成）"""
+        limits_type = type(sdk.DEFAULT_CONNECTION_LIMITS)
+        return {
+            "http2": self.http2,
+            "limits": limits_type(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        }
+
+    def http_client(self, sdk: ModuleType) -> Optional[Any]:
+        """SDK用の同期HTTPクライアントを作成（SDKが対応していない場合はNoneでSDKの既定を使う）"""
+        if not hasattr(sdk, "DefaultHttpxClient"):
+            return None
+        return sdk.DefaultHttpxClient(**self._http_client_options(sdk))
+
+    def async_http_client(self, sdk: ModuleType) -> Optional[Any]:
+        """SDK用の非同期HTTPクライアントを作成（SDKが対応していない場合はNoneでSDKの既定を使う）"""
+        if not hasattr(sdk, "DefaultAsyncHttpxClient"):
+            return None
+        return sdk.DefaultAsyncHttpxClient(**self._http_client_options(sdk))
+
+    def get(self, provider: str, api_key: str, factory: Callable[[], T]) -> T:
+        """同期クライアントを取得（なければfactoryで作成）"""
+        return self._get_or_create(self._make_key(provider, "sync", api_key), factory)
+
+    @contextmanager
+    def lease(self, provider: str, api_key: str, factory: Callable[[], T]) -> Iterator[T]:
+        """同期クライアントを借りる（ブロックを抜けるまで閉じない）"""
+        with self._lease(self._make_key(provider, "sync", api_key), factory) as client:
+            yield client
+
+    @contextmanager
+    def lease_async(self, provider: str, api_key: str, factory: Callable[[], T]) -> Iterator[T]:
+        """非同期クライアントを借りる（ブロックを抜けるまで閉じない、共有イベントループ上で使用する）"""
+        with self._lease(self._make_key(provider, "async", api_key), factory) as client:
+            yield client
+
+    @contextmanager
+    def lease_async_client(self, provider: str, api_key: str) -> Iterator[Any]:
+        """SDKの非同期クライアントを借りる（HTML生成・学習用、リトライはレートリミッターで行う）"""
+        def create():
+            if provider == "openai":
+                import openai
+                return openai.AsyncOpenAI(
+                    api_key=api_key, max_retries=0, http_client=self.async_http_client(openai)
+                )
+            import anthropic
+            return anthropic.AsyncAnthropic(
+                api_key=api_key, max_retries=0, http_client=self.async_http_client(anthropic)
+            )
+
+        with self.lease_async(provider, api_key, create) as client:
+            yield client
+
+    @contextmanager
+    def _lease(self, key: ClientKey, factory: Callable[[], T]) -> Iterator[T]:
+        client = self._get_or_create(key, factory, lease=True)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                count = self._leases.get(key, 0) - 1
+                if count > 0:
+                    self._leases[key] = count
+                else:
+                    self._leases.pop(key, None)
+                if key in self._clients:
+                    self._last_used[key] = time.monotonic()
+
+    def _get_or_create(self, key: ClientKey, factory: Callable[[], T], lease: bool = False) -> T:
+        """プールからクライアントを取得（なければ作成、leaseがTrueなら貸出中にする）"""
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+                logger.info(f"APIクライアントを作成: {key[0]} ({key[1]}, http2={self.http2})")
+            now = time.monotonic()
+            self._last_used[key] = now
+            if lease:
+                self._leases[key] = self._leases.get(key, 0) + 1
+            expired = self._pop_idle(now)
+
+        for (_, kind, _), idle_client in expired:
+            self._close_client(kind, idle_client)
+        if expired:
+            logger.info(f"使われていないAPIクライアントを{len(expired)}件閉じました")
+        return client
+
+    def _pop_idle(self, now: float) -> List[Tuple[ClientKey, Any]]:
+        """idle_seconds以上使われていないクライアントをプールから外す（ロック内で呼ぶ、確認は1分に1回）
+
+        貸出中のクライアントは外さない
+        """
+        if now - self._last_expired < min(self.idle_seconds, 60.0):
+            return []
+        self._last_expired = now
+        keys = [
+            key for key, used in self._last_used.items()
+            if now - used >= self.idle_seconds and key not in self._leases
+        ]
+        for key in keys:
+            del self._last_used[key]
+        return [(key, self._clients.pop(key)) for key in keys if key in self._clients]
+
+    def evict(self, provider: Optional[str] = None, api_key: Optional[str] = None, wait: bool = False):
+        """クライアントを破棄（使用中のクライアントも閉じるため、停止時のみ使う）
+
+        providerとapi_keyを省略した場合はすべて破棄する
+        """
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest() if api_key is not None else None
+        with self._lock:
+            keys = [
+                key for key in self._clients
+                if (provider is None or key[0] == provider) and (key_hash is None or key[2] == key_hash)
+            ]
+            clients = [(key, self._clients.pop(key)) for key in keys]
+            for key in keys:
+                self._last_used.pop(key, None)
+                self._leases.pop(key, None)
+
+        for (_, kind, _), client in clients:
+            self._close_client(kind, client, wait)
+        if clients:
+            logger.info(f"APIクライアントを{len(clients)}件破棄しました")
+
+    def _close_client(self, kind: str, client: Any, wait: bool = False):
+        """クライアントを閉じる（非同期クライアントは共有イベントループ上で閉じる）"""
+        try:
+            if kind == "sync":
+                client.close()
+            elif self._loop is not None and self._loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(client.close(), self._loop)
+                if wait:
+                    future.result(timeout=5)
+        except Exception as e:
+            logger.warning(f"APIクライアントのクローズでエラー発生: {e}")
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """共有イベントループを取得（初回呼び出し時に常駐スレッドで起動）"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._loop_thread = threading.Thread(target=run, name="api-client-loop", daemon=True)
+                self._loop_thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """コルーチンを共有イベントループで実行し、結果を待つ"""
+        if threading.current_thread() is self._loop_thread:
+            raise RuntimeError("共有イベントループ上からrun()を呼び出すことはできません")
+        future: Future = asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+        return future.result()
+
+    async def run_async(self, coro: Awaitable[T]) -> T:
+        """別のイベントループからコルーチンを共有イベントループで実行して待つ
+
+        呼び出し元のコンテキスト（計測の記録先など）を引き継ぎ、呼び出し元がキャンセルされたら中断する
+        """
+        loop = self._get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        context = contextvars.copy_context()
+        future: Future = Future()
+
+        def start():
+            if future.cancelled():
+                coro.close()
+                return
+            task = loop.create_task(coro, context=context)
+
+            def finish(done: asyncio.Task):
+                if future.done():
+                    return
+                if done.cancelled():
+                    future.cancel()
+                elif done.exception() is not None:
+                    future.set_exception(done.exception())
+                else:
+                    future.set_result(done.result())
+
+            task.add_done_callback(finish)
+            future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        loop.call_soon_threadsafe(start)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """すべてのクライアントと共有イベントループを終了"""
+        self.evict(wait=True)
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._loop_thread = self._loop_thread, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+# シングルトンインスタンス
+api_client_pool = ApiClientPool()
@@ -2,13 +2,16 @@
 データベース接続設定
 SQLAlchemyエンジンとセッション管理
 """
-from sqlalchemy import create_engine, event
+import logging
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 # SQLite用の設定
 connect_args = {}
@@ -50,3 +53,28 @@ def init_db():
     """データベース初期化（テーブル作成）"""
     from app.models import user, template, conversion, settings as settings_model
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+
+def add_missing_columns():
+    """既存テーブルにモデルで追加された列・インデックスを追加
+
+    create_allは既存テーブルを変更しないため、マイグレーションツールを使わない
+    SQLite環境向けに、不足している列をNULL許可で追加する。
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"列を追加しました: {table.name}.{column.name}")
+
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
@@ -5,7 +5,7 @@ PDF、画像、出力ファイルの保存・取得・削除
 import os
 import shutil
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterable, Optional, List
 import zipfile
 import io
 
@@ -20,13 +20,14 @@ class FileStorage:
         self.uploads_path = self.base_path / "uploads"
         self.images_path = self.base_path / "images"
         self.outputs_path = self.base_path / "outputs"
+        self.streams_path = self.base_path / "streams"
 
         # ディレクトリ作成
         self._ensure_directories()
 
     def _ensure_directories(self):
         """必要なディレクトリを作成"""
-        for path in [self.uploads_path, self.images_path, self.outputs_path]:
+        for path in [self.uploads_path, self.images_path, self.outputs_path, self.streams_path]:
             path.mkdir(parents=True, exist_ok=True)
 
     def save_pdf(self, conversion_id: int, filename: str, content: bytes) -> str:
@@ -39,6 +40,18 @@ class FileStorage:
 
         return str(file_path.relative_to(self.base_path))
 
+    def save_pdf_chunks(self, conversion_id: int, filename: str, chunks: Iterable[bytes]) -> str:
+        """PDFを分割して受け取りながら保存（ファイル全体をメモリに載せない）"""
+        dir_path = self.uploads_path / str(conversion_id)
+        dir_path.mkdir(parents=True, exist_ok=True)
+
+        file_path = dir_path / filename
+        with open(file_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        return str(file_path.relative_to(self.base_path))
+
     def save_image(self, conversion_id: int, filename: str, content: bytes) -> str:
         """画像を保存"""
         dir_path = self.images_path / str(conversion_id)
@@ -49,6 +62,26 @@ class FileStorage:
 
         return str(file_path.relative_to(self.base_path))
 
+    def link_image(self, source_conversion_id: int, conversion_id: int, filename: str) -> str:
+        """別の変換の画像を共有（ハードリンクできなければコピー）"""
+        source_path = self.images_path / str(source_conversion_id) / filename
+        dir_path = self.images_path / str(conversion_id)
+        dir_path.mkdir(parents=True, exist_ok=True)
+
+        file_path = dir_path / filename
+        if file_path.exists():
+            file_path.unlink()
+        try:
+            os.link(source_path, file_path)
+        except OSError:
+            shutil.copy2(source_path, file_path)
+
+        return str(file_path.relative_to(self.base_path))
+
+    def get_stream_journal_path(self, conversion_id: int) -> Path:
+        """HTML生成ストリームの記録ファイルのパス"""
+        return self.streams_path / f"{conversion_id}.jsonl"
+
     def get_file(self, relative_path: str) -> Optional[bytes]:
         """ファイルを取得"""
         file_path = self.base_path / relative_path
@@ -97,6 +130,7 @@ class FileStorage:
             dir_path = base_path / str(conversion_id)
             if dir_path.exists():
                 shutil.rmtree(dir_path)
+        self.get_stream_journal_path(conversion_id).unlink(missing_ok=True)
 
     def get_file_size(self, relative_path: str) -> int:
         """ファイルサイズを取得"""
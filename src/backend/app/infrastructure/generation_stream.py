@@ -0,0 +1,390 @@
+"""
+HTML生成ストリーム
+変換スレッドで生成中のHTMLを、SSEで購読しているクライアントに配信する
+別プロセスのワーカーで生成中の変換は、ストレージの記録ファイルを追跡して配信する
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, TextIO, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from app.infrastructure.file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+# イベント種別
+EVENT_SNAPSHOT = "snapshot"  # 購読開始時点までに生成されたテキスト
+EVENT_STATUS = "status"  # 処理段階（extracting / generating）
+EVENT_DELTA = "delta"  # 追加で生成されたテキスト
+EVENT_RESET = "reset"  # リトライなどで生成をやり直した（それまでのテキストを破棄）
+EVENT_DONE = "done"  # 完了（保存したHTML）
+EVENT_ERROR = "error"  # 失敗
+
+
+# 記録ファイルの追加を確認する間隔（秒）
+JOURNAL_POLL_SECONDS = 0.25
+
+
+@dataclass
+class StreamEvent:
+    """配信するイベント"""
+    event: str
+    data: str = ""
+
+
+class GenerationJournal:
+    """生成ストリームのイベントを記録するファイル（1行1イベントのJSON）
+
+    生成を開始するたびに新しいファイルに置き換える（追跡側は置き換えをresetとして扱う）。
+    生成が完了・失敗したら削除する（追跡側は削除を検知して保存済みの結果を返す）。
+    書き込みに失敗しても生成は止めず、以降の記録をやめる。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def start(self):
+        """新しい記録ファイルを作成して既存のファイルと置き換える"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}")
+            self._file = open(temp_path, "w", encoding="utf-8")
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"生成ストリームの記録ファイルを作成できません: {self.path}: {e}")
+            self.close()
+
+    def write(self, event: StreamEvent):
+        """イベントを追記（追跡側がすぐに読めるよう書き込みごとにフラッシュする）"""
+        if self._file is None:
+            return
+        try:
+            self._file.write(_encode_event(event))
+            self._file.flush()
+        except OSError as e:
+            logger.warning(f"生成ストリームの記録に失敗しました: {self.path}: {e}")
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+class JournalReader:
+    """記録ファイルを先頭から順に読む（ファイルが置き換えられたら新しいファイルを読み直す）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file: Optional[BinaryIO] = None
+        self._inode: Optional[int] = None
+
+    def read(self) -> Tuple[List[StreamEvent], bool]:
+        """追記されたイベントを読む（置き換え・削除されていたら2つ目の値がTrue）"""
+        restarted = False
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            restarted = self._file is not None
+            self.close()
+            if inode is not None:
+                try:
+                    self._file = open(self.path, "rb")
+                    self._inode = os.fstat(self._file.fileno()).st_ino
+                except FileNotFoundError:
+                    pass
+
+        events = []
+        while self._file is not None:
+            position = self._file.tell()
+            line = self._file.readline()
+            if not line.endswith(b"\n"):
+                # 書き込み途中の行は次の読み込みで読む
+                self._file.seek(position)
+                break
+            record = json.loads(line)
+            events.append(StreamEvent(record["event"], record.get("data", "")))
+        return events, restarted
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._inode = None
+
+    @property
+    def removed(self) -> bool:
+        """読んでいた記録ファイルが削除された（まだ作成されていない）"""
+        return self._file is None
+
+
+def _encode_event(event: StreamEvent) -> str:
+    return json.dumps({"event": event.event, "data": event.data}, ensure_ascii=False) + "\n"
+
+
+class GenerationStream:
+    """1件の変換の生成ストリーム
+
+    変換スレッドから書き込み、購読側（各リクエストのイベントループ）にはcall_soon_threadsafeで渡す。
+    途中から購読したクライアントには、それまでのテキストをsnapshotとしてまとめて送る。
+    """
+
+    def __init__(self, conversion_id: int, journal: Optional[GenerationJournal] = None):
+        self.conversion_id = conversion_id
+        self.status = ""
+        self.text = ""
+        self.closed = False
+        self._final: Optional[StreamEvent] = None
+        self._journal = journal
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._lock = threading.Lock()
+
+    def _publish(self, event: StreamEvent):
+        """購読中のクライアントにイベントを渡し、記録ファイルに追記する（ロック内で呼ぶ）"""
+        if self._journal is not None:
+            self._journal.write(event)
+        for loop, queue in list(self._subscribers):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # 購読側のイベントループが終了している
+                self._subscribers.remove((loop, queue))
+
+    def set_status(self, status: str):
+        """処理段階を通知"""
+        with self._lock:
+            if self.closed:
+                return
+            self.status = status
+            self._publish(StreamEvent(EVENT_STATUS, status))
+
+    def append(self, delta: str):
+        """生成されたテキストを追加"""
+        if not delta:
+            return
+        with self._lock:
+            if self.closed:
+                return
+            self.text += delta
+            self._publish(StreamEvent(EVENT_DELTA, delta))
+
+    def reset(self):
+        """生成中のテキストを破棄（リトライ時）"""
+        with self._lock:
+            if self.closed or not self.text:
+                return
+            self.text = ""
+            self._publish(StreamEvent(EVENT_RESET))
+
+    def finish(self, html: str):
+        """完了を通知"""
+        self._close(StreamEvent(EVENT_DONE, html))
+
+    def fail(self, message: str):
+        """失敗を通知"""
+        self._close(StreamEvent(EVENT_ERROR, message))
+
+    def detach(self):
+        """完了・失敗を通知せずに閉じる（ジョブを待機中に戻した場合）
+
+        購読中のクライアントの購読は終了し、以降は記録ファイルの追跡に切り替える
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            for loop, queue in self._subscribers:
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, None)
+                except RuntimeError:
+                    pass
+            self._subscribers.clear()
+            if self._journal is not None:
+                self._journal.close()
+
+    def _close(self, event: StreamEvent):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._final = event
+            self._publish(event)
+            self._subscribers.clear()
+            if self._journal is not None:
+                self._journal.close()
+
+    async def subscribe(
+        self, keepalive_seconds: Optional[float] = None
+    ) -> AsyncIterator[Optional[StreamEvent]]:
+        """イベントを購読（完了・失敗のイベント、またはdetachで終了）
+
+        keepalive_secondsの間イベントがなければNoneを返す（接続維持用）
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            if self.closed:
+                initial = [self._final] if self._final else []
+            else:
+                initial = [StreamEvent(EVENT_SNAPSHOT, self.text)]
+                if self.status:
+                    initial.insert(0, StreamEvent(EVENT_STATUS, self.status))
+                self._subscribers.append((loop, queue))
+
+        try:
+            for event in initial:
+                yield event
+                if event.event in (EVENT_DONE, EVENT_ERROR):
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    # detachされた
+                    return
+                yield event
+                if event.event in (EVENT_DONE, EVENT_ERROR):
+                    return
+        finally:
+            with self._lock:
+                if (loop, queue) in self._subscribers:
+                    self._subscribers.remove((loop, queue))
+
+
+class GenerationStreamHub:
+    """変換IDごとの生成ストリームを保持するレジストリ
+
+    完了・失敗したストリームは記録ファイルとともに破棄する。その後に接続したクライアントには、DBの結果を返す。
+    生成中のイベントはストレージの記録ファイルにも書き込み、別プロセスのワーカーで生成中の変換や
+    待機中に戻された変換はfollowで記録ファイルを追跡して配信する。
+    """
+
+    def __init__(self):
+        self._streams: Dict[int, GenerationStream] = {}
+        self._lock = threading.Lock()
+
+    def open(self, conversion_id: int) -> GenerationStream:
+        """ストリームを開始（実行中のストリームがあればそれを返す）"""
+        with self._lock:
+            stream = self._streams.get(conversion_id)
+            if stream is None or stream.closed:
+                journal = GenerationJournal(file_storage.get_stream_journal_path(conversion_id))
+                journal.start()
+                stream = GenerationStream(conversion_id, journal)
+                self._streams[conversion_id] = stream
+            return stream
+
+    def get(self, conversion_id: int) -> Optional[GenerationStream]:
+        """このプロセスで実行中のストリームを取得"""
+        with self._lock:
+            return self._streams.get(conversion_id)
+
+    def finish(self, conversion_id: int, html: str):
+        """完了を通知してストリームを破棄"""
+        self._close(conversion_id, StreamEvent(EVENT_DONE, html))
+
+    def fail(self, conversion_id: int, message: str):
+        """失敗を通知してストリームを破棄"""
+        self._close(conversion_id, StreamEvent(EVENT_ERROR, message))
+
+    def detach(self, conversion_id: int):
+        """このプロセスのストリームを閉じて破棄（記録ファイルは残し、次の実行に引き継ぐ）"""
+        stream = self._pop(conversion_id)
+        if stream is not None:
+            stream.detach()
+
+    def discard(self, conversion_id: int):
+        """前回の生成の記録を破棄（生成のやり直しで古い完了・失敗を配信しないようにする）
+
+        このプロセスで生成中のストリームがあれば何もしない
+        """
+        with self._lock:
+            if conversion_id in self._streams:
+                return
+        file_storage.get_stream_journal_path(conversion_id).unlink(missing_ok=True)
+
+    async def follow(
+        self,
+        conversion_id: int,
+        keepalive_seconds: Optional[float] = None,
+        load_final: Optional[Callable[[], Awaitable[Optional[StreamEvent]]]] = None,
+        poll_seconds: float = JOURNAL_POLL_SECONDS
+    ) -> AsyncIterator[Optional[StreamEvent]]:
+        """記録ファイルを追跡してイベントを購読（完了・失敗のイベントで終了）
+
+        記録がまだなければ処理段階をqueuedとして送る。記録ファイルが削除された（生成が終わった）とき、
+        またはkeepalive_secondsの間イベントがなかったときはload_finalで保存済みの結果を確認し
+        （記録が残らない異常終了に備える）、なければNoneを返す。
+        """
+        reader = JournalReader(file_storage.get_stream_journal_path(conversion_id))
+        try:
+            events, _ = await asyncio.to_thread(reader.read)
+            status, text = "queued", ""
+            for event in events:
+                if event.event in (EVENT_DONE, EVENT_ERROR):
+                    yield event
+                    return
+                if event.event == EVENT_STATUS:
+                    status = event.data
+                elif event.event == EVENT_DELTA:
+                    text += event.data
+                elif event.event == EVENT_RESET:
+                    text = ""
+            yield StreamEvent(EVENT_STATUS, status)
+            yield StreamEvent(EVENT_SNAPSHOT, text)
+
+            idle = 0.0
+            while True:
+                await asyncio.sleep(poll_seconds)
+                events, restarted = await asyncio.to_thread(reader.read)
+                if restarted and reader.removed and load_final is not None:
+                    # 生成が終わって記録ファイルが削除された
+                    final = await load_final()
+                    if final is not None:
+                        yield final
+                        return
+                if restarted:
+                    # 別のワーカーが生成をやり直した
+                    yield StreamEvent(EVENT_RESET)
+                for event in events:
+                    yield event
+                    if event.event in (EVENT_DONE, EVENT_ERROR):
+                        return
+                idle = 0.0 if events or restarted else idle + poll_seconds
+                if keepalive_seconds is not None and idle >= keepalive_seconds:
+                    idle = 0.0
+                    final = await load_final() if load_final is not None else None
+                    if final is not None:
+                        yield final
+                        return
+                    yield None
+        finally:
+            reader.close()
+
+    def _close(self, conversion_id: int, event: StreamEvent):
+        stream = self._pop(conversion_id)
+        if stream is not None:
+            stream._close(event)
+        # 結果はDBに保存済みのため記録ファイルは削除する（追跡中のクライアントは削除を検知してDBの結果を返す）
+        file_storage.get_stream_journal_path(conversion_id).unlink(missing_ok=True)
+
+    def _pop(self, conversion_id: int) -> Optional[GenerationStream]:
+        with self._lock:
+            return self._streams.pop(conversion_id, None)
+
+
+# シングルトンインスタンス
+generation_streams = GenerationStreamHub()
@@ -0,0 +1,255 @@
+"""
+運用監視メトリクス
+Prometheusテキスト形式で公開するメトリクスの定義と計測ヘルパー
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import time
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, GCCollector, Histogram,
+    PlatformCollector, ProcessCollector, generate_latest, start_http_server
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+from app.infrastructure.database import engine
+from app.infrastructure.stage_metrics import StageRecorder
+from app.infrastructure.vision_cache import vision_cache
+
+# 変換1件の処理時間のバケット（秒）
+CONVERSION_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, float("inf"))
+# 外部APIリクエストのバケット（秒）
+API_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, float("inf"))
+
+# アプリ専用のレジストリ（プロセス情報も含める）
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+PlatformCollector(registry=registry)
+GCCollector(registry=registry)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "repagepdf_http_request_duration_seconds",
+    "レスポンス開始までのHTTPリクエスト処理時間（ルート単位）",
+    ["method", "route", "status"],
+    registry=registry
+)
+CONVERSIONS_RUNNING = Gauge(
+    "repagepdf_conversions_running",
+    "実行中の変換数",
+    registry=registry
+)
+CONVERSION_QUEUE_DEPTH = Gauge(
+    "repagepdf_conversion_queue_depth",
+    "受け付け済みで開始待ちの変換数",
+    registry=registry
+)
+CONVERSION_SECONDS = Histogram(
+    "repagepdf_conversion_duration_seconds",
+    "変換1件の処理時間（コンバーター・結果別）",
+    ["converter", "status"],
+    buckets=CONVERSION_BUCKETS,
+    registry=registry
+)
+CONVERSION_STAGE_SECONDS = Histogram(
+    "repagepdf_conversion_stage_seconds",
+    "変換1件あたりのステージ別処理時間",
+    ["converter", "stage"],
+    buckets=CONVERSION_BUCKETS,
+    registry=registry
+)
+API_REQUEST_SECONDS = Histogram(
+    "repagepdf_api_request_duration_seconds",
+    "Vision/LLM APIリクエストの処理時間（プロバイダー・用途別）",
+    ["provider", "kind"],
+    buckets=API_BUCKETS,
+    registry=registry
+)
+API_REQUEST_ERRORS = Counter(
+    "repagepdf_api_request_errors",
+    "Vision/LLM APIリクエストのエラー数（プロバイダー・用途・例外型別）",
+    ["provider", "kind", "error"],
+    registry=registry
+)
+API_REQUEST_RETRIES = Counter(
+    "repagepdf_api_request_retries",
+    "Vision/LLM APIリクエストのリトライ数（プロバイダー・理由別）",
+    ["provider", "reason"],
+    registry=registry
+)
+API_CACHE_TOKENS = Counter(
+    "repagepdf_api_prompt_cache_tokens",
+    "プロンプトキャッシュのトークン数（プロバイダー・read/write別）",
+    ["provider", "type"],
+    registry=registry
+)
+API_THROTTLE_SECONDS = Histogram(
+    "repagepdf_api_throttle_wait_seconds",
+    "レートリミッターで枠が空くまで待った時間",
+    ["provider"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf")),
+    registry=registry
+)
+API_CONCURRENCY_LIMIT = Gauge(
+    "repagepdf_api_concurrency_limit",
+    "レートリミッターが調整した同時実行数の上限（APIキーはハッシュの先頭8文字）",
+    ["provider", "key"],
+    registry=registry
+)
+# 待機中の変換ジョブ数を最後に集計した時刻（time.monotonic()）
+_queue_depth_published_at: Optional[float] = None
+
+DB_SESSIONS_OPENED = Counter(
+    "repagepdf_db_sessions_opened",
+    "DBセッションが接続を取得した回数",
+    registry=registry
+)
+
+
+@event.listens_for(engine, "checkout")
+def _count_db_checkout(dbapi_connection, connection_record, connection_proxy):
+    """接続プールからの取得を数える"""
+    DB_SESSIONS_OPENED.inc()
+
+
+class RuntimeCollector:
+    """スクレイプ時点の値を読むメトリクス（キャッシュ・接続プール）"""
+
+    def collect(self):
+        stats = vision_cache.stats()
+        hits = CounterMetricFamily(
+            "repagepdf_vision_cache_hits", "Vision応答キャッシュのヒット数"
+        )
+        hits.add_metric([], stats["hits"])
+        yield hits
+
+        misses = CounterMetricFamily(
+            "repagepdf_vision_cache_misses", "Vision応答キャッシュのミス数"
+        )
+        misses.add_metric([], stats["misses"])
+        yield misses
+
+        yield GaugeMetricFamily(
+            "repagepdf_vision_cache_hit_ratio",
+            "Vision応答キャッシュのヒット率（プロセス起動以降）",
+            value=stats["hit_ratio"]
+        )
+
+        # 接続を保持しているセッション数（QueuePool以外では取得できない値は省略）
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            yield GaugeMetricFamily(
+                "repagepdf_db_sessions_active",
+                "接続を保持しているDBセッション数",
+                value=pool.checkedout()
+            )
+        if hasattr(pool, "size"):
+            yield GaugeMetricFamily(
+                "repagepdf_db_pool_size",
+                "DB接続プールのサイズ",
+                value=pool.size()
+            )
+
+
+registry.register(RuntimeCollector())
+
+
+@contextmanager
+def observe_api_call(provider: str, kind: str) -> Iterator[None]:
+    """外部APIリクエストの処理時間とエラーを記録（kind: vision / html_generation / learning）"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        API_REQUEST_ERRORS.labels(provider, kind, type(e).__name__).inc()
+        raise
+    finally:
+        API_REQUEST_SECONDS.labels(provider, kind).observe(time.perf_counter() - started)
+
+
+def observe_conversion(
+    converter: Optional[str],
+    succeeded: bool,
+    seconds: float,
+    recorder: Optional[StageRecorder] = None
+):
+    """変換1件の処理時間とステージ別時間を記録"""
+    converter = converter or "unknown"
+    CONVERSION_SECONDS.labels(converter, "completed" if succeeded else "error").observe(seconds)
+    if recorder is not None:
+        for stage, stats in recorder.stages.items():
+            CONVERSION_STAGE_SECONDS.labels(converter, stage).observe(stats.wall_seconds)
+
+
+def set_queue_depth(count: int):
+    """待機中の変換ジョブ数を反映"""
+    global _queue_depth_published_at
+    CONVERSION_QUEUE_DEPTH.set(count)
+    _queue_depth_published_at = time.monotonic()
+
+
+def queue_depth_is_stale(max_age: float) -> bool:
+    """待機中の変換ジョブ数の集計からmax_age秒以上経っているかどうか（別プロセスのワーカーの取り出しは反映されないため）"""
+    return _queue_depth_published_at is None or time.monotonic() - _queue_depth_published_at >= max_age
+
+
+def render_metrics() -> bytes:
+    """Prometheusテキスト形式で出力"""
+    return generate_latest(registry)
+
+
+def start_metrics_server(port: int, host: str):
+    """APIサーバーを持たないプロセス（ジョブワーカー）用にメトリクスを公開するHTTPサーバーを起動"""
+    server, _ = start_http_server(port, addr=host, registry=registry)
+    return server
+
+
+def _route_template(scope) -> str:
+    """ルートのテンプレート（/api/conversions/{conversion_id}、ラベルの種類数を抑える）"""
+    path_format = getattr(scope.get("route"), "path_format", None)
+    if not path_format:
+        return "unmatched"
+    # ルーターを遅延して組み込むFastAPIではプレフィックス（/api）を含まないため、実際のパスの先頭から補う
+    depth = path_format.count("/")
+    segments = scope["path"].rstrip("/").split("/")
+    prefix = "/".join(segments[:len(segments) - depth])
+    return path_format if path_format.startswith(prefix + "/") else prefix + path_format
+
+
+class PrometheusMiddleware:
+    """HTTPリクエストの処理時間をルート単位で記録するASGIミドルウェア
+
+    ラベルにはパスではなくルートのテンプレート（/api/conversions/{conversion_id}）を使う。
+    SSEなどのストリーミング応答でも値が安定するよう、レスポンス開始までの時間を計測する。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], _route_template(scope), str(status)
+            ).observe(time.perf_counter() - started)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            observe(500)
+            raise
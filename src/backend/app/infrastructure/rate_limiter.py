@@ -0,0 +1,424 @@
+"""
+APIレートリミッター
+プロバイダー・APIキーごとにリクエスト数とトークン数を制限し、同時実行数を429・レイテンシに応じて調整する
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+
+from app.core.config import settings
+from app.infrastructure.monitoring import (
+    API_CACHE_TOKENS, API_CONCURRENCY_LIMIT, API_REQUEST_RETRIES, API_THROTTLE_SECONDS
+)
+from app.infrastructure.stage_metrics import count_cache_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# リトライするHTTPステータス（429: レート制限、529: Anthropicの過負荷）
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# 混雑を示すステータス（同時実行数を半減する）
+CONGESTION_STATUS = {429, 529}
+# リトライする接続系の例外（SDKの例外クラス名）
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+# 同時実行数の空き待ちのポーリング間隔（秒）
+POLL_INTERVAL = 0.05
+# レイテンシがこの倍率を超えたら同時実行数を減らす
+LATENCY_TOLERANCE = 2.0
+# レイテンシ移動平均の平滑化係数
+LATENCY_SMOOTHING = 0.2
+# 同時実行数を減らした後、次に減らすまでの間隔（秒）
+DECREASE_COOLDOWN = 5.0
+
+
+def estimate_text_tokens(text: str) -> int:
+    """テキストのトークン数を概算（日本語は1文字1トークン、英語は3文字1トークン程度）"""
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """画像のトークン数を概算（長辺1568px相当で上限1600トークン）"""
+    return min(1600, math.ceil(width * height / 750))
+
+
+def usage_tokens(response: Any) -> Optional[int]:
+    """レスポンスの使用トークン数（OpenAIは合計、AnthropicはITPMに合わせて入力のみ）"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_tokens", None)
+    if isinstance(total, int):
+        return total
+    input_tokens = getattr(usage, "input_tokens", None)
+    if not isinstance(input_tokens, int):
+        return None
+    cache_tokens = sum(
+        value for value in (
+            getattr(usage, "cache_creation_input_tokens", None),
+            getattr(usage, "cache_read_input_tokens", None)
+        ) if isinstance(value, int)
+    )
+    return input_tokens + cache_tokens
+
+
+def cache_usage(response: Any) -> Tuple[int, int]:
+    """レスポンスのプロンプトキャッシュ読み込み・書き込みトークン数
+
+    OpenAIは自動キャッシュのため読み込み（cached_tokens）のみ取得できる。
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    if isinstance(cached, int):
+        return cached, 0
+    read = getattr(usage, "cache_read_input_tokens", None)
+    write = getattr(usage, "cache_creation_input_tokens", None)
+    return (
+        read if isinstance(read, int) else 0,
+        write if isinstance(write, int) else 0
+    )
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """例外のHTTPステータス"""
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """リトライ可能な例外かどうか"""
+    if _status_code(error) in RETRYABLE_STATUS:
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-Afterヘッダーの秒数"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class TokenBucket:
+    """トークンバケット（1分あたりの上限、0は無制限）"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        """無制限かどうか"""
+        return self.capacity <= 0
+
+    def _refill(self, now: float):
+        """経過時間分を補充"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amountを消費できるまでの秒数（0なら即時）
+
+        上限を超える量はバケットが満杯なら許可する（永久に待たないため）
+        """
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """消費（wait_timeが0を返した後に呼ぶ）"""
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """予約量と実績の差を返却・追加徴収（負の値は残量をマイナスにする）"""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ProviderScheduler:
+    """プロバイダー・APIキー単位のリクエストスケジューラー
+
+    リクエスト数（RPM）とトークン数（TPM）をトークンバケットで制限し、
+    同時実行数はAIMD（成功で加算的に増加、429・529で半減、レイテンシ悪化で1割減）で調整する。
+    リトライ可能なエラーはジッター付き指数バックオフ（Retry-Afterがあればそれ以上）で再試行する。
+    同期・非同期のどちらからも呼び出せるよう、状態はスレッドロックで保護する。
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        key_id: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        initial_concurrency: int,
+        max_concurrency: int,
+        max_retries: int,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+        counts_output_tokens: bool
+    ):
+        self.provider = provider
+        self.key_id = key_id
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(min(max(1, initial_concurrency), self.max_concurrency))
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.counts_output_tokens = counts_output_tokens
+
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.latency_baseline: Optional[float] = None
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._publish_concurrency()
+
+    def _publish_concurrency(self):
+        """同時実行数の上限をメトリクスに反映"""
+        API_CONCURRENCY_LIMIT.labels(self.provider, self.key_id).set(int(self.concurrency))
+
+    def reservation(self, input_tokens: int, max_tokens: int) -> int:
+        """リクエスト前に予約するトークン数（OpenAIのTPMはmax_tokensも含めて計算される）"""
+        return input_tokens + (max_tokens if self.counts_output_tokens else 0)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """枠を確保（確保できなければ待つべき秒数を返す）"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self.in_flight >= int(self.concurrency):
+                return POLL_INTERVAL
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self, tokens: int):
+        """枠を確保するまで待つ（同期）"""
+        started = time.perf_counter()
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                break
+            time.sleep(min(wait, 1.0))
+        API_THROTTLE_SECONDS.labels(self.provider).observe(time.perf_counter() - started)
+
+    async def acquire_async(self, tokens: int):
+        """枠を確保するまで待つ（非同期）"""
+        started = time.perf_counter()
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+        API_THROTTLE_SECONDS.labels(self.provider).observe(time.perf_counter() - started)
+
+    def _on_success(self, reserved: int, used: Optional[int], latency: float):
+        """成功時: トークンを精算し、同時実行数を調整"""
+        with self._lock:
+            self.in_flight -= 1
+            if used is not None:
+                self.tokens.adjust(reserved - used)
+
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency_ewma
+            )
+            if self.latency_baseline is None or self.latency_ewma < self.latency_baseline:
+                self.latency_baseline = self.latency_ewma
+
+            now = time.monotonic()
+            if (
+                self.latency_ewma > self.latency_baseline * LATENCY_TOLERANCE
+                and now - self._last_decrease > DECREASE_COOLDOWN
+            ):
+                # 応答が遅くなった（プロバイダー側で詰まっている）: 1割減
+                self.concurrency = max(1.0, self.concurrency * 0.9)
+                self._last_decrease = now
+                # 減らした後は現在のレイテンシを基準にする（下げ続けないため）
+                self.latency_baseline = self.latency_ewma
+            else:
+                # 加算的増加: 上限分の成功で1増える
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+            self._publish_concurrency()
+
+    def _on_failure(self, reserved: int, error: Exception, delay: Optional[float]):
+        """失敗時: 予約したトークンを返却し、混雑であれば同時実行数を半減して一時停止"""
+        with self._lock:
+            self.in_flight -= 1
+            self.tokens.adjust(reserved)
+            if _status_code(error) in CONGESTION_STATUS:
+                now = time.monotonic()
+                if now - self._last_decrease > DECREASE_COOLDOWN:
+                    self.concurrency = max(1.0, self.concurrency / 2)
+                    self._last_decrease = now
+                    logger.warning(
+                        f"{self.provider}のレート制限を検出: 同時実行数を{int(self.concurrency)}に減らします"
+                    )
+                if delay is not None:
+                    self._blocked_until = max(self._blocked_until, now + delay)
+                self._publish_concurrency()
+
+    def _release(self, reserved: int):
+        """中断時（タスクのキャンセルなど）: 枠を解放して予約したトークンを返却"""
+        with self._lock:
+            self.in_flight -= 1
+            self.tokens.adjust(reserved)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """待ち時間（フルジッター付き指数バックオフ、Retry-Afterがあればそれ以上）"""
+        delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = min(self.retry_max_seconds, retry_after) + random.uniform(0, self.retry_base_seconds)
+        return delay
+
+    def _should_retry(self, attempt: int, error: Exception) -> bool:
+        """リトライするかどうか（リトライ回数をメトリクスに記録）"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        reason = str(_status_code(error) or type(error).__name__)
+        API_REQUEST_RETRIES.labels(self.provider, reason).inc()
+        return True
+
+    def _record_cache_usage(self, response: Any):
+        """プロンプトキャッシュのトークン数を記録（変換中なら変換の計測にも加算）"""
+        read, write = cache_usage(response)
+        if read:
+            API_CACHE_TOKENS.labels(self.provider, "read").inc(read)
+        if write:
+            API_CACHE_TOKENS.labels(self.provider, "write").inc(write)
+        if read or write:
+            count_cache_tokens(read, write)
+
+    def call(self, func: Callable[[], T], input_tokens: int = 0, max_tokens: int = 0) -> T:
+        """レート制限・リトライ付きでリクエストを実行（同期）"""
+        reserved = self.reservation(input_tokens, max_tokens)
+        attempt = 0
+        while True:
+            self.acquire(reserved)
+            started = time.perf_counter()
+            try:
+                response = func()
+            except Exception as e:
+                retry = self._should_retry(attempt, e)
+                delay = self._backoff(attempt, e) if retry else None
+                self._on_failure(reserved, e, delay)
+                if not retry:
+                    raise
+                logger.info(f"{self.provider} APIをリトライします（{attempt + 1}回目、{delay:.1f}秒後）: {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # CancelledErrorなどException以外で中断しても枠を解放する
+                self._release(reserved)
+                raise
+            self._on_success(reserved, usage_tokens(response), time.perf_counter() - started)
+            self._record_cache_usage(response)
+            return response
+
+    async def call_async(
+        self, func: Callable[[], Awaitable[T]], input_tokens: int = 0, max_tokens: int = 0
+    ) -> T:
+        """レート制限・リトライ付きでリクエストを実行（非同期）"""
+        reserved = self.reservation(input_tokens, max_tokens)
+        attempt = 0
+        while True:
+            await self.acquire_async(reserved)
+            started = time.perf_counter()
+            try:
+                response = await func()
+            except Exception as e:
+                retry = self._should_retry(attempt, e)
+                delay = self._backoff(attempt, e) if retry else None
+                self._on_failure(reserved, e, delay)
+                if not retry:
+                    raise
+                logger.info(f"{self.provider} APIをリトライします（{attempt + 1}回目、{delay:.1f}秒後）: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # CancelledErrorなどException以外で中断しても枠を解放する
+                self._release(reserved)
+                raise
+            self._on_success(reserved, usage_tokens(response), time.perf_counter() - started)
+            self._record_cache_usage(response)
+            return response
+
+
+class ApiRateLimiter:
+    """プロバイダー・APIキーごとのスケジューラーを保持するレジストリ
+
+    同じAPIキーを使うすべての変換・HTML生成・学習で同じ枠を共有する。
+    """
+
+    # プロバイダーごとの設定名の接頭辞と、TPMにmax_tokensを含めるかどうか
+    PROVIDERS: Dict[str, Tuple[str, bool]] = {
+        "openai": ("OPENAI", True),
+        "anthropic": ("ANTHROPIC", False),
+    }
+
+    def __init__(self):
+        self._schedulers: Dict[Tuple[str, str], ProviderScheduler] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, api_key: str) -> ProviderScheduler:
+        """スケジューラーを取得（なければ設定から作成）"""
+        key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+        with self._lock:
+            scheduler = self._schedulers.get((provider, key_id))
+            if scheduler is None:
+                prefix, counts_output_tokens = self.PROVIDERS.get(provider, (provider.upper(), False))
+                scheduler = ProviderScheduler(
+                    provider=provider,
+                    key_id=key_id,
+                    requests_per_minute=getattr(settings, f"{prefix}_RPM", 0),
+                    tokens_per_minute=getattr(settings, f"{prefix}_TPM", 0),
+                    initial_concurrency=settings.VISION_CONCURRENCY,
+                    max_concurrency=settings.API_MAX_CONCURRENCY,
+                    max_retries=settings.API_MAX_RETRIES,
+                    retry_base_seconds=settings.API_RETRY_BASE_SECONDS,
+                    retry_max_seconds=settings.API_RETRY_MAX_SECONDS,
+                    counts_output_tokens=counts_output_tokens
+                )
+                self._schedulers[(provider, key_id)] = scheduler
+            return scheduler
+
+
+# シングルトンインスタンス
+api_rate_limiter = ApiRateLimiter()
@@ -0,0 +1,131 @@
+"""
+ステージ計測
+変換処理のステージごとに経過時間・CPU時間・回数を集計する
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, TypeVar
+import threading
+import time
+
+T = TypeVar("T")
+
+# ステージ名
+STAGE_PRESCAN = "prescan"  # 事前スキャン（自動選択時のみ）
+STAGE_EXTRACT = "extract"  # PDF解析・抽出（render / vision_api を含む）
+STAGE_RENDER = "render"  # Vision用のページレンダリング・エンコード
+STAGE_VISION_API = "vision_api"  # Vision APIリクエスト（並列実行時は合計が経過時間を超える）
+STAGE_VISION_BATCH_WAIT = "vision_batch_wait"  # Batch APIの送信から完了までの待ち時間
+STAGE_VISION_CACHE_HIT = "vision_cache_hit"  # Vision応答キャッシュのヒット
+STAGE_EXTRACTION_REUSE = "extraction_reuse"  # 同じPDFの変換の抽出結果の再利用（画像のリンクを含む）
+STAGE_IMAGE_WRITE = "image_write"  # 抽出画像のファイル書き込み
+STAGE_DB_COMMIT = "db_commit"  # DBへの書き込み
+STAGE_HTML_GENERATION = "html_generation"  # LLMによるHTML生成
+
+
+@dataclass
+class StageStats:
+    """ステージの集計値"""
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    count: int = 0
+
+
+class StageRecorder:
+    """ステージ計測の記録先（1回の変換につき1つ）
+
+    CPU時間は計測したスレッドのCPU時間（time.thread_time）を使う。
+    複数スレッドから記録されるためロックで保護する。
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, wall_seconds: float = 0.0, cpu_seconds: float = 0.0, count: int = 1):
+        """計測値を加算"""
+        with self._lock:
+            stats = self.stages.setdefault(name, StageStats())
+            stats.wall_seconds += wall_seconds
+            stats.cpu_seconds += cpu_seconds
+            stats.count += count
+
+    def add_cache_tokens(self, read: int = 0, write: int = 0):
+        """プロンプトキャッシュの読み込み・書き込みトークン数を加算"""
+        with self._lock:
+            self.cache_read_tokens += read
+            self.cache_write_tokens += write
+
+    @contextmanager
+    def stage(self, name: str, count: int = 1, measure_cpu: bool = True) -> Iterator[None]:
+        """ブロックの経過時間・CPU時間を計測
+
+        非同期処理の待ち時間など、他の処理とCPU時間が混ざる場合はmeasure_cpu=Falseにする
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time() if measure_cpu else 0.0
+        try:
+            yield
+        finally:
+            cpu_seconds = time.thread_time() - cpu_start if measure_cpu else 0.0
+            self.add(name, time.perf_counter() - wall_start, cpu_seconds, count)
+
+    def timed_iter(self, iterable: Iterable[T], name: str) -> Iterator[T]:
+        """イテレーターの各要素の取得時間を計測（呼び出し側の処理時間は含めない）"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name, count=0):
+                item = next(iterator, _SENTINEL)
+            if item is _SENTINEL:
+                return
+            self.add(name, count=1)
+            yield item
+
+
+_SENTINEL = object()
+
+# 実行中の変換の記録先（スレッド・タスクごと）
+_current_recorder: ContextVar[Optional[StageRecorder]] = ContextVar("stage_recorder", default=None)
+
+
+def get_recorder() -> Optional[StageRecorder]:
+    """現在の記録先を取得"""
+    return _current_recorder.get()
+
+
+@contextmanager
+def recording(recorder: Optional[StageRecorder]) -> Iterator[Optional[StageRecorder]]:
+    """ブロック内の計測を指定した記録先に記録する"""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+@contextmanager
+def record_stage(name: str, count: int = 1, measure_cpu: bool = True) -> Iterator[None]:
+    """現在の記録先にステージを記録（記録先がなければ何もしない）"""
+    recorder = get_recorder()
+    if recorder is None:
+        yield
+        return
+    with recorder.stage(name, count=count, measure_cpu=measure_cpu):
+        yield
+
+
+def count_stage(name: str, count: int = 1):
+    """現在の記録先に回数のみを記録（記録先がなければ何もしない）"""
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.add(name, count=count)
+
+
+def count_cache_tokens(read: int = 0, write: int = 0):
+    """現在の記録先にプロンプトキャッシュのトークン数を記録（記録先がなければ何もしない）"""
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.add_cache_tokens(read, write)
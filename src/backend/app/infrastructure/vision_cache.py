@@ -0,0 +1,141 @@
+"""
+Vision応答キャッシュ
+レンダリング済みページのハッシュ・モデル・プロンプト版をキーに、Vision APIの応答をディスクに保存する
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VisionCache:
+    """Vision API応答のディスクキャッシュ（サイズ上限付きLRU）
+
+    最終アクセス日時をファイルのmtimeで管理し、合計サイズが上限を超えたら
+    古いものから削除する。複数プロセスから同じディレクトリを共有できる。
+    """
+
+    # 上限超過時はこの割合まで削除する（削除処理の頻発を防ぐ）
+    EVICT_TARGET_RATIO = 0.9
+
+    def __init__(self, base_path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_path = Path(base_path or settings.STORAGE_PATH) / "cache" / "vision"
+        self.max_bytes = max_bytes if max_bytes is not None else settings.VISION_CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_data: Union[str, bytes], model: str, prompt: str) -> str:
+        """キャッシュキーを作成（画像ハッシュ・モデル名・プロンプト版）"""
+        if isinstance(image_data, str):
+            image_data = image_data.encode("utf-8")
+        image_hash = hashlib.sha256(image_data).hexdigest()
+        prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        return hashlib.sha256(f"{image_hash}:{model}:{prompt_version}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        """キーに対応するファイルパス"""
+        return self.cache_path / key[:2] / key
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュから応答を取得"""
+        path = self._entry_path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+            # LRU用にアクセス日時を更新
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Optional[str]):
+        """応答をキャッシュに保存（空の応答は保存しない）"""
+        if not value:
+            return
+
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 書き込み途中のファイルを読まれないよう、一時ファイルから置き換える
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        data = value.encode("utf-8")
+        tmp_path.write_bytes(data)
+
+        with self._lock:
+            # 同じキーを上書きする場合は置き換える前のサイズを差し引く
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            if self._total_bytes is None:
+                # 初回は置き換え後に走査する（今回の書き込みも含まれる）
+                total = self._get_total_bytes()
+            else:
+                total = self._total_bytes - old_size + len(data)
+            self._total_bytes = total
+            if total > self.max_bytes:
+                self._evict()
+
+    def _get_total_bytes(self) -> int:
+        """キャッシュの合計サイズ（初回のみディレクトリを走査）"""
+        if self._total_bytes is None:
+            self._total_bytes = sum(
+                p.stat().st_size for p in self.cache_path.glob("*/*") if p.suffix != ".tmp"
+            )
+        return self._total_bytes
+
+    def _evict(self):
+        """アクセス日時の古いものから削除して上限以下にする"""
+        entries = []
+        for p in self.cache_path.glob("*/*"):
+            if p.suffix == ".tmp":
+                continue
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * self.EVICT_TARGET_RATIO)
+        removed = 0
+        for _, size, p in sorted(entries, key=lambda e: e[0]):
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self._total_bytes = total
+        logger.info(f"Visionキャッシュを{removed}件削除しました（{total} bytes）")
+
+    def stats(self) -> Dict[str, float]:
+        """ヒット数・ミス数・ヒット率"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+# シングルトンインスタンス
+vision_cache = VisionCache()
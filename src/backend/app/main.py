@@ -6,12 +6,19 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.core.config import settings
 from app.core.exceptions import AppException
-from app.infrastructure.database import init_db, engine, Base
+from app.infrastructure.database import init_db, engine, Base, SessionLocal
 from app.api import api_router
+from app.converters.parallel import shutdown_page_pool
+from app.infrastructure.api_clients import api_client_pool
+from app.converters.batch import vision_batch_scheduler
+from app.batch import job_worker_pool, recover_abandoned_jobs
+from app.services import JobService
+from app.infrastructure.monitoring import PrometheusMiddleware, queue_depth_is_stale, render_metrics
 
 # ログ設定
 logging.basicConfig(
@@ -34,10 +41,18 @@ async def lifespan(app: FastAPI):
     # 初期ユーザー作成（存在しない場合）
     _create_initial_user()
 
+    # リースが切れたジョブ（前回の停止で中断されたもの）を再登録してワーカーを起動
+    recover_abandoned_jobs()
+    job_worker_pool.start()
+
     yield
 
     # 終了時
     logger.info("Shutting down...")
+    job_worker_pool.shutdown()
+    shutdown_page_pool()
+    vision_batch_scheduler.shutdown()
+    api_client_pool.close()
 
 
 def _create_initial_user():
@@ -94,6 +109,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# メトリクス計測
+if settings.METRICS_ENABLED:
+    app.add_middleware(PrometheusMiddleware)
+
 
 # 例外ハンドラ
 @app.exception_handler(AppException)
@@ -138,6 +157,21 @@ def health_check():
     return {"status": "healthy", "app": settings.APP_NAME, "version": settings.APP_VERSION}
 
 
+# メトリクス（Prometheusテキスト形式）
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """メトリクス"""
+        # 別プロセスのワーカーが取り出したジョブも反映する（集計は一定間隔に1回だけ行う）
+        if queue_depth_is_stale(settings.METRICS_QUEUE_DEPTH_SECONDS):
+            db = SessionLocal()
+            try:
+                JobService(db).publish_queue_depth()
+            finally:
+                db.close()
+        return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 # 開発用エントリーポイント
 if __name__ == "__main__":
     import uvicorn
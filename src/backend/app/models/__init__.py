@@ -3,7 +3,8 @@ SQLAlchemyモデル
 """
 from app.models.user import User
 from app.models.template import Template
-from app.models.conversion import Conversion, ExtractedImage
+from app.models.conversion import Conversion, ConversionBatch, ExtractedImage, ConversionMetric, VisionBatchRequest
 from app.models.settings import UserSettings
+from app.models.job import Job
 
-__all__ = ["User", "Template", "Conversion", "ExtractedImage", "UserSettings"]
+__all__ = ["User", "Template", "Conversion", "ConversionBatch", "ExtractedImage", "ConversionMetric", "VisionBatchRequest", "UserSettings", "Job"]
@@ -1,7 +1,10 @@
 """
 Conversionモデル
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from typing import List
+import json
+
+from sqlalchemy import Column, Integer, Float, Boolean, String, Text, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -15,13 +18,31 @@ class Conversion(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     template_id = Column(Integer, ForeignKey("templates.id", ondelete="RESTRICT"), nullable=False, index=True)
+    batch_id = Column(Integer, ForeignKey("conversion_batches.id", ondelete="SET NULL"), index=True)  # 一括アップロード
     original_filename = Column(String(255), nullable=False)
     pdf_path = Column(String(500), nullable=False)
     generated_html = Column(Text)
     status = Column(String(20), default="uploading", nullable=False, index=True)
     converter_used = Column(String(50))
     requested_converter = Column(String(50))  # フロントエンドから指定されたコンバーター
+    execution_mode = Column(String(20), default="sync")  # sync: 通常 / batch: Vision APIをBatch APIで送信
+    routing_reason = Column(Text)  # 自動選択（auto）でコンバーターを選んだ理由
+    convert_seconds = Column(Float)  # PDF抽出にかかった時間（秒）
     page_count = Column(Integer)
+    cache_read_tokens = Column(Integer, default=0)  # プロンプトキャッシュから読み込んだトークン数
+    cache_write_tokens = Column(Integer, default=0)  # プロンプトキャッシュに書き込んだトークン数
+    # 事前スキャン結果（アップロード時に1回だけ計算）
+    content_hash = Column(String(64), index=True)  # PDFファイルのSHA-256
+    text_page_count = Column(Integer)  # テキスト層のあるページ数
+    image_count = Column(Integer)
+    table_page_count = Column(Integer)  # 表候補ページ数
+    page_info = Column(Text)  # ページごとのサイズ・テキスト層・画像数・表候補（JSON形式で保存）
+    prescanned_at = Column(DateTime)
+    # 抽出結果（同じPDF・コンバーターの変換で再利用する）
+    extraction_key = Column(String(64), index=True)  # 内容のハッシュ・コンバーター・Visionモデルから作るキー
+    extracted_text = Column(Text)  # 抽出したテキスト（抽出が終わるまではNULL）
+    image_placements = Column(Text)  # 画像の挿入位置（JSON形式で保存）
+    extraction_source_id = Column(Integer)  # 抽出結果を再利用した元の変換ID
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -30,7 +51,12 @@ class Conversion(Base):
     # Relationships
     user = relationship("User", back_populates="conversions")
     template = relationship("Template", back_populates="conversions")
+    batch = relationship("ConversionBatch", back_populates="conversions")
     images = relationship("ExtractedImage", back_populates="conversion", cascade="all, delete-orphan")
+    metrics = relationship("ConversionMetric", back_populates="conversion", cascade="all, delete-orphan")
+    vision_batch_requests = relationship(
+        "VisionBatchRequest", back_populates="conversion", cascade="all, delete-orphan"
+    )
 
     # ステータス定数
     STATUS_UPLOADING = "uploading"
@@ -40,15 +66,59 @@ class Conversion(Base):
     STATUS_APPROVED = "approved"
     STATUS_ERROR = "error"
 
+    # 実行モード定数
+    EXECUTION_SYNC = "sync"
+    EXECUTION_BATCH = "batch"
+    EXECUTION_MODES = [EXECUTION_SYNC, EXECUTION_BATCH]
+
     @property
     def is_converted(self) -> bool:
         """変換完了済みかどうか"""
         return self.status in [self.STATUS_CONVERTED, self.STATUS_APPROVED]
 
+    @property
+    def is_prescanned(self) -> bool:
+        """事前スキャン済みかどうか"""
+        return self.prescanned_at is not None
+
+    @property
+    def page_info_list(self) -> List[dict]:
+        """ページごとの事前スキャン結果"""
+        return json.loads(self.page_info) if self.page_info else []
+
+    @property
+    def image_placement_list(self) -> List[dict]:
+        """画像の挿入位置"""
+        return json.loads(self.image_placements) if self.image_placements else []
+
     def __repr__(self):
         return f"<Conversion(id={self.id}, filename={self.original_filename}, status={self.status})>"
 
 
+class ConversionBatch(Base):
+    """一括アップロードテーブル（複数のPDFをまとめて変換する）"""
+    __tablename__ = "conversion_batches"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    template_id = Column(Integer, ForeignKey("templates.id", ondelete="RESTRICT"), nullable=False, index=True)
+    name = Column(String(255))  # ZIPファイル名など
+    execution_mode = Column(String(20), default="sync")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    # Relationships
+    user = relationship("User", back_populates="conversion_batches")
+    conversions = relationship("Conversion", back_populates="batch")
+
+    # ステータス定数（変換の進捗から算出）
+    STATUS_PROCESSING = "processing"
+    STATUS_COMPLETED = "completed"
+    STATUS_COMPLETED_WITH_ERRORS = "completed_with_errors"
+
+    def __repr__(self):
+        return f"<ConversionBatch(id={self.id}, name={self.name})>"
+
+
 class ExtractedImage(Base):
     """抽出画像テーブル"""
     __tablename__ = "extracted_images"
@@ -70,3 +140,59 @@ class ExtractedImage(Base):
 
     def __repr__(self):
         return f"<ExtractedImage(id={self.id}, filename={self.filename})>"
+
+
+class ConversionMetric(Base):
+    """変換ステージ計測テーブル（1変換・1ステージにつき1行）"""
+    __tablename__ = "conversion_metrics"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversion_id = Column(Integer, ForeignKey("conversions.id", ondelete="CASCADE"), nullable=False, index=True)
+    converter = Column(String(50), index=True)  # 実際に使用したコンバーター
+    stage = Column(String(50), nullable=False, index=True)
+    wall_seconds = Column(Float, default=0.0, nullable=False)  # 経過時間（秒）
+    cpu_seconds = Column(Float, default=0.0, nullable=False)  # 計測スレッドのCPU時間（秒）
+    count = Column(Integer, default=0, nullable=False)  # ステージの実行回数（ページ数・画像数など）
+    page_count = Column(Integer)
+    succeeded = Column(Boolean, default=True, nullable=False)  # 変換が成功したかどうか
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    # Relationships
+    conversion = relationship("Conversion", back_populates="metrics")
+
+    def __repr__(self):
+        return f"<ConversionMetric(conversion_id={self.conversion_id}, stage={self.stage})>"
+
+
+class VisionBatchRequest(Base):
+    """Batch APIに送信したVisionリクエストのテーブル（1変換・1プロンプト・1ページにつき1行）
+
+    ジョブを待機中に戻してBatchの完了を待つ間も送信済みのリクエストを引き継ぎ、
+    再実行時に同じページを送り直さずに結果を取得する。
+    """
+    __tablename__ = "vision_batch_requests"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversion_id = Column(Integer, ForeignKey("conversions.id", ondelete="CASCADE"), nullable=False, index=True)
+    request_key = Column(String(64), nullable=False)  # プロバイダー・モデル・プロンプトから作るキー
+    page_index = Column(Integer, nullable=False)  # 0始まりのページ番号
+    provider = Column(String(20), nullable=False)
+    batch_id = Column(String(100), index=True)  # Batchの作成前はNULL
+    custom_id = Column(String(64), nullable=False, unique=True)
+    cache_key = Column(String(64))  # Visionキャッシュのキー（キャッシュ無効時はNULL）
+    status = Column(String(20), default="submitted", nullable=False)
+    content = Column(Text)  # 応答テキスト（完了後）
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # Relationships
+    conversion = relationship("Conversion", back_populates="vision_batch_requests")
+
+    # ステータス定数
+    STATUS_SUBMITTED = "submitted"  # 送信待ち・完了待ち
+    STATUS_COMPLETED = "completed"  # 応答を取得した（失敗したリクエストはcontentがNULL）
+    STATUS_FAILED = "failed"  # Batchの作成・処理に失敗した
+
+    def __repr__(self):
+        return f"<VisionBatchRequest(conversion_id={self.conversion_id}, page_index={self.page_index}, status={self.status})>"
@@ -0,0 +1,63 @@
+"""
+Jobモデル
+"""
+from sqlalchemy import Column, Integer, Boolean, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from app.infrastructure.database import Base
+
+
+class Job(Base):
+    """ジョブキューテーブル（変換・テンプレート学習をワーカーで順に実行する）"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # 取り出し順（status=queuedの中で優先度の高い順・古い順）
+        Index("ix_jobs_status_priority", "status", "priority", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(30), nullable=False)  # conversion / learning
+    target_id = Column(Integer, nullable=False)  # 変換ID・テンプレートID
+    priority = Column(Integer, default=0, nullable=False)  # 大きいほど先に実行
+    status = Column(String(20), default="queued", nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)  # 実行を開始した回数
+    max_attempts = Column(Integer, default=3, nullable=False)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    worker_id = Column(String(100))  # 実行中のワーカー
+    heartbeat_at = Column(DateTime)  # ワーカーが最後に生存を通知した日時
+    lease_expires_at = Column(DateTime, index=True)  # この日時を過ぎると中断されたとみなして再実行する
+    run_after = Column(DateTime)  # この日時まで取り出さない（同じPDFの変換の完了待ち）
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Relationships
+    user = relationship("User", back_populates="jobs")
+
+    # 種別定数
+    KIND_CONVERSION = "conversion"
+    KIND_LEARNING = "learning"
+
+    # ステータス定数
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+
+    # 優先度定数
+    PRIORITY_HIGH = 10
+    PRIORITY_NORMAL = 0
+    PRIORITY_LOW = -10
+
+    @property
+    def is_active(self) -> bool:
+        """待機中・実行中かどうか"""
+        return self.status in self.ACTIVE_STATUSES
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind={self.kind}, target_id={self.target_id}, status={self.status})>"
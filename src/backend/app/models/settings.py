@@ -29,8 +29,14 @@ class UserSettings(Base):
     CONVERTER_PDFPLUMBER = "pdfplumber"
     CONVERTER_OPENAI = "openai"
     CONVERTER_CLAUDE = "claude"
-
-    VALID_CONVERTERS = [CONVERTER_PYMUPDF, CONVERTER_PDFPLUMBER, CONVERTER_OPENAI, CONVERTER_CLAUDE]
+    CONVERTER_HYBRID = "hybrid"
+    CONVERTER_COMPOSITE = "composite"
+    CONVERTER_AUTO = "auto"
+
+    VALID_CONVERTERS = [
+        CONVERTER_PYMUPDF, CONVERTER_PDFPLUMBER, CONVERTER_OPENAI, CONVERTER_CLAUDE, CONVERTER_HYBRID,
+        CONVERTER_COMPOSITE, CONVERTER_AUTO
+    ]
 
     # モデル定数
     OPENAI_MODELS = ["gpt-4o-mini", "gpt-4o"]
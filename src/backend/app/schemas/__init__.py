@@ -12,7 +12,8 @@ from app.schemas.template import (
 from app.schemas.conversion import (
     ConversionCreate, ConversionResponse, ConversionDetailResponse,
     ConversionListResponse, ConversionUploadResponse, ConversionGenerateResponse,
-    ConversionUpdateRequest, ConversionApproveResponse, ImageResponse
+    ConversionUpdateRequest, ConversionApproveResponse, ImageResponse,
+    ConversionBatchResponse, ConversionBatchDetailResponse, ConversionBatchListResponse
 )
 from app.schemas.settings import (
     ConvertersResponse, ConverterUpdateRequest, ConverterInfo,
@@ -20,6 +21,11 @@ from app.schemas.settings import (
     ModelsResponse, ModelUpdateRequest, ModelInfo, ModelCurrentSettings,
     UserSettingsResponse, UserSettingsUpdateRequest
 )
+from app.schemas.metrics import (
+    StageMetricResponse, ConversionMetricsResponse,
+    StageSummaryResponse, MetricsSummaryResponse
+)
+from app.schemas.job import JobResponse, JobListResponse
 
 __all__ = [
     "ApiResponse", "ErrorDetail", "PaginationParams",
@@ -29,8 +35,12 @@ __all__ = [
     "ConversionCreate", "ConversionResponse", "ConversionDetailResponse",
     "ConversionListResponse", "ConversionUploadResponse", "ConversionGenerateResponse",
     "ConversionUpdateRequest", "ConversionApproveResponse", "ImageResponse",
+    "ConversionBatchResponse", "ConversionBatchDetailResponse", "ConversionBatchListResponse",
     "ConvertersResponse", "ConverterUpdateRequest", "ConverterInfo",
     "ApiKeyUpdateRequest", "ApiKeyStatusResponse",
     "ModelsResponse", "ModelUpdateRequest", "ModelInfo", "ModelCurrentSettings",
-    "UserSettingsResponse", "UserSettingsUpdateRequest"
+    "UserSettingsResponse", "UserSettingsUpdateRequest",
+    "StageMetricResponse", "ConversionMetricsResponse",
+    "StageSummaryResponse", "MetricsSummaryResponse",
+    "JobResponse", "JobListResponse"
 ]
@@ -65,6 +65,9 @@ class ConversionDetailResponse(ConversionResponse):
     template: TemplateSimple
     images: List[ImageResponse] = []
     error_message: Optional[str] = None
+    routing_reason: Optional[str] = None
+    execution_mode: Optional[str] = None
+    extraction_source_id: Optional[int] = None  # 抽出結果を再利用した元の変換ID
     approved_at: Optional[datetime] = None
 
     class Config:
@@ -80,6 +83,36 @@ class ConversionListResponse(BaseModel):
     has_next: bool
 
 
+class ConversionBatchResponse(BaseModel):
+    """一括アップロードレスポンススキーマ（進捗は変換・ジョブのステータスから集計）"""
+    id: int
+    name: Optional[str] = None
+    template_id: int
+    execution_mode: Optional[str] = None
+    status: str  # processing / completed / completed_with_errors
+    total: int
+    queued: int  # 実行待ちのジョブ数
+    running: int  # 実行中のジョブ数
+    completed: int
+    error: int
+    progress: float  # 完了・エラーになった割合（0〜1）
+    created_at: datetime
+
+
+class ConversionBatchDetailResponse(ConversionBatchResponse):
+    """一括アップロード詳細レスポンススキーマ"""
+    items: List[ConversionResponse]
+
+
+class ConversionBatchListResponse(BaseModel):
+    """一括アップロード一覧レスポンススキーマ"""
+    items: List[ConversionBatchResponse]
+    total: int
+    page: int
+    limit: int
+    has_next: bool
+
+
 class ConversionUploadResponse(BaseModel):
     """アップロードレスポンススキーマ"""
     id: int
@@ -93,6 +126,7 @@ class ConversionUploadResponse(BaseModel):
 class ConversionGenerateResponse(BaseModel):
     """生成開始レスポンススキーマ"""
     id: int
+    job_id: Optional[int] = None
     status: str
     message: str
 
@@ -0,0 +1,34 @@
+"""
+ジョブスキーマ（Pydantic）
+"""
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+
+class JobResponse(BaseModel):
+    """ジョブレスポンススキーマ"""
+    id: int
+    kind: str
+    target_id: int
+    priority: int
+    status: str
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobListResponse(BaseModel):
+    """ジョブ一覧レスポンススキーマ"""
+    items: List[JobResponse]
+    total: int
+    page: int
+    limit: int
+    has_next: bool
@@ -0,0 +1,48 @@
+"""
+変換計測スキーマ（Pydantic）
+"""
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+
+class StageMetricResponse(BaseModel):
+    """ステージ計測レスポンススキーマ"""
+    stage: str
+    converter: Optional[str] = None
+    wall_seconds: float
+    cpu_seconds: float
+    count: int
+    page_count: Optional[int] = None
+    succeeded: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversionMetricsResponse(BaseModel):
+    """変換計測レスポンススキーマ"""
+    conversion_id: int
+    stages: List[StageMetricResponse]
+    cache_read_tokens: int = 0  # プロンプトキャッシュから読み込んだトークン数
+    cache_write_tokens: int = 0  # プロンプトキャッシュに書き込んだトークン数
+
+
+class StageSummaryResponse(BaseModel):
+    """コンバーター・ステージ別集計レスポンススキーマ（1ページあたりの秒数）"""
+    converter: str
+    stage: str
+    conversions: int
+    total_count: int
+    total_wall_seconds: float
+    total_cpu_seconds: float
+    wall_per_page_p50: float
+    wall_per_page_p95: float
+    cpu_per_page_p50: float
+    cpu_per_page_p95: float
+
+
+class MetricsSummaryResponse(BaseModel):
+    """計測集計レスポンススキーマ"""
+    items: List[StageSummaryResponse]
@@ -81,5 +81,6 @@ class TemplateListResponse(BaseModel):
 class LearnResponse(BaseModel):
     """学習開始レスポンススキーマ"""
     id: int
+    job_id: Optional[int] = None
     status: str
     message: str
@@ -7,6 +7,11 @@ from app.services.conversion_service import ConversionService
 from app.services.learning_service import LearningService
 from app.services.settings_service import SettingsService
 from app.services.html_generator_service import HtmlGeneratorService
+from app.services.converter_router_service import ConverterRouterService
+from app.services.metrics_service import ConversionMetricsService
+from app.services.job_service import JobService
+from app.services.conversion_batch_service import ConversionBatchService
+from app.services.vision_batch_service import VisionBatchService, ConversionBatchRequestStore
 
 __all__ = [
     "AuthService",
@@ -14,5 +19,11 @@ __all__ = [
     "ConversionService",
     "LearningService",
     "SettingsService",
-    "HtmlGeneratorService"
+    "HtmlGeneratorService",
+    "ConverterRouterService",
+    "ConversionMetricsService",
+    "JobService",
+    "ConversionBatchService",
+    "VisionBatchService",
+    "ConversionBatchRequestStore"
 ]
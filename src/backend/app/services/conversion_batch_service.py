@@ -0,0 +1,238 @@
+"""
+一括アップロードサービス
+複数のPDF・ZIPファイルから変換をまとめて作成し、ジョブキューにまとめて登録する
+"""
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import zipfile
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Conversion, ConversionBatch, Job
+from app.services.conversion_service import ConversionService
+from app.services.job_service import JobService
+from app.core.config import settings
+from app.core.exceptions import (
+    ConversionBatchNotFoundException, FileTooLargeException, InvalidArchiveException,
+    InvalidFileTypeException, TooManyFilesException, ValidationException
+)
+from app.infrastructure.file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+# ストレージへ書き込む単位（バイト）
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ConversionBatchService:
+    """一括アップロードサービスクラス"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(
+        self,
+        user_id: int,
+        template_id: int,
+        uploads: List[Tuple[str, BinaryIO]],
+        name: Optional[str] = None,
+        requested_converter: Optional[str] = None,
+        execution_mode: str = Conversion.EXECUTION_SYNC,
+        priority: int = Job.PRIORITY_LOW
+    ) -> ConversionBatch:
+        """一括アップロードを作成してジョブを登録
+
+        uploadsはファイル名と内容の組（ZIPは中のPDFを展開する）。PDFはストレージへ分割して書き込み、
+        変換レコードとジョブは1回のコミットで登録する。事前スキャンは変換時に必要な場合だけ行い、
+        アップロード時は書き込みながら内容のハッシュだけを計算する。
+        """
+        # テンプレートの確認は1回だけ行う
+        ConversionService(self.db).get_ready_template(template_id, user_id)
+        if execution_mode not in Conversion.EXECUTION_MODES:
+            raise ValidationException(
+                f"無効な実行モード: {execution_mode}",
+                details={"valid_modes": Conversion.EXECUTION_MODES}
+            )
+
+        batch = ConversionBatch(
+            user_id=user_id,
+            template_id=template_id,
+            name=name or self._default_name(uploads),
+            execution_mode=execution_mode
+        )
+        self.db.add(batch)
+        self.db.flush()
+
+        conversion_ids = []
+        try:
+            for filename, source in self._iter_pdfs(uploads):
+                if len(conversion_ids) >= settings.BATCH_MAX_FILES:
+                    raise TooManyFilesException(settings.BATCH_MAX_FILES)
+                conversion = Conversion(
+                    user_id=user_id,
+                    template_id=template_id,
+                    batch_id=batch.id,
+                    original_filename=filename,
+                    pdf_path="",  # 後で更新
+                    # 登録と同時にジョブキューに入るため変換中にする
+                    status=Conversion.STATUS_CONVERTING,
+                    requested_converter=requested_converter,
+                    execution_mode=execution_mode
+                )
+                self.db.add(conversion)
+                self.db.flush()
+                conversion_ids.append(conversion.id)
+
+                digest = hashlib.sha256()
+                conversion.pdf_path = file_storage.save_pdf_chunks(
+                    conversion.id, filename, self._read_chunks(source, digest)
+                )
+                conversion.content_hash = digest.hexdigest()
+
+            if not conversion_ids:
+                raise InvalidArchiveException("PDFファイルが含まれていません")
+
+            # 変換レコードとジョブを同じコミットで確定する
+            JobService(self.db).enqueue_many(user_id, Job.KIND_CONVERSION, conversion_ids, priority)
+        except Exception:
+            self.db.rollback()
+            for conversion_id in conversion_ids:
+                file_storage.delete_conversion_files(conversion_id)
+            raise
+
+        self.db.refresh(batch)
+        logger.info(f"一括アップロードを登録しました: {batch}（{len(conversion_ids)}件）")
+        return batch
+
+    def _default_name(self, uploads: List[Tuple[str, BinaryIO]]) -> Optional[str]:
+        """ZIPファイル1件のアップロードはそのファイル名を名前にする"""
+        if len(uploads) == 1 and uploads[0][0].lower().endswith(".zip"):
+            return uploads[0][0]
+        return None
+
+    def _iter_pdfs(self, uploads: List[Tuple[str, BinaryIO]]) -> Iterator[Tuple[str, BinaryIO]]:
+        """アップロードされたファイルからPDFを順に取り出す（ZIPは展開する）"""
+        for filename, source in uploads:
+            lower = filename.lower()
+            if lower.endswith(".zip"):
+                yield from self._iter_archive(source)
+            elif lower.endswith(".pdf"):
+                yield os.path.basename(filename), source
+            else:
+                raise InvalidFileTypeException("PDF・ZIP")
+
+    def _iter_archive(self, source: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+        """ZIP内のPDFを順に取り出す（ディレクトリ構造は無視し、PDF以外は読み飛ばす）"""
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile:
+            raise InvalidArchiveException()
+
+        with archive:
+            for info in archive.infolist():
+                path = PurePosixPath(info.filename)
+                if info.is_dir() or path.parts[0] == "__MACOSX" or path.name.startswith("."):
+                    continue
+                if not path.name.lower().endswith(".pdf"):
+                    continue
+                # 展開前にサイズを確認する（展開中も_read_chunksで上限を確認する）
+                if info.file_size > settings.MAX_UPLOAD_SIZE:
+                    raise FileTooLargeException(settings.MAX_UPLOAD_SIZE // (1024 * 1024))
+                with archive.open(info) as member:
+                    yield path.name, member
+
+    def _read_chunks(self, source: BinaryIO, digest) -> Iterator[bytes]:
+        """ファイルを分割して読み込み、サイズを確認しながらハッシュを計算する"""
+        size = 0
+        while True:
+            try:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+            except zipfile.BadZipFile:
+                raise InvalidArchiveException("ZIPファイル内のPDFを読み込めません")
+            if not chunk:
+                return
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                raise FileTooLargeException(settings.MAX_UPLOAD_SIZE // (1024 * 1024))
+            digest.update(chunk)
+            yield chunk
+
+    def get_by_id(self, batch_id: int, user_id: int) -> ConversionBatch:
+        """IDで一括アップロードを取得"""
+        batch = self.db.query(ConversionBatch).filter(
+            ConversionBatch.id == batch_id,
+            ConversionBatch.user_id == user_id
+        ).first()
+
+        if not batch:
+            raise ConversionBatchNotFoundException(batch_id)
+
+        return batch
+
+    def get_list(
+        self,
+        user_id: int,
+        page: int = 1,
+        limit: int = 20
+    ) -> tuple[List[ConversionBatch], int]:
+        """一括アップロード一覧を取得"""
+        query = self.db.query(ConversionBatch).filter(ConversionBatch.user_id == user_id)
+        total = query.count()
+
+        batches = query.order_by(ConversionBatch.id.desc()) \
+            .offset((page - 1) * limit) \
+            .limit(limit) \
+            .all()
+
+        return batches, total
+
+    def get_conversions(self, batch: ConversionBatch) -> List[Conversion]:
+        """一括アップロードの変換一覧"""
+        return self.db.query(Conversion).filter(
+            Conversion.batch_id == batch.id
+        ).order_by(Conversion.id).all()
+
+    def get_progress(self, batch: ConversionBatch) -> dict:
+        """変換・ジョブのステータスから進捗を集計"""
+        statuses = dict(
+            self.db.query(Conversion.status, func.count(Conversion.id))
+            .filter(Conversion.batch_id == batch.id)
+            .group_by(Conversion.status)
+            .all()
+        )
+        job_statuses = dict(
+            self.db.query(Job.status, func.count(Job.id))
+            .filter(
+                Job.kind == Job.KIND_CONVERSION,
+                Job.status.in_(Job.ACTIVE_STATUSES),
+                Job.target_id.in_(select(Conversion.id).where(Conversion.batch_id == batch.id))
+            )
+            .group_by(Job.status)
+            .all()
+        )
+
+        total = sum(statuses.values())
+        completed = statuses.get(Conversion.STATUS_CONVERTED, 0) + statuses.get(Conversion.STATUS_APPROVED, 0)
+        error = statuses.get(Conversion.STATUS_ERROR, 0)
+        finished = completed + error
+
+        if finished < total:
+            status = ConversionBatch.STATUS_PROCESSING
+        elif error:
+            status = ConversionBatch.STATUS_COMPLETED_WITH_ERRORS
+        else:
+            status = ConversionBatch.STATUS_COMPLETED
+
+        return {
+            "status": status,
+            "total": total,
+            "queued": job_statuses.get(Job.STATUS_QUEUED, 0),
+            "running": job_statuses.get(Job.STATUS_RUNNING, 0),
+            "completed": completed,
+            "error": error,
+            "progress": finished / total if total else 1.0
+        }
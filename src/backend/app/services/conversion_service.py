@@ -4,16 +4,22 @@ PDF変換のCRUD操作
 """
 from typing import List, Optional
 from datetime import datetime
+import hashlib
+import json
+import logging
 from sqlalchemy.orm import Session
 
-from app.models import Conversion, ExtractedImage, Template
+from app.models import Conversion, ExtractedImage, Job, Template
 from app.core.exceptions import (
     ConversionNotFoundException, TemplateNotReadyException,
-    FileTooLargeException, InvalidFileTypeException
+    FileTooLargeException, InvalidFileTypeException, ValidationException
 )
 from app.infrastructure.file_storage import file_storage
+from app.converters.prescan import PrescanResult, prescan_pdf
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class ConversionService:
     """変換サービスクラス"""
@@ -31,17 +37,7 @@ class ConversionService:
     ) -> Conversion:
         """変換を作成（PDFアップロード）"""
         # テンプレートの存在確認と学習状態チェック
-        template = self.db.query(Template).filter(
-            Template.id == template_id,
-            Template.user_id == user_id
-        ).first()
-
-        if not template:
-            from app.core.exceptions import TemplateNotFoundException
-            raise TemplateNotFoundException(template_id)
-
-        if not template.is_ready:
-            raise TemplateNotReadyException()
+        self.get_ready_template(template_id, user_id)
 
         # ファイルサイズチェック
         if len(file_content) > settings.MAX_UPLOAD_SIZE:
@@ -70,8 +66,50 @@ class ConversionService:
         conversion.status = Conversion.STATUS_UPLOADED
         self.db.commit()
 
+        # 事前スキャン（後段はPDFを再解析せずにこの結果を使う）
+        self.prescan(conversion)
+
         return conversion
 
+    def get_ready_template(self, template_id: int, user_id: int) -> Template:
+        """変換に使えるテンプレートを取得（存在確認と学習状態チェック）"""
+        template = self.db.query(Template).filter(
+            Template.id == template_id,
+            Template.user_id == user_id
+        ).first()
+
+        if not template:
+            from app.core.exceptions import TemplateNotFoundException
+            raise TemplateNotFoundException(template_id)
+
+        if not template.is_ready:
+            raise TemplateNotReadyException()
+
+        return template
+
+    def prescan(self, conversion: Conversion) -> Optional[PrescanResult]:
+        """PDFを事前スキャンして結果を保存"""
+        pdf_path = file_storage.get_file_path(conversion.pdf_path)
+        if not pdf_path:
+            return None
+
+        try:
+            result = prescan_pdf(str(pdf_path))
+        except Exception as e:
+            # 解析できないPDFは変換時にエラーとして扱う
+            logger.warning(f"事前スキャンに失敗しました（conversion_id={conversion.id}）: {e}")
+            return None
+
+        conversion.page_count = result.page_count
+        conversion.content_hash = result.content_hash
+        conversion.text_page_count = result.text_page_count
+        conversion.image_count = result.image_count
+        conversion.table_page_count = result.table_page_count
+        conversion.page_info = json.dumps(result.pages_to_list())
+        conversion.prescanned_at = datetime.utcnow()
+        self.db.commit()
+        return result
+
     def get_by_id(self, conversion_id: int, user_id: int) -> Conversion:
         """IDで変換を取得"""
         conversion = self.db.query(Conversion).filter(
@@ -129,6 +167,16 @@ class ConversionService:
         self.db.refresh(conversion)
         return conversion
 
+    def set_execution_mode(self, conversion: Conversion, mode: str):
+        """実行モードを設定（sync / batch）"""
+        if mode not in Conversion.EXECUTION_MODES:
+            raise ValidationException(
+                f"無効な実行モード: {mode}",
+                details={"valid_modes": Conversion.EXECUTION_MODES}
+            )
+        conversion.execution_mode = mode
+        self.db.commit()
+
     def set_converting_status(self, conversion: Conversion):
         """変換中ステータスに更新"""
         conversion.status = Conversion.STATUS_CONVERTING
@@ -139,13 +187,15 @@ class ConversionService:
         conversion: Conversion,
         html: str,
         converter_used: str,
-        page_count: int
+        page_count: int,
+        convert_seconds: Optional[float] = None
     ):
         """変換完了ステータスに更新"""
         conversion.status = Conversion.STATUS_CONVERTED
         conversion.generated_html = html
         conversion.converter_used = converter_used
         conversion.page_count = page_count
+        conversion.convert_seconds = convert_seconds
         self.db.commit()
 
     def set_error_status(self, conversion: Conversion, error_message: str):
@@ -154,6 +204,81 @@ class ConversionService:
         conversion.error_message = error_message
         self.db.commit()
 
+    def start_extraction(self, conversion: Conversion, extraction_signature: str):
+        """抽出を開始（前回の抽出結果を破棄し、再利用のキーを記録）
+
+        内容のハッシュがない（事前スキャンに失敗した）変換はキーを持たず、再利用の対象にしない。
+        """
+        conversion.extraction_key = (
+            hashlib.sha256(f"{conversion.content_hash}:{extraction_signature}".encode("utf-8")).hexdigest()
+            if conversion.content_hash else None
+        )
+        conversion.extracted_text = None
+        conversion.image_placements = None
+        conversion.extraction_source_id = None
+        self.db.commit()
+
+    def save_extraction(self, conversion: Conversion, text: str, image_placements: List[dict]):
+        """抽出結果を保存（同じキーの変換で再利用できるようになる）"""
+        conversion.extracted_text = text
+        conversion.image_placements = json.dumps(image_placements)
+        self.db.commit()
+
+    def find_reusable_extraction(self, conversion: Conversion) -> Optional[Conversion]:
+        """同じキーで抽出が終わっている変換を取得（同じユーザーの変換のみ）"""
+        if not conversion.extraction_key:
+            return None
+        return self.db.query(Conversion).filter(
+            Conversion.user_id == conversion.user_id,
+            Conversion.extraction_key == conversion.extraction_key,
+            Conversion.id != conversion.id,
+            Conversion.extracted_text.isnot(None)
+        ).order_by(Conversion.id.desc()).first()
+
+    def find_inflight_extraction(self, conversion: Conversion) -> Optional[Conversion]:
+        """同じキーで抽出中の変換を取得
+
+        ワーカーがリースを保持している変換だけを対象にする。同時に始まった変換同士が
+        待ち合わないよう、先に登録された変換だけを待つ。
+        """
+        if not conversion.extraction_key:
+            return None
+        return self.db.query(Conversion).join(
+            Job, (Job.target_id == Conversion.id) & (Job.kind == Job.KIND_CONVERSION)
+        ).filter(
+            Conversion.user_id == conversion.user_id,
+            Conversion.extraction_key == conversion.extraction_key,
+            Conversion.id < conversion.id,
+            Conversion.extracted_text.is_(None),
+            Conversion.status == Conversion.STATUS_CONVERTING,
+            Job.status == Job.STATUS_RUNNING,
+            Job.lease_expires_at > datetime.utcnow()
+        ).first()
+
+    def copy_extraction(self, source: Conversion, conversion: Conversion):
+        """別の変換の抽出結果（テキスト・画像）を引き継ぐ（画像ファイルはハードリンクで共有）"""
+        # 同じファイル名の画像は1件だけ引き継ぐ（再生成時に既にある画像も含む）
+        copied = {image.filename for image in conversion.images}
+        for image in source.images:
+            if image.filename in copied:
+                continue
+            copied.add(image.filename)
+            self.db.add(ExtractedImage(
+                conversion_id=conversion.id,
+                filename=image.filename,
+                file_path=file_storage.link_image(source.id, conversion.id, image.filename),
+                page_number=image.page_number,
+                order_in_page=image.order_in_page,
+                width=image.width,
+                height=image.height,
+                file_size=image.file_size,
+                mime_type=image.mime_type
+            ))
+        conversion.extracted_text = source.extracted_text
+        conversion.image_placements = source.image_placements
+        conversion.extraction_source_id = source.id
+        self.db.commit()
+
     def add_image(
         self,
         conversion_id: int,
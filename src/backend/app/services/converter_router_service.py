@@ -0,0 +1,193 @@
+"""
+コンバーター自動選択サービス
+事前スキャン結果と過去の変換実績から、品質しきい値を満たす最も安いコンバーターを選ぶ
+"""
+from dataclasses import dataclass, field
+from statistics import median
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.models import Conversion
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ページ種別ごとの品質スコア（0〜1）
+# text: テキスト層あり / table: テキスト層ありの表候補ページ / scan: テキスト層なし
+QUALITY_BY_PAGE_TYPE: Dict[str, Dict[str, float]] = {
+    "pymupdf": {"text": 1.0, "table": 0.7, "scan": 0.0},
+    "composite": {"text": 1.0, "table": 1.0, "scan": 0.0},
+    "pdfplumber": {"text": 0.8, "table": 1.0, "scan": 0.0},
+    "hybrid": {"text": 1.0, "table": 0.7, "scan": 0.9},
+    "claude": {"text": 0.9, "table": 0.9, "scan": 0.9},
+    "openai": {"text": 0.9, "table": 0.9, "scan": 0.9},
+}
+
+# 実績がない場合の1ページあたりの処理時間（秒）
+DEFAULT_SECONDS_PER_PAGE: Dict[str, float] = {
+    "pymupdf": 0.2,
+    "composite": 0.25,
+    "pdfplumber": 0.3,
+    "claude": 3.0,
+    "openai": 3.0,
+}
+
+# 同点の場合の優先順（先頭ほど優先）
+CANDIDATE_ORDER = ["pymupdf", "composite", "pdfplumber", "hybrid", "claude", "openai"]
+
+
+@dataclass
+class RoutingCandidate:
+    """コンバーター候補の評価"""
+    converter: str
+    quality: float
+    api_pages: int
+    estimated_seconds: float
+
+    def describe(self) -> str:
+        """評価の要約"""
+        return (
+            f"{self.converter}（品質 {self.quality:.2f}、API {self.api_pages}ページ、"
+            f"予測 {self.estimated_seconds:.1f}秒）"
+        )
+
+
+@dataclass
+class RoutingDecision:
+    """コンバーター選択結果"""
+    converter: str
+    reason: str
+    candidates: List[RoutingCandidate] = field(default_factory=list)
+
+
+class ConverterRouterService:
+    """コンバーター自動選択サービスクラス
+
+    ページをテキスト・表・スキャンに分類して候補ごとの品質を計算し、
+    しきい値以上の候補からAPI課金ページ数が最少、次に予測時間が最短のものを選ぶ。
+    予測時間は同じコンバーターの直近の変換実績（1ページあたりの中央値）から求める。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._seconds_per_page: Dict[str, float] = {}
+
+    def get_seconds_per_page(self, converter: str) -> float:
+        """1ページあたりの処理時間（秒）を過去の実績から推定"""
+        if converter in self._seconds_per_page:
+            return self._seconds_per_page[converter]
+
+        rows = self.db.query(Conversion.convert_seconds, Conversion.page_count).filter(
+            Conversion.converter_used == converter,
+            Conversion.convert_seconds.isnot(None),
+            Conversion.page_count > 0
+        ).order_by(Conversion.created_at.desc()).limit(settings.AUTO_HISTORY_SIZE).all()
+
+        if rows:
+            seconds = median(convert_seconds / page_count for convert_seconds, page_count in rows)
+        else:
+            seconds = DEFAULT_SECONDS_PER_PAGE.get(converter, DEFAULT_SECONDS_PER_PAGE["pymupdf"])
+
+        self._seconds_per_page[converter] = seconds
+        return seconds
+
+    @staticmethod
+    def classify_pages(conversion: Conversion) -> Dict[str, int]:
+        """事前スキャン結果からページ種別ごとのページ数を集計"""
+        counts = {"text": 0, "table": 0, "scan": 0}
+        for page in conversion.page_info_list:
+            if not page.get("has_text"):
+                counts["scan"] += 1
+            elif page.get("table_candidate"):
+                counts["table"] += 1
+            else:
+                counts["text"] += 1
+        return counts
+
+    def _evaluate(
+        self,
+        converter: str,
+        page_counts: Dict[str, int],
+        vision_provider: Optional[str]
+    ) -> RoutingCandidate:
+        """候補コンバーターの品質・API課金ページ数・予測時間を計算"""
+        total = sum(page_counts.values())
+        quality_table = dict(QUALITY_BY_PAGE_TYPE[converter])
+
+        if converter == "hybrid":
+            # テキスト層のないページのみVision API（APIキー未設定時はローカル抽出）
+            local_pages = page_counts["text"] + page_counts["table"]
+            if vision_provider is None:
+                quality_table["scan"] = 0.0
+                api_pages = 0
+                seconds = total * self.get_seconds_per_page("pymupdf")
+            else:
+                api_pages = page_counts["scan"]
+                seconds = (
+                    local_pages * self.get_seconds_per_page("pymupdf")
+                    + api_pages * self.get_seconds_per_page(vision_provider)
+                )
+        else:
+            api_pages = total if converter in ("claude", "openai") else 0
+            seconds = total * self.get_seconds_per_page(converter)
+
+        quality = (
+            sum(quality_table[page_type] * count for page_type, count in page_counts.items()) / total
+            if total else 1.0
+        )
+        return RoutingCandidate(
+            converter=converter,
+            quality=quality,
+            api_pages=api_pages,
+            estimated_seconds=seconds
+        )
+
+    def choose(
+        self,
+        conversion: Conversion,
+        has_openai_key: bool = False,
+        has_anthropic_key: bool = False
+    ) -> RoutingDecision:
+        """コンバーターを選択"""
+        if not conversion.is_prescanned:
+            return RoutingDecision(
+                converter=settings.DEFAULT_CONVERTER,
+                reason=f"自動選択: 事前スキャン結果がないため既定の{settings.DEFAULT_CONVERTER}を使用"
+            )
+
+        # ハイブリッド変換のVision APIはClaude優先（ConverterManagerと同じ）
+        vision_provider = "claude" if has_anthropic_key else "openai" if has_openai_key else None
+        available = [
+            converter for converter in CANDIDATE_ORDER
+            if (converter != "claude" or has_anthropic_key) and (converter != "openai" or has_openai_key)
+        ]
+
+        page_counts = self.classify_pages(conversion)
+        candidates = [self._evaluate(converter, page_counts, vision_provider) for converter in available]
+
+        threshold = settings.AUTO_MIN_QUALITY
+        qualified = [c for c in candidates if c.quality >= threshold]
+        if qualified:
+            selected = min(
+                qualified,
+                key=lambda c: (c.api_pages, c.estimated_seconds, CANDIDATE_ORDER.index(c.converter))
+            )
+            basis = f"品質{threshold:.2f}以上でAPI課金・予測時間が最小"
+        else:
+            selected = min(
+                candidates,
+                key=lambda c: (-c.quality, c.api_pages, c.estimated_seconds, CANDIDATE_ORDER.index(c.converter))
+            )
+            basis = f"品質{threshold:.2f}以上の候補がないため最高品質"
+
+        reason = (
+            f"自動選択: {selected.describe()} - {basis}。"
+            f"ページ構成: テキスト{page_counts['text']} / 表候補{page_counts['table']} / "
+            f"テキスト層なし{page_counts['scan']}。"
+            f"候補: " + "、".join(c.describe() for c in candidates)
+        )
+        logger.info(f"conversion_id={conversion.id} {reason}")
+        return RoutingDecision(converter=selected.converter, reason=reason, candidates=candidates)
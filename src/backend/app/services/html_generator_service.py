@@ -4,16 +4,28 @@ HTML生成サービス
 """
 import json
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.models import Template, UserSettings
 from app.core.security import security_service
 from app.core.exceptions import LLMException
+from app.infrastructure.api_clients import api_client_pool
+from app.infrastructure.generation_stream import GenerationStream
+from app.infrastructure.monitoring import observe_api_call
+from app.infrastructure.rate_limiter import api_rate_limiter, estimate_text_tokens
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class StreamedCompletion:
+    """ストリーミングで受け取った応答（レートリミッターが使用量を読めるようusageを持つ）"""
+    text: str
+    usage: Any = None
+
+
 class HtmlGeneratorService:
     """HTML生成サービスクラス"""
 
@@ -24,9 +36,13 @@ class HtmlGeneratorService:
         self,
         pdf_text: str,
         template: Template,
-        user_settings: UserSettings
+        user_settings: UserSettings,
+        stream: Optional[GenerationStream] = None
     ) -> str:
-        """学習したテンプレートルールを使用してスタイル付きHTMLを生成"""
+        """学習したテンプレートルールを使用してスタイル付きHTMLを生成
+
+        streamを渡すと、LLMの応答を生成途中から配信する。
+        """
 
         # 学習ルールを取得
         if not template.learned_rules:
@@ -55,13 +71,17 @@ class HtmlGeneratorService:
             anthropic_key = security_service.decrypt_api_key(user_settings.anthropic_api_key_enc)
 
         # LLMでHTML生成
-        prompt = self._build_generation_prompt(pdf_text, rules)
+        instructions, content = self._build_generation_prompt(pdf_text, rules)
 
         try:
             if anthropic_key:
-                html = await self._call_anthropic(prompt, anthropic_key, user_settings.anthropic_model)
+                html = await self._call_anthropic(
+                    instructions, content, anthropic_key, user_settings.anthropic_model, stream
+                )
             elif openai_key:
-                html = await self._call_openai(prompt, openai_key, user_settings.openai_model)
+                html = await self._call_openai(
+                    instructions, content, openai_key, user_settings.openai_model, stream
+                )
             else:
                 logger.warning("No LLM API key available, using basic conversion")
                 return self._styled_basic_html_wrap(pdf_text, rules)
@@ -73,8 +93,11 @@ class HtmlGeneratorService:
             logger.warning(f"LLM HTML generation failed: {e}, using styled basic conversion")
             return self._styled_basic_html_wrap(pdf_text, rules)
 
-    def _build_generation_prompt(self, pdf_text: str, rules: dict) -> str:
-        """HTML生成用プロンプトを構築"""
+    def _build_generation_prompt(self, pdf_text: str, rules: dict) -> Tuple[str, str]:
+        """HTML生成用プロンプトを構築（テンプレートごとに共通の指示, PDFテキスト）
+
+        共通の指示を先頭にまとめ、プロバイダーのプロンプトキャッシュで再利用できるようにする。
+        """
 
         # ルールから情報を抽出
         site_name = rules.get("site_name", "")
@@ -91,8 +114,8 @@ class HtmlGeneratorService:
         if len(pdf_text) > max_text_length:
             pdf_text = pdf_text[:max_text_length] + "\n\n[... 以下省略 ...]"
 
-        return f"""あなたはPDFテキストをWebページのHTMLに変換するエキスパートです。
-以下のPDFテキストを、指定されたサイトのデザインスタイルに合わせてHTMLに変換してください。
+        instructions = f"""あなたはPDFテキストをWebページのHTMLに変換するエキスパートです。
+ユーザーが送るPDFテキストを、指定されたサイトのデザインスタイルに合わせてHTMLに変換してください。
 
 【サイト情報】
 サイト名: {site_name}
@@ -106,58 +129,119 @@ class HtmlGeneratorService:
 【変換指示】
 {conversion_instructions}
 
-【PDFテキスト】
-{pdf_text}
-
 【出力形式】
 - 完全なHTML本文のみを出力してください（<!DOCTYPE>やhead要素は不要）
 - 上記のHTMLテンプレートのクラス名やスタイルを使用してください
 - 見出し、段落、リスト、表などを適切にマークアップしてください
 - 元のテキストの構造（見出し階層、箇条書き、表など）を維持してください
 - このサイトの特徴的なデザイン要素を活用してください
-- 重要な箇所は強調ボックスなどを使って目立たせてください
+- 重要な箇所は強調ボックスなどを使って目立たせてください"""
 
-HTMLを出力してください："""
+        content = f"""【PDFテキスト】
+{pdf_text}
 
-    async def _call_openai(self, prompt: str, api_key: str, model: str) -> str:
-        """OpenAI APIを呼び出し"""
-        try:
-            from openai import AsyncOpenAI
+HTMLを出力してください："""
 
-            client = AsyncOpenAI(api_key=api_key)
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=4096,
-                temperature=0.3
-            )
+        return instructions, content
 
-            content = response.choices[0].message.content
-            return self._extract_html(content)
+    async def _call_openai(
+        self,
+        instructions: str,
+        content: str,
+        api_key: str,
+        model: str,
+        stream: Optional[GenerationStream] = None
+    ) -> str:
+        """OpenAI APIをストリーミングで呼び出し（共通の指示はsystemメッセージとして先頭に置き、自動キャッシュを効かせる）"""
+        try:
+            # プールのクライアントは共有イベントループで使う（応答を受け取り終えるまで借りておく）
+            with api_client_pool.lease_async_client("openai", api_key) as client:
+                async def request() -> StreamedCompletion:
+                    if stream is not None:
+                        stream.reset()
+                    chunks = []
+                    usage = None
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "system", "content": instructions},
+                            {"role": "user", "content": content}
+                        ],
+                        max_tokens=4096,
+                        temperature=0.3,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    async for chunk in response:
+                        # 最後のチャンクはchoicesが空で使用量のみ
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            chunks.append(delta)
+                            if stream is not None:
+                                stream.append(delta)
+                    return StreamedCompletion(text="".join(chunks), usage=usage)
+
+                with observe_api_call("openai", "html_generation"):
+                    response = await api_client_pool.run_async(api_rate_limiter.get("openai", api_key).call_async(
+                        request,
+                        input_tokens=estimate_text_tokens(instructions + content),
+                        max_tokens=4096
+                    ))
+
+            return self._extract_html(response.text)
 
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise LLMException(f"OpenAI APIエラー: {str(e)}")
 
-    async def _call_anthropic(self, prompt: str, api_key: str, model: str) -> str:
-        """Anthropic APIを呼び出し"""
+    async def _call_anthropic(
+        self,
+        instructions: str,
+        content: str,
+        api_key: str,
+        model: str,
+        stream: Optional[GenerationStream] = None
+    ) -> str:
+        """Anthropic APIをストリーミングで呼び出し（共通の指示はcache_control付きのsystemにする）"""
         try:
-            import anthropic
-
             # モデルに応じたmax_tokensを設定
             max_tokens = 4096  # デフォルト（haiku用）
             if "sonnet" in model or "opus" in model:
                 max_tokens = 8000
 
-            client = anthropic.AsyncAnthropic(api_key=api_key)
-            response = await client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            content = response.content[0].text
-            return self._extract_html(content)
+            # プールのクライアントは共有イベントループで使う（応答を受け取り終えるまで借りておく）
+            with api_client_pool.lease_async_client("anthropic", api_key) as client:
+                async def request() -> StreamedCompletion:
+                    if stream is not None:
+                        stream.reset()
+                    async with client.messages.stream(
+                        model=model,
+                        max_tokens=max_tokens,
+                        system=[{
+                            "type": "text",
+                            "text": instructions,
+                            "cache_control": {"type": "ephemeral"}
+                        }],
+                        messages=[{"role": "user", "content": content}]
+                    ) as response:
+                        async for delta in response.text_stream:
+                            if stream is not None:
+                                stream.append(delta)
+                        message = await response.get_final_message()
+                    return StreamedCompletion(text=message.content[0].text, usage=message.usage)
+
+                with observe_api_call("anthropic", "html_generation"):
+                    response = await api_client_pool.run_async(api_rate_limiter.get("anthropic", api_key).call_async(
+                        request,
+                        input_tokens=estimate_text_tokens(instructions + content),
+                        max_tokens=max_tokens
+                    ))
+
+            return self._extract_html(response.text)
 
         except Exception as e:
             logger.error(f"Anthropic API error: {e}")
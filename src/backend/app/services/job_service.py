@@ -0,0 +1,278 @@
+"""
+ジョブキューサービス
+変換・テンプレート学習ジョブの登録、取り出し、キャンセル、中断からの復旧
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models import Job
+from app.core.config import settings
+from app.core.exceptions import JobNotFoundException, JobNotCancellableException
+from app.infrastructure.monitoring import set_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# 取り出し時に競合を考慮して確認する候補数
+CLAIM_CANDIDATES = 5
+
+
+class JobService:
+    """ジョブキューサービスクラス"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(
+        self,
+        user_id: int,
+        kind: str,
+        target_id: int,
+        priority: int = Job.PRIORITY_NORMAL
+    ) -> Job:
+        """ジョブを登録（同じ対象の待機中・実行中のジョブがあればそれを返す）"""
+        existing = self.get_active(kind, target_id)
+        if existing is not None:
+            if existing.status == Job.STATUS_QUEUED and priority > existing.priority:
+                existing.priority = priority
+                self.db.commit()
+            return existing
+
+        job = Job(
+            user_id=user_id,
+            kind=kind,
+            target_id=target_id,
+            priority=priority,
+            max_attempts=settings.JOB_MAX_ATTEMPTS
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        self.publish_queue_depth()
+        return job
+
+    def enqueue_many(
+        self,
+        user_id: int,
+        kind: str,
+        target_ids: List[int],
+        priority: int = Job.PRIORITY_NORMAL
+    ) -> List[Job]:
+        """複数の対象のジョブをまとめて登録（セッションの未確定の変更と同じコミットで確定する）"""
+        jobs = [
+            Job(
+                user_id=user_id,
+                kind=kind,
+                target_id=target_id,
+                priority=priority,
+                max_attempts=settings.JOB_MAX_ATTEMPTS
+            )
+            for target_id in target_ids
+        ]
+        self.db.add_all(jobs)
+        self.db.commit()
+        self.publish_queue_depth()
+        return jobs
+
+    def get_active(self, kind: str, target_id: int) -> Optional[Job]:
+        """対象の待機中・実行中のジョブを取得"""
+        return self.db.query(Job).filter(
+            Job.kind == kind,
+            Job.target_id == target_id,
+            Job.status.in_(Job.ACTIVE_STATUSES)
+        ).first()
+
+    def get_by_id(self, job_id: int, user_id: int) -> Job:
+        """ジョブを取得（ユーザー自身のジョブのみ）"""
+        job = self.db.query(Job).filter(
+            Job.id == job_id,
+            Job.user_id == user_id
+        ).first()
+
+        if not job:
+            raise JobNotFoundException(job_id)
+
+        return job
+
+    def get_list(
+        self,
+        user_id: int,
+        status: Optional[str] = None,
+        kind: Optional[str] = None,
+        page: int = 1,
+        limit: int = 20
+    ) -> tuple[List[Job], int]:
+        """ジョブ一覧を取得"""
+        query = self.db.query(Job).filter(Job.user_id == user_id)
+
+        if status:
+            query = query.filter(Job.status == status)
+        if kind:
+            query = query.filter(Job.kind == kind)
+
+        total = query.count()
+
+        jobs = query.order_by(Job.id.desc()) \
+            .offset((page - 1) * limit) \
+            .limit(limit) \
+            .all()
+
+        return jobs, total
+
+    def claim_next(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Job]:
+        """優先度の高い順に待機中のジョブを1件取り出して実行中にする
+
+        複数のワーカーが同時に取り出しても1件のジョブは1つのワーカーにだけ渡るよう、
+        status=queuedを条件にした更新で確保する。取り出したワーカーにはリースを与える。
+        """
+        query = self.db.query(Job.id).filter(
+            Job.status == Job.STATUS_QUEUED,
+            or_(Job.run_after.is_(None), Job.run_after <= datetime.utcnow())
+        )
+        if kinds:
+            query = query.filter(Job.kind.in_(kinds))
+        candidates = query.order_by(Job.priority.desc(), Job.id).limit(CLAIM_CANDIDATES).all()
+
+        for (job_id,) in candidates:
+            now = datetime.utcnow()
+            claimed = self.db.query(Job).filter(
+                Job.id == job_id,
+                Job.status == Job.STATUS_QUEUED
+            ).update({
+                Job.status: Job.STATUS_RUNNING,
+                Job.worker_id: worker_id,
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now,
+                Job.heartbeat_at: now,
+                Job.lease_expires_at: now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+            }, synchronize_session=False)
+            self.db.commit()
+            if claimed:
+                self.publish_queue_depth()
+                return self.db.get(Job, job_id)
+        return None
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """リースを延長（ジョブが他のワーカーに移っていたらFalse）"""
+        now = datetime.utcnow()
+        extended = self.db.query(Job).filter(
+            Job.id == job_id,
+            Job.worker_id == worker_id,
+            Job.status == Job.STATUS_RUNNING
+        ).update({
+            Job.heartbeat_at: now,
+            Job.lease_expires_at: now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        }, synchronize_session=False)
+        self.db.commit()
+        return bool(extended)
+
+    def complete(self, job: Job) -> bool:
+        """完了にする"""
+        return self._finish(job, Job.STATUS_COMPLETED)
+
+    def fail(self, job: Job, error_message: str) -> bool:
+        """失敗にする"""
+        return self._finish(job, Job.STATUS_FAILED, error_message)
+
+    def mark_cancelled(self, job: Job) -> bool:
+        """実行中にキャンセルされたジョブをキャンセル済みにする"""
+        return self._finish(job, Job.STATUS_CANCELLED, "キャンセルされました")
+
+    def release(self, job: Job, delay: Optional[float] = None) -> bool:
+        """ワーカーの停止・同じ入力の処理待ちで中断したジョブを待機中に戻す（実行回数には数えない）
+
+        delayを指定するとその秒数が経つまで取り出さない
+        """
+        return self._update_owned(job, {
+            Job.status: Job.STATUS_QUEUED,
+            Job.attempts: Job.attempts - 1,
+            Job.worker_id: None,
+            Job.started_at: None,
+            Job.heartbeat_at: None,
+            Job.lease_expires_at: None,
+            Job.run_after: datetime.utcnow() + timedelta(seconds=delay) if delay else None
+        })
+
+    def _finish(self, job: Job, status: str, error_message: Optional[str] = None) -> bool:
+        return self._update_owned(job, {
+            Job.status: status,
+            Job.error_message: error_message,
+            Job.finished_at: datetime.utcnow(),
+            Job.lease_expires_at: None
+        })
+
+    def _update_owned(self, job: Job, values: dict) -> bool:
+        """ワーカーが実行中のジョブを更新（リース切れで他のワーカーに移っていたら更新しない）"""
+        updated = self.db.query(Job).filter(
+            Job.id == job.id,
+            Job.worker_id == job.worker_id,
+            Job.status == Job.STATUS_RUNNING
+        ).update(values, synchronize_session=False)
+        self.db.commit()
+        self.db.refresh(job)
+        if not updated:
+            logger.warning(f"ジョブは他のワーカーに移っているため結果を記録しません: {job}")
+        else:
+            self.publish_queue_depth()
+        return bool(updated)
+
+    def cancel(self, job_id: int, user_id: int) -> Job:
+        """キャンセル（待機中は即時、実行中はワーカーに中断を要求）"""
+        job = self.get_by_id(job_id, user_id)
+        if not job.is_active:
+            raise JobNotCancellableException(job_id)
+
+        job.cancel_requested = True
+        if job.status == Job.STATUS_QUEUED:
+            job.status = Job.STATUS_CANCELLED
+            job.error_message = "キャンセルされました"
+            job.finished_at = datetime.utcnow()
+        self.db.commit()
+        self.publish_queue_depth()
+        return job
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        """キャンセルが要求されているかどうか"""
+        return bool(self.db.query(Job.cancel_requested).filter(Job.id == job_id).scalar())
+
+    def recover_abandoned(self) -> List[Job]:
+        """リースが切れた実行中のジョブ（ワーカーの異常終了などで中断されたもの）を待機中に戻す
+
+        ハートビートを続けているワーカーのジョブには触れない。再実行の回数が上限に達したジョブは
+        失敗にし、呼び出し側で対象のステータスを更新できるよう返す。
+        """
+        failed = []
+        expired = self.db.query(Job).filter(
+            Job.status == Job.STATUS_RUNNING,
+            or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < datetime.utcnow())
+        ).all()
+        for job in expired:
+            job.worker_id = None
+            job.lease_expires_at = None
+            if job.cancel_requested:
+                job.status = Job.STATUS_CANCELLED
+                job.error_message = "キャンセルされました"
+                job.finished_at = datetime.utcnow()
+                failed.append(job)
+            elif job.attempts >= job.max_attempts:
+                job.status = Job.STATUS_FAILED
+                job.error_message = "中断されたジョブの再実行回数が上限に達しました"
+                job.finished_at = datetime.utcnow()
+                failed.append(job)
+            else:
+                logger.info(f"中断されたジョブを再登録します: {job}")
+                job.status = Job.STATUS_QUEUED
+        self.db.commit()
+        if expired:
+            self.publish_queue_depth()
+        return failed
+
+    def publish_queue_depth(self):
+        """待機中の変換ジョブ数をメトリクスに反映"""
+        set_queue_depth(self.db.query(Job).filter(
+            Job.kind == Job.KIND_CONVERSION,
+            Job.status == Job.STATUS_QUEUED
+        ).count())
@@ -5,13 +5,16 @@ URLからコーディングルールを学習
 import asyncio
 import json
 import logging
-from typing import Optional
+from typing import Callable, Optional
 from sqlalchemy.orm import Session
 
 from app.models import Template, UserSettings
 from app.core.config import settings
 from app.core.security import security_service
-from app.core.exceptions import LLMException
+from app.core.exceptions import JobCancelledException, LLMException
+from app.infrastructure.api_clients import api_client_pool
+from app.infrastructure.monitoring import observe_api_call
+from app.infrastructure.rate_limiter import api_rate_limiter, estimate_text_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +25,13 @@ class LearningService:
     def __init__(self, db: Session):
         self.db = db
 
-    async def learn_from_urls(self, template: Template, user_settings: UserSettings) -> dict:
-        """URLからコーディングルールを学習"""
+    async def learn_from_urls(
+        self,
+        template: Template,
+        user_settings: UserSettings,
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ) -> dict:
+        """URLからコーディングルールを学習（is_cancelledがTrueを返したらURLの区切りで中断する）"""
         from app.services.template_service import TemplateService
         template_service = TemplateService(self.db)
 
@@ -36,12 +44,17 @@ class LearningService:
             html_contents = []
 
             for url in urls:
+                if is_cancelled is not None and is_cancelled():
+                    raise JobCancelledException()
                 html = await self._fetch_page(url)
                 html_contents.append({
                     "url": url,
                     "html": html[:50000]  # 最大50KB
                 })
 
+            if is_cancelled is not None and is_cancelled():
+                raise JobCancelledException()
+
             # LLMでルール生成
             rules = await self._generate_rules(html_contents, user_settings)
 
@@ -51,9 +64,11 @@ class LearningService:
 
             return rules
 
+        except JobCancelledException:
+            raise
         except Exception as e:
+            # テンプレートのエラー化はジョブワーカーが行う（リースが切れた場合は他のワーカーに任せる）
             logger.error(f"Learning failed for template {template.id}: {e}")
-            template_service.set_error_status(template, str(e))
             raise
 
     async def _fetch_page(self, url: str) -> str:
@@ -166,15 +181,19 @@ class LearningService:
     async def _call_openai(self, prompt: str, api_key: str, model: str) -> dict:
         """OpenAI APIを呼び出し"""
         try:
-            from openai import AsyncOpenAI
-
-            client = AsyncOpenAI(api_key=api_key)
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=4000,
-                temperature=0.3
-            )
+            # プールのクライアントは共有イベントループで使う（応答を受け取り終えるまで借りておく）
+            with api_client_pool.lease_async_client("openai", api_key) as client, \
+                    observe_api_call("openai", "learning"):
+                response = await api_client_pool.run_async(api_rate_limiter.get("openai", api_key).call_async(
+                    lambda: client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=4000,
+                        temperature=0.3
+                    ),
+                    input_tokens=estimate_text_tokens(prompt),
+                    max_tokens=4000
+                ))
 
             content = response.choices[0].message.content
             return self._parse_json_response(content)
@@ -186,19 +205,23 @@ class LearningService:
     async def _call_anthropic(self, prompt: str, api_key: str, model: str) -> dict:
         """Anthropic APIを呼び出し"""
         try:
-            import anthropic
-
             # モデルに応じたmax_tokensを設定
             max_tokens = 4096  # デフォルト（haiku用）
             if "sonnet" in model or "opus" in model:
                 max_tokens = 8000
 
-            client = anthropic.AsyncAnthropic(api_key=api_key)
-            response = await client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            # プールのクライアントは共有イベントループで使う（応答を受け取り終えるまで借りておく）
+            with api_client_pool.lease_async_client("anthropic", api_key) as client, \
+                    observe_api_call("anthropic", "learning"):
+                response = await api_client_pool.run_async(api_rate_limiter.get("anthropic", api_key).call_async(
+                    lambda: client.messages.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        messages=[{"role": "user", "content": prompt}]
+                    ),
+                    input_tokens=estimate_text_tokens(prompt),
+                    max_tokens=max_tokens
+                ))
 
             content = response.content[0].text
             return self._parse_json_response(content)
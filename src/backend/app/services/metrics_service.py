@@ -0,0 +1,106 @@
+"""
+変換計測サービス
+ステージごとの計測値の保存と、コンバーター別の集計
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.models import Conversion, ConversionMetric
+from app.infrastructure.stage_metrics import StageRecorder
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], ratio: float) -> float:
+    """パーセンタイル値を線形補間で計算（ratioは0〜1）"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * ratio
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class ConversionMetricsService:
+    """変換計測サービスクラス"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def save(
+        self,
+        conversion: Conversion,
+        recorder: StageRecorder,
+        converter: Optional[str] = None,
+        page_count: Optional[int] = None,
+        succeeded: bool = True
+    ) -> List[ConversionMetric]:
+        """計測値を保存（再変換時は前回の計測値を置き換える）"""
+        metrics = [
+            ConversionMetric(
+                converter=converter or conversion.converter_used,
+                stage=stage,
+                wall_seconds=stats.wall_seconds,
+                cpu_seconds=stats.cpu_seconds,
+                count=stats.count,
+                page_count=page_count if page_count is not None else conversion.page_count,
+                succeeded=succeeded
+            )
+            for stage, stats in recorder.stages.items()
+        ]
+        # 置き換えた前回の計測値はdelete-orphanで削除される
+        conversion.metrics = metrics
+        conversion.cache_read_tokens = recorder.cache_read_tokens
+        conversion.cache_write_tokens = recorder.cache_write_tokens
+        self.db.commit()
+        return metrics
+
+    def get_for_conversion(self, conversion_id: int, user_id: int) -> List[ConversionMetric]:
+        """変換の計測値を取得（ユーザー自身の変換のみ）"""
+        return self.db.query(ConversionMetric).join(Conversion).filter(
+            ConversionMetric.conversion_id == conversion_id,
+            Conversion.user_id == user_id
+        ).order_by(ConversionMetric.id).all()
+
+    def summary(
+        self,
+        user_id: int,
+        days: Optional[int] = None,
+        converter: Optional[str] = None
+    ) -> List[Dict]:
+        """コンバーター・ステージ別に1ページあたりのp50/p95を集計（成功した変換のみ）"""
+        query = self.db.query(ConversionMetric).join(Conversion).filter(
+            Conversion.user_id == user_id,
+            ConversionMetric.succeeded.is_(True)
+        )
+        if days:
+            query = query.filter(ConversionMetric.created_at >= datetime.utcnow() - timedelta(days=days))
+        if converter:
+            query = query.filter(ConversionMetric.converter == converter)
+
+        groups: Dict[Tuple[str, str], List[ConversionMetric]] = {}
+        for metric in query.all():
+            groups.setdefault((metric.converter or "", metric.stage), []).append(metric)
+
+        summaries = []
+        for (converter_name, stage), metrics in sorted(groups.items()):
+            per_page = [m for m in metrics if m.page_count]
+            wall_per_page = [m.wall_seconds / m.page_count for m in per_page]
+            cpu_per_page = [m.cpu_seconds / m.page_count for m in per_page]
+            summaries.append({
+                "converter": converter_name,
+                "stage": stage,
+                "conversions": len(metrics),
+                "total_count": sum(m.count for m in metrics),
+                "total_wall_seconds": sum(m.wall_seconds for m in metrics),
+                "total_cpu_seconds": sum(m.cpu_seconds for m in metrics),
+                "wall_per_page_p50": percentile(wall_per_page, 0.5),
+                "wall_per_page_p95": percentile(wall_per_page, 0.95),
+                "cpu_per_page_p50": percentile(cpu_per_page, 0.5),
+                "cpu_per_page_p95": percentile(cpu_per_page, 0.95),
+            })
+        return summaries
@@ -6,6 +6,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from app.models import UserSettings
+from app.converters.registry import converter_registry
 from app.core.security import security_service
 from app.core.exceptions import NotFoundException, ValidationException
 
@@ -69,6 +70,9 @@ class SettingsService:
 
         self.db.commit()
         self.db.refresh(settings)
+
+        # 共有中のコンバーターとAPIクライアントを破棄
+        converter_registry.update_api_keys(user_id, openai_api_key, anthropic_api_key)
         return settings
 
     def update_models(
@@ -98,6 +102,9 @@ class SettingsService:
 
         self.db.commit()
         self.db.refresh(settings)
+
+        # 共有中のコンバーターを破棄
+        converter_registry.update_models(user_id, openai_model, anthropic_model)
         return settings
 
     def get_decrypted_api_keys(self, user_id: int) -> dict:
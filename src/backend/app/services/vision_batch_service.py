@@ -0,0 +1,148 @@
+"""
+Vision Batchサービス
+Batch APIに送信したVisionリクエストを変換ごとに保存し、ジョブの再実行で結果を引き継ぐ
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.models import VisionBatchRequest
+from app.converters.batch import BatchRequest, BatchRequestStore, StoredBatchRequest
+from app.infrastructure.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class VisionBatchService:
+    """Vision Batchサービスクラス"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load(self, conversion_id: int, request_key: str) -> Dict[int, StoredBatchRequest]:
+        """変換・プロンプトごとの保存済みリクエスト（ページ番号がキー）"""
+        rows = self.db.query(VisionBatchRequest).filter(
+            VisionBatchRequest.conversion_id == conversion_id,
+            VisionBatchRequest.request_key == request_key
+        ).all()
+        return {
+            row.page_index: StoredBatchRequest(
+                page_index=row.page_index,
+                custom_id=row.custom_id,
+                batch_id=row.batch_id,
+                status=row.status,
+                created_at=row.created_at,
+                cache_key=row.cache_key,
+                content=row.content,
+                error_message=row.error_message
+            )
+            for row in rows
+        }
+
+    def add(
+        self,
+        conversion_id: int,
+        request_key: str,
+        provider: str,
+        requests: List[Tuple[int, Optional[str], BatchRequest]]
+    ):
+        """送信待ちに追加したリクエストを保存"""
+        for page_index, cache_key, request in requests:
+            self.db.add(VisionBatchRequest(
+                conversion_id=conversion_id,
+                request_key=request_key,
+                page_index=page_index,
+                provider=provider,
+                custom_id=request.custom_id,
+                cache_key=cache_key
+            ))
+        self.db.commit()
+
+    def set_batch_id(self, custom_ids: List[str], batch_id: str):
+        """作成したBatchのIDを保存"""
+        self._query(custom_ids).update({"batch_id": batch_id}, synchronize_session=False)
+        self.db.commit()
+
+    def set_results(self, contents: Dict[str, Optional[str]]):
+        """custom_idごとの応答を保存"""
+        rows = self._query(list(contents)).all()
+        for row in rows:
+            row.status = VisionBatchRequest.STATUS_COMPLETED
+            row.content = contents[row.custom_id]
+        self.db.commit()
+
+    def set_failed(self, custom_ids: List[str], message: str):
+        """Batchの作成に失敗したリクエストを記録"""
+        self._query(custom_ids).update(
+            {"status": VisionBatchRequest.STATUS_FAILED, "error_message": message},
+            synchronize_session=False
+        )
+        self.db.commit()
+
+    def remove(self, custom_ids: List[str]):
+        """リクエストを削除"""
+        self._query(custom_ids).delete(synchronize_session=False)
+        self.db.commit()
+
+    def clear(self, conversion_id: int):
+        """変換の保存済みリクエストをすべて削除（抽出結果の保存後）"""
+        self.db.query(VisionBatchRequest).filter(
+            VisionBatchRequest.conversion_id == conversion_id
+        ).delete(synchronize_session=False)
+        self.db.commit()
+
+    def _query(self, custom_ids: List[str]):
+        return self.db.query(VisionBatchRequest).filter(VisionBatchRequest.custom_id.in_(custom_ids))
+
+
+class ConversionBatchRequestStore(BatchRequestStore):
+    """変換ごとの保存先
+
+    変換スレッドとBatch送信スレッドの両方から呼ばれるため、呼び出しごとにセッションを開く。
+    """
+
+    def __init__(self, conversion_id: int):
+        self.conversion_id = conversion_id
+
+    def load(self, request_key: str) -> Dict[int, StoredBatchRequest]:
+        db = SessionLocal()
+        try:
+            return VisionBatchService(db).load(self.conversion_id, request_key)
+        finally:
+            db.close()
+
+    def add(self, request_key: str, provider: str, requests: List[Tuple[int, Optional[str], BatchRequest]]):
+        db = SessionLocal()
+        try:
+            VisionBatchService(db).add(self.conversion_id, request_key, provider, requests)
+        finally:
+            db.close()
+
+    def set_batch_id(self, custom_ids: List[str], batch_id: str):
+        db = SessionLocal()
+        try:
+            VisionBatchService(db).set_batch_id(custom_ids, batch_id)
+        finally:
+            db.close()
+
+    def set_results(self, contents: Dict[str, Optional[str]]):
+        db = SessionLocal()
+        try:
+            VisionBatchService(db).set_results(contents)
+        finally:
+            db.close()
+
+    def set_failed(self, custom_ids: List[str], message: str):
+        db = SessionLocal()
+        try:
+            VisionBatchService(db).set_failed(custom_ids, message)
+        finally:
+            db.close()
+
+    def remove(self, custom_ids: List[str]):
+        db = SessionLocal()
+        try:
+            VisionBatchService(db).remove(custom_ids)
+        finally:
+            db.close()
@@ -0,0 +1,451 @@
+"""
+Vision Batch APIのテスト
+ローカルのスタンドインサーバーにbase_urlを向けたSDKクライアントで、Batchの作成から結果の取得までを確認する
+
+    cd src/backend && python -m pytest tests
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
+import re
+import threading
+
+import anthropic
+import openai
+import pytest
+
+from app.converters.batch import (
+    REQUEST_SUBMITTED, AnthropicBatchClient, BatchFailedException, BatchRequest,
+    BatchRequestStore, OpenAIBatchClient, StoredBatchRequest, VisionBatchScheduler, using_batch_store
+)
+from app.converters.claude_converter import ClaudeVisionConverter
+
+# このテキストを含むリクエストはスタンドインサーバーで失敗させる
+FAIL_TEXT = "fail"
+
+
+def _request_text(params: dict) -> str:
+    """リクエストの最後のユーザーメッセージのテキスト"""
+    content = params["messages"][-1]["content"]
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if part.get("type") == "text")
+
+
+def _answer(params: dict) -> str:
+    """スタンドインサーバーの応答テキスト"""
+    return f"<p>{_request_text(params)}</p>"
+
+
+class BatchServerState:
+    """スタンドインサーバーに作成されたBatch"""
+
+    def __init__(self):
+        self.batches: Dict[str, dict] = {}
+        self.files: Dict[str, bytes] = {}
+        # 完了するまでに状態の取得を受け付ける回数（0で作成直後に完了）
+        self.polls_until_done = 1
+        self.status_after_done = "completed"
+        self.retrieves = 0
+        self.lock = threading.Lock()
+
+    def add_batch(self, requests: List[dict]) -> dict:
+        with self.lock:
+            batch = {
+                "id": f"batch_{len(self.batches) + 1}",
+                "requests": requests,
+                "polls": 0
+            }
+            self.batches[batch["id"]] = batch
+            return batch
+
+    def poll(self, batch_id: str) -> Optional[dict]:
+        """状態の取得を数え、polls_until_done回目以降は完了にする"""
+        with self.lock:
+            self.retrieves += 1
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            batch["done"] = batch["polls"] >= self.polls_until_done
+            batch["polls"] += 1
+            return batch
+
+
+def _make_handler(state: BatchServerState):
+    class Handler(BaseHTTPRequestHandler):
+        """Anthropic Message Batches APIとOpenAI Batch APIの最小限のスタンドイン"""
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, body: dict, status: int = 200):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_text(self, text: str, content_type: str):
+            data = text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path == "/v1/messages/batches":
+                batch = state.add_batch(json.loads(body)["requests"])
+                self._send_json(self._anthropic_batch(batch))
+            elif self.path == "/v1/files":
+                file_id = f"file_{len(state.files) + 1}"
+                # multipartの本文からJSONLの行だけを取り出す
+                lines = [line for line in body.decode("utf-8").splitlines() if line.startswith("{")]
+                state.files[file_id] = "\n".join(lines).encode("utf-8")
+                self._send_json({
+                    "id": file_id, "object": "file", "bytes": len(body), "created_at": 0,
+                    "filename": "batch.jsonl", "purpose": "batch", "status": "processed"
+                })
+            elif self.path == "/v1/batches":
+                params = json.loads(body)
+                lines = state.files[params["input_file_id"]].decode("utf-8").splitlines()
+                batch = state.add_batch([
+                    {"custom_id": entry["custom_id"], "params": entry["body"]}
+                    for entry in map(json.loads, lines)
+                ])
+                self._send_json(self._openai_batch(batch))
+            else:
+                self._send_json({"error": {"message": "not found"}}, status=404)
+
+        def do_GET(self):
+            match = re.fullmatch(r"/v1/messages/batches/(\w+)(/results)?", self.path)
+            if match:
+                if match.group(2):
+                    self._send_text(self._anthropic_results(match.group(1)), "application/binary")
+                    return
+                batch = state.poll(match.group(1))
+                if batch is None:
+                    self._send_json({"error": {"message": "not found"}}, status=404)
+                    return
+                self._send_json(self._anthropic_batch(batch))
+                return
+
+            match = re.fullmatch(r"/v1/batches/(\w+)", self.path)
+            if match:
+                batch = state.poll(match.group(1))
+                if batch is None:
+                    self._send_json({"error": {"message": "not found"}}, status=404)
+                    return
+                self._send_json(self._openai_batch(batch))
+                return
+
+            match = re.fullmatch(r"/v1/files/(\w+)/content", self.path)
+            if match:
+                self._send_text(state.files[match.group(1)].decode("utf-8"), "application/octet-stream")
+                return
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+        def _anthropic_batch(self, batch: dict) -> dict:
+            done = batch.get("done", False)
+            host, port = self.server.server_address[:2]
+            return {
+                "id": batch["id"],
+                "type": "message_batch",
+                "processing_status": "ended" if done else "in_progress",
+                "request_counts": {
+                    "processing": 0 if done else len(batch["requests"]),
+                    "succeeded": len(batch["requests"]) if done else 0,
+                    "errored": 0, "canceled": 0, "expired": 0
+                },
+                "created_at": "2024-01-01T00:00:00Z",
+                "expires_at": "2024-01-02T00:00:00Z",
+                "ended_at": "2024-01-01T00:01:00Z" if done else None,
+                "cancel_initiated_at": None,
+                "archived_at": None,
+                "results_url": f"http://{host}:{port}/v1/messages/batches/{batch['id']}/results" if done else None
+            }
+
+        def _anthropic_results(self, batch_id: str) -> str:
+            lines = []
+            for request in state.batches[batch_id]["requests"]:
+                if FAIL_TEXT in _request_text(request["params"]):
+                    result = {"type": "errored", "error": {
+                        "type": "error", "error": {"type": "invalid_request_error", "message": "bad request"}
+                    }}
+                else:
+                    result = {"type": "succeeded", "message": {
+                        "id": "msg_1", "type": "message", "role": "assistant",
+                        "model": request["params"]["model"],
+                        "content": [{"type": "text", "text": _answer(request["params"])}],
+                        "stop_reason": "end_turn", "stop_sequence": None,
+                        "usage": {"input_tokens": 10, "output_tokens": 5}
+                    }}
+                lines.append(json.dumps({"custom_id": request["custom_id"], "result": result}))
+            return "\n".join(lines)
+
+        def _openai_batch(self, batch: dict) -> dict:
+            done = batch.get("done", False)
+            status = state.status_after_done if done else "in_progress"
+            output_file_id = None
+            error_file_id = None
+            if done and status == "completed":
+                # 成功したリクエストは出力ファイル、失敗したリクエストはエラーファイルに入る
+                output, errors = self._openai_output(batch)
+                if output:
+                    output_file_id = f"{batch['id']}_output"
+                    state.files[output_file_id] = "\n".join(output).encode("utf-8")
+                if errors:
+                    error_file_id = f"{batch['id']}_error"
+                    state.files[error_file_id] = "\n".join(errors).encode("utf-8")
+            return {
+                "id": batch["id"],
+                "object": "batch",
+                "endpoint": "/v1/chat/completions",
+                "input_file_id": "file_1",
+                "completion_window": "24h",
+                "status": status,
+                "output_file_id": output_file_id,
+                "error_file_id": error_file_id,
+                "created_at": 0
+            }
+
+        def _openai_output(self, batch: dict) -> Tuple[List[str], List[str]]:
+            output, errors = [], []
+            for request in batch["requests"]:
+                if FAIL_TEXT in _request_text(request["params"]):
+                    errors.append(json.dumps({
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}},
+                        "error": {"message": "bad request"}
+                    }))
+                else:
+                    output.append(json.dumps({
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "body": {
+                            "choices": [{"index": 0, "message": {
+                                "role": "assistant", "content": _answer(request["params"])
+                            }}]
+                        }},
+                        "error": None
+                    }))
+            return output, errors
+
+    return Handler
+
+
+@pytest.fixture
+def batch_server():
+    """スタンドインサーバーを起動してベースURLと状態を返す"""
+    state = BatchServerState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(params=["anthropic", "openai"])
+def batch_client(request, batch_server):
+    """スタンドインサーバーに向けたBatchクライアント"""
+    base_url, state = batch_server
+    if request.param == "anthropic":
+        client = AnthropicBatchClient(anthropic.Anthropic(api_key="test", base_url=base_url, max_retries=0))
+    else:
+        client = OpenAIBatchClient(openai.OpenAI(api_key="test", base_url=f"{base_url}/v1", max_retries=0))
+    return client, state
+
+
+def _page_request(text: str) -> BatchRequest:
+    return BatchRequest.create({
+        "model": "test-model",
+        "max_tokens": 100,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": text}]}]
+    })
+
+
+class RecordingStore(BatchRequestStore):
+    """スケジューラーからの通知を記録する保存先"""
+
+    def __init__(self):
+        self.batch_ids: Dict[str, str] = {}
+        self.failed: Dict[str, str] = {}
+        self.removed: List[str] = []
+
+    def load(self, request_key):
+        return {}
+
+    def add(self, request_key, provider, requests):
+        pass
+
+    def set_batch_id(self, custom_ids, batch_id):
+        for custom_id in custom_ids:
+            self.batch_ids[custom_id] = batch_id
+
+    def set_results(self, contents):
+        pass
+
+    def set_failed(self, custom_ids, message):
+        for custom_id in custom_ids:
+            self.failed[custom_id] = message
+
+    def remove(self, custom_ids):
+        self.removed.extend(custom_ids)
+
+
+def test_client_round_trip(batch_client):
+    """作成・完了確認・結果取得（失敗したリクエストはNone、OpenAIはエラーファイルから読む）"""
+    client, _ = batch_client
+    requests = [_page_request("page 1"), _page_request("page 2"), _page_request(FAIL_TEXT)]
+
+    batch_id = client.create(requests)
+    assert client.is_done(batch_id) is False
+    assert client.is_done(batch_id) is True
+
+    contents = client.results(batch_id)
+    assert contents == {
+        requests[0].custom_id: "<p>page 1</p>",
+        requests[1].custom_id: "<p>page 2</p>",
+        requests[2].custom_id: None
+    }
+
+
+def test_openai_failed_batch(batch_server):
+    """出力ファイルのないまま終了したOpenAIのBatchはBatchFailedException"""
+    base_url, state = batch_server
+    state.polls_until_done = 0
+    state.status_after_done = "expired"
+    client = OpenAIBatchClient(openai.OpenAI(api_key="test", base_url=f"{base_url}/v1", max_retries=0))
+
+    batch_id = client.create([_page_request("page 1")])
+    with pytest.raises(BatchFailedException):
+        client.is_done(batch_id)
+
+
+def test_scheduler_groups_requests_and_caches_results(batch_client):
+    """複数の変換のリクエストを1つのBatchにまとめ、IDを保存先に渡して完了した応答を使い回す"""
+    client, state = batch_client
+    scheduler = VisionBatchScheduler(collect_seconds=0.05, poll_seconds=60, max_requests=10, max_bytes=1024 * 1024)
+    stores = [RecordingStore(), RecordingStore()]
+    requests = [[_page_request("a1"), _page_request("a2")], [_page_request("b1")]]
+    try:
+        futures = [
+            scheduler.submit(("provider", "key", "test-model"), client, reqs, store=store)
+            for reqs, store in zip(requests, stores)
+        ]
+        batch_ids = {future.result(timeout=10) for group in futures for future in group}
+        assert len(batch_ids) == 1
+        batch_id = batch_ids.pop()
+        assert len(state.batches) == 1
+        assert stores[0].batch_ids == {r.custom_id: batch_id for r in requests[0]}
+        assert stores[1].batch_ids == {requests[1][0].custom_id: batch_id}
+        assert not scheduler.is_queued(requests[0][0].custom_id)
+
+        # 未完了の間はpoll_seconds以内に確認し直してもAPIを呼ばない
+        assert scheduler.check(client, batch_id) is None
+        assert scheduler.check(client, batch_id) is None
+        assert state.retrieves == 1
+
+        scheduler._checked_at.clear()
+        contents = scheduler.check(client, batch_id)
+        assert contents[requests[1][0].custom_id] == "<p>b1</p>"
+        retrieves = state.retrieves
+        assert scheduler.check(client, batch_id) is contents
+        assert state.retrieves == retrieves
+    finally:
+        scheduler.shutdown()
+
+
+def test_scheduler_splits_at_max_requests(batch_client):
+    """件数の上限に達したら別のBatchにする"""
+    client, state = batch_client
+    scheduler = VisionBatchScheduler(collect_seconds=0.05, poll_seconds=60, max_requests=2, max_bytes=1024 * 1024)
+    try:
+        futures = scheduler.submit(
+            ("provider", "key", "test-model"), client, [_page_request(f"p{i}") for i in range(5)]
+        )
+        batch_ids = [future.result(timeout=10) for future in futures]
+        assert len(set(batch_ids)) == 3
+        assert sorted(len(batch["requests"]) for batch in state.batches.values()) == [1, 2, 2]
+    finally:
+        scheduler.shutdown()
+
+
+def test_scheduler_shutdown_flushes_pending(batch_client):
+    """停止時は集めている途中のリクエストも待たずに送信する"""
+    client, state = batch_client
+    scheduler = VisionBatchScheduler(collect_seconds=3600, poll_seconds=60, max_requests=10, max_bytes=1024 * 1024)
+    store = RecordingStore()
+    futures = scheduler.submit(("provider", "key", "test-model"), client, [_page_request("p1")], store=store)
+    assert not futures[0].done()
+
+    scheduler.shutdown()
+    assert futures[0].result(timeout=1) in state.batches
+    assert list(store.batch_ids.values()) == [futures[0].result()]
+
+
+def test_scheduler_shutdown_resends_when_create_fails(batch_server):
+    """停止時に作成できなかったリクエストは保存先から外し、ジョブの再実行で送り直す"""
+    base_url, _ = batch_server
+    client = AnthropicBatchClient(anthropic.Anthropic(api_key="test", base_url=f"{base_url}/missing", max_retries=0))
+    scheduler = VisionBatchScheduler(collect_seconds=3600, poll_seconds=60, max_requests=10, max_bytes=1024 * 1024)
+    store = RecordingStore()
+    request = _page_request("p1")
+    futures = scheduler.submit(("provider", "key", "test-model"), client, [request], store=store)
+
+    scheduler.shutdown()
+    assert futures[0].cancelled()
+    assert store.removed == [request.custom_id]
+    assert store.batch_ids == {}
+
+
+class SubmittedStore(RecordingStore):
+    """Batchを作成済みのリクエストを返す保存先"""
+
+    def __init__(self, stored: Dict[int, StoredBatchRequest]):
+        super().__init__()
+        self.stored = stored
+        self.results: Dict[str, Optional[str]] = {}
+
+    def load(self, request_key):
+        return self.stored
+
+    def set_results(self, contents):
+        self.results.update(contents)
+
+
+def test_failed_and_missing_results_are_resent(batch_client):
+    """失敗したリクエストと結果にないリクエストは完了として保存せず、保存先から外して失敗させる"""
+    client, state = batch_client
+    state.polls_until_done = 0
+    requests = [_page_request("page 1"), _page_request(FAIL_TEXT)]
+    batch_id = client.create(requests)
+    missing = BatchRequest.create({})
+    stored = {
+        page_num: StoredBatchRequest(
+            page_index=page_num, custom_id=request.custom_id, batch_id=batch_id,
+            status=REQUEST_SUBMITTED, created_at=datetime.utcnow()
+        )
+        for page_num, request in enumerate(requests + [missing])
+    }
+    store = SubmittedStore(stored)
+    scheduler = VisionBatchScheduler(collect_seconds=0.05, poll_seconds=0, max_requests=10, max_bytes=1024 * 1024)
+    converter = ClaudeVisionConverter(api_key="test", batch=True, batch_client=client)
+    converter.batch_scheduler = scheduler
+    try:
+        with using_batch_store(store), pytest.raises(BatchFailedException):
+            converter._map_pages_batch(None, [0, 1, 2], "prompt", 100)
+    finally:
+        scheduler.shutdown()
+
+    assert store.results == {requests[0].custom_id: "<p>page 1</p>"}
+    assert sorted(store.removed) == sorted([requests[1].custom_id, missing.custom_id])
+
@@ -1,6 +1,6 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { createPortal } from 'react-dom'
 import Link from 'next/link'
 import { FileText, Download, Trash2, Eye, Filter, FileOutput, RefreshCw } from 'lucide-react'
@@ -36,6 +36,7 @@ export default function ConversionsPage() {
   const [selectedConversionId, setSelectedConversionId] = useState<number | null>(null)
   const [previewHtml, setPreviewHtml] = useState<string | null>(null)
   const [isPreviewOpen, setIsPreviewOpen] = useState(false)
+  const streamAbortRef = useRef<AbortController | null>(null)
 
   useEffect(() => {
     fetchConversions()
@@ -80,6 +81,48 @@ export default function ConversionsPage() {
     }
   }
 
+  // 生成中のHTMLをストリームで受信してプレビュー
+  const handleLivePreview = async (conversionId: number) => {
+    streamAbortRef.current?.abort()
+    const controller = new AbortController()
+    streamAbortRef.current = controller
+
+    const waiting = '<p>HTMLの生成を待っています...</p>'
+    let text = ''
+    setPreviewHtml(waiting)
+    setIsPreviewOpen(true)
+    try {
+      await conversionApi.streamGeneration(
+        conversionId,
+        async (event) => {
+          if (event.type === 'snapshot') text = event.data
+          else if (event.type === 'delta') text += event.data
+          else if (event.type === 'reset') text = ''
+          else if (event.type === 'done') {
+            // 保存済みのHTML（画像埋め込み済み）に差し替える
+            refreshConversion(conversionId)
+            setPreviewHtml(await conversionApi.getHtml(conversionId))
+            return
+          } else if (event.type === 'error') {
+            setPreviewHtml(`<p>変換に失敗しました: ${event.data}</p>`)
+            return
+          } else return
+          // コードブロックの記号を除いて表示
+          setPreviewHtml(text.replace(/```(html)?/g, '') || waiting)
+        },
+        controller.signal
+      )
+    } catch {
+      // 中断・エラーハンドリング
+    }
+  }
+
+  const closePreview = () => {
+    streamAbortRef.current?.abort()
+    streamAbortRef.current = null
+    setIsPreviewOpen(false)
+  }
+
   const handleDownload = async (conversionId: number, filename: string) => {
     try {
       const blob = await conversionApi.downloadHtml(conversionId)
@@ -209,8 +252,18 @@ export default function ConversionsPage() {
                         </Button>
                       </>
                     )}
-                    {conversion.status === 'processing' && (
-                      <RefreshCw className="h-4 w-4 text-primary-500 animate-spin" />
+                    {(conversion.status === 'processing' || conversion.status === 'converting') && (
+                      <>
+                        <Button
+                          variant="ghost"
+                          size="sm"
+                          onClick={() => handleLivePreview(conversion.id)}
+                          title="生成中のプレビュー"
+                        >
+                          <Eye className="h-4 w-4" />
+                        </Button>
+                        <RefreshCw className="h-4 w-4 text-primary-500 animate-spin" />
+                      </>
                     )}
                     <Button
                       variant="ghost"
@@ -238,14 +291,14 @@ export default function ConversionsPage() {
           {/* オーバーレイ背景 */}
           <div
             className="absolute inset-0 bg-black/50"
-            onClick={() => setIsPreviewOpen(false)}
+            onClick={closePreview}
           />
           {/* モーダル本体 */}
           <div className="absolute inset-0 flex items-center justify-center p-4 pointer-events-none">
             <div className="bg-white rounded-xl w-full max-w-5xl max-h-[90vh] flex flex-col shadow-2xl pointer-events-auto">
               <div className="flex items-center justify-between p-4 border-b bg-white rounded-t-xl">
                 <h2 className="text-lg font-semibold">HTMLプレビュー</h2>
-                <Button variant="ghost" size="sm" onClick={() => setIsPreviewOpen(false)}>
+                <Button variant="ghost" size="sm" onClick={closePreview}>
                   閉じる
                 </Button>
               </div>
@@ -149,6 +149,9 @@ export default function TemplateDetailPage() {
     { value: 'pdfplumber', label: 'pdfplumber (表に強い)' },
     { value: 'openai', label: 'OpenAI Vision (高精度)' },
     { value: 'claude', label: 'Claude Vision (高精度)' },
+    { value: 'hybrid', label: 'Hybrid (スキャンページのみVision)' },
+    { value: 'composite', label: 'Composite (高速・表候補ページのみpdfplumber)' },
+    { value: 'auto', label: 'Auto (文書に合わせて自動選択)' },
   ]
 
   if (!template) {
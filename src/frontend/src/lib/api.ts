@@ -13,7 +13,10 @@ import type {
   TemplateCreate,
   TemplateUpdate,
   Conversion,
+  ConversionBatch,
   ExtractedImage,
+  GenerationStreamEvent,
+  Job,
   UserSettings,
   SettingsUpdate,
 } from './types'
@@ -162,6 +165,38 @@ export const conversionApi = {
     return response.data
   },
 
+  // 複数のPDF・ZIPファイルをまとめてアップロードしてHTML生成を開始
+  createBatch: async (
+    files: File[],
+    templateId: number,
+    options: { converterType?: string; mode?: 'sync' | 'batch'; priority?: number; name?: string } = {}
+  ): Promise<ApiResponse<ConversionBatch>> => {
+    const formData = new FormData()
+    files.forEach((file) => formData.append('files', file))
+    formData.append('template_id', templateId.toString())
+    if (options.converterType) {
+      formData.append('converter_type', options.converterType)
+    }
+    if (options.mode) {
+      formData.append('mode', options.mode)
+    }
+    if (options.priority !== undefined) {
+      formData.append('priority', options.priority.toString())
+    }
+    if (options.name) {
+      formData.append('name', options.name)
+    }
+    const response = await api.post<ApiResponse<ConversionBatch>>('/conversions/batches', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return response.data
+  },
+
+  getBatch: async (batchId: number): Promise<ApiResponse<ConversionBatch>> => {
+    const response = await api.get<ApiResponse<ConversionBatch>>(`/conversions/batches/${batchId}`)
+    return response.data
+  },
+
   delete: async (id: number): Promise<ApiResponse<null>> => {
     const response = await api.delete<ApiResponse<null>>(`/conversions/${id}`)
     return response.data
@@ -186,12 +221,69 @@ export const conversionApi = {
     return response.data
   },
 
-  generate: async (id: number): Promise<ApiResponse<{ id: number; status: string; message: string }>> => {
-    const response = await api.post<ApiResponse<{ id: number; status: string; message: string }>>(
-      `/conversions/${id}/generate`
+  generate: async (id: number, mode?: 'sync' | 'batch'): Promise<ApiResponse<{ id: number; job_id: number; status: string; message: string }>> => {
+    const response = await api.post<ApiResponse<{ id: number; job_id: number; status: string; message: string }>>(
+      `/conversions/${id}/generate`,
+      undefined,
+      { params: mode ? { mode } : undefined }
     )
     return response.data
   },
+
+  // 生成中のHTMLをSSEで受信（EventSourceはヘッダーを付けられないためfetchで読む）
+  streamGeneration: async (
+    id: number,
+    onEvent: (event: GenerationStreamEvent) => void,
+    signal?: AbortSignal
+  ): Promise<void> => {
+    const token = localStorage.getItem('token')
+    const response = await fetch(`/api/conversions/${id}/stream`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      signal,
+    })
+    if (!response.ok || !response.body) {
+      throw new Error(`ストリームの取得に失敗しました (${response.status})`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // イベントは空行で区切られる
+      let separator = buffer.indexOf('\n\n')
+      while (separator >= 0) {
+        const block = buffer.slice(0, separator)
+        buffer = buffer.slice(separator + 2)
+        separator = buffer.indexOf('\n\n')
+
+        let type = ''
+        let data = ''
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) type = line.slice(7)
+          else if (line.startsWith('data: ')) data = line.slice(6)
+        }
+        if (!type) continue // 接続維持のコメント
+        onEvent({ type: type as GenerationStreamEvent['type'], data: data ? JSON.parse(data) : '' })
+      }
+    }
+  },
+}
+
+// ===== ジョブ =====
+export const jobApi = {
+  get: async (id: number): Promise<ApiResponse<Job>> => {
+    const response = await api.get<ApiResponse<Job>>(`/jobs/${id}`)
+    return response.data
+  },
+
+  cancel: async (id: number): Promise<ApiResponse<Job>> => {
+    const response = await api.post<ApiResponse<Job>>(`/jobs/${id}/cancel`)
+    return response.data
+  },
 }
 
 // ===== 設定 =====
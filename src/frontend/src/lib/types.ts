@@ -82,9 +82,12 @@ export interface Conversion {
   template_name?: string
   original_filename: string
   status: 'pending' | 'uploaded' | 'converting' | 'processing' | 'completed' | 'failed' | 'error'
-  converter_type: 'pymupdf' | 'pdfplumber' | 'openai' | 'claude'
+  converter_type: 'pymupdf' | 'pdfplumber' | 'openai' | 'claude' | 'hybrid' | 'composite' | 'auto'
   result_html: string | null
   error_message: string | null
+  routing_reason?: string | null
+  execution_mode?: 'sync' | 'batch'
+  extraction_source_id?: number | null
   processed_pages: number
   total_pages: number
   created_at: string
@@ -96,6 +99,23 @@ export interface ConversionCreate {
   converter_type?: string
 }
 
+// 一括アップロード（進捗は変換・ジョブのステータスから集計）
+export interface ConversionBatch {
+  id: number
+  name: string | null
+  template_id: number
+  execution_mode: 'sync' | 'batch' | null
+  status: 'processing' | 'completed' | 'completed_with_errors'
+  total: number
+  queued: number
+  running: number
+  completed: number
+  error: number
+  progress: number
+  created_at: string
+  items?: Conversion[]
+}
+
 export interface ExtractedImage {
   id: number
   conversion_id: number
@@ -106,10 +126,26 @@ export interface ExtractedImage {
   height: number
 }
 
+// ===== ジョブ =====
+export interface Job {
+  id: number
+  kind: 'conversion' | 'learning'
+  target_id: number
+  priority: number
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled'
+  attempts: number
+  max_attempts: number
+  cancel_requested: boolean
+  error_message: string | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
 // ===== 設定 =====
 export interface UserSettings {
   id: number
-  default_converter: 'pymupdf' | 'pdfplumber' | 'openai' | 'claude'
+  default_converter: 'pymupdf' | 'pdfplumber' | 'openai' | 'claude' | 'hybrid' | 'composite' | 'auto'
   openai_api_key_set: boolean
   anthropic_api_key_set: boolean
   openai_model: string
@@ -128,6 +164,12 @@ export interface SettingsUpdate {
   image_quality?: number
 }
 
+// 生成ストリームのイベント（dataはsnapshot/deltaがテキスト、doneが保存したHTML、errorがメッセージ）
+export interface GenerationStreamEvent {
+  type: 'snapshot' | 'status' | 'delta' | 'reset' | 'done' | 'error'
+  data: string
+}
+
 // ===== ストア用 =====
 export interface AuthState {
   user: User | null
@@ -68,6 +68,9 @@ export function getConverterLabel(converter: string): string {
     pdfplumber: 'pdfplumber',
     openai: 'OpenAI Vision',
     claude: 'Claude Vision',
+    hybrid: 'Hybrid',
+    composite: 'Composite',
+    auto: 'Auto',
   }
   return converterMap[converter] || converter
 }
@@ -0,0 +1,311 @@
+import { test, expect, APIRequestContext } from '@playwright/test';
+import path from 'path';
+import fs from 'fs';
+
+/**
+ * Batch Upload / Jobs / SSE / Metrics API Test (一括アップロード・ジョブAPIテスト)
+ *
+ * Calls the backend API directly (no UI):
+ * 1. Batch upload of several PDFs (sync and Vision Batch API mode)
+ * 2. Batch progress until every conversion finishes
+ * 3. Job list / detail / cancel
+ * 4. Generation stream (SSE) of a conversion in the batch
+ * 5. Prometheus metrics
+ *
+ * Requires a ready template for the test user. Conversions use PyMuPDF so that
+ * no Vision API key is needed (HTML generation falls back to basic markup without an LLM key).
+ */
+
+// Backend API URL (the frontend baseURL is not used in this file)
+const API_URL = process.env.E2E_API_URL || 'http://localhost:8018';
+
+// Test data
+const TEST_USER = {
+  email: 'admin@example.com',
+  password: 'admin123'
+};
+
+// Test fixtures
+const FIXTURES_DIR = path.join(__dirname, '..', 'fixtures');
+const TEST_PDFS = ['test_simple.pdf', 'sample.pdf'];
+
+// Helper to get an access token
+async function getToken(request: APIRequestContext): Promise<string> {
+  const response = await request.post(`${API_URL}/api/auth/login`, { data: TEST_USER });
+  expect(response.ok()).toBeTruthy();
+  const body = await response.json();
+  return body.data.access_token;
+}
+
+// Helper to find a ready template
+async function findReadyTemplate(request: APIRequestContext, headers: Record<string, string>): Promise<number | null> {
+  const response = await request.get(`${API_URL}/api/templates`, {
+    headers,
+    params: { status: 'ready', limit: 1 }
+  });
+  expect(response.ok()).toBeTruthy();
+  const body = await response.json();
+  return body.data.items.length > 0 ? body.data.items[0].id : null;
+}
+
+// Helper to upload a single PDF as a batch
+async function uploadBatch(
+  request: APIRequestContext,
+  headers: Record<string, string>,
+  templateId: number,
+  mode: string
+) {
+  return request.post(`${API_URL}/api/conversions/batches`, {
+    headers,
+    multipart: {
+      files: {
+        name: TEST_PDFS[0],
+        mimeType: 'application/pdf',
+        buffer: fs.readFileSync(path.join(FIXTURES_DIR, TEST_PDFS[0]))
+      },
+      template_id: String(templateId),
+      converter_type: 'pymupdf',
+      mode,
+      name: `E2E ${mode} batch`
+    }
+  });
+}
+
+// Helper to wait for a batch to finish
+async function waitForBatch(
+  request: APIRequestContext,
+  headers: Record<string, string>,
+  batchId: number,
+  maxWait: number
+) {
+  const startTime = Date.now();
+
+  while (Date.now() - startTime < maxWait) {
+    const response = await request.get(`${API_URL}/api/conversions/batches/${batchId}`, { headers });
+    expect(response.ok()).toBeTruthy();
+    const batch = (await response.json()).data;
+
+    if (batch.status !== 'processing') {
+      return batch;
+    }
+
+    const elapsed = Math.round((Date.now() - startTime) / 1000);
+    console.log(`  Waiting for batch ${batchId}... (${batch.completed + batch.error}/${batch.total}, ${elapsed}s)`);
+    await new Promise(resolve => setTimeout(resolve, 2000));
+  }
+
+  throw new Error(`Batch ${batchId} did not finish within ${maxWait / 1000}s`);
+}
+
+test.describe.serial('Batch Upload / Jobs API Test (一括アップロード・ジョブAPIテスト)', () => {
+  test.setTimeout(300000); // 5 minutes total
+
+  let headers: Record<string, string> = {};
+  let templateId: number | null = null;
+  let batchId: number;
+  let conversionIds: number[] = [];
+
+  test.beforeAll(async ({ request }) => {
+    headers = { Authorization: `Bearer ${await getToken(request)}` };
+    templateId = await findReadyTemplate(request, headers);
+  });
+
+  test('should upload several PDFs as one batch', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found. Please create a template first.');
+
+    const response = await request.post(`${API_URL}/api/conversions/batches`, {
+      headers,
+      multipart: {
+        files: {
+          name: 'pdfs.zip',
+          mimeType: 'application/zip',
+          buffer: createZip(TEST_PDFS.map(name => ({
+            name: `pdfs/${name}`,
+            data: fs.readFileSync(path.join(FIXTURES_DIR, name))
+          })))
+        },
+        template_id: String(templateId),
+        converter_type: 'pymupdf',
+        mode: 'sync'
+      }
+    });
+    expect(response.ok()).toBeTruthy();
+
+    const batch = (await response.json()).data;
+    expect(batch.name).toBe('pdfs.zip');
+    expect(batch.execution_mode).toBe('sync');
+    expect(batch.total).toBe(TEST_PDFS.length);
+    expect(batch.items.map((item: any) => item.original_filename).sort()).toEqual([...TEST_PDFS].sort());
+
+    batchId = batch.id;
+    conversionIds = batch.items.map((item: any) => item.id);
+    console.log(`Created batch ${batchId} with conversions ${conversionIds.join(', ')}`);
+
+    // The batch is listed
+    const listResponse = await request.get(`${API_URL}/api/conversions/batches`, { headers });
+    expect(listResponse.ok()).toBeTruthy();
+    const list = (await listResponse.json()).data;
+    expect(list.items.some((item: any) => item.id === batchId)).toBeTruthy();
+  });
+
+  test('should stream generation events of a conversion in the batch', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found.');
+
+    // The stream stays open until the conversion finishes (done / error closes it)
+    const response = await request.get(`${API_URL}/api/conversions/${conversionIds[0]}/stream`, {
+      headers,
+      timeout: 180000
+    });
+    expect(response.ok()).toBeTruthy();
+    expect(response.headers()['content-type']).toContain('text/event-stream');
+
+    const text = await response.text();
+    expect(text).toMatch(/event: (done|error)/);
+    console.log(`SSE events: ${[...text.matchAll(/event: (\w+)/g)].map(m => m[1]).join(', ')}`);
+  });
+
+  test('should finish every conversion in the batch', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found.');
+
+    const batch = await waitForBatch(request, headers, batchId, 180000);
+    expect(batch.completed + batch.error).toBe(batch.total);
+    expect(batch.queued).toBe(0);
+    expect(batch.running).toBe(0);
+    expect(batch.progress).toBe(1);
+    expect(batch.status).toBe(batch.error ? 'completed_with_errors' : 'completed');
+
+    // A finished conversion replays its final event
+    const response = await request.get(`${API_URL}/api/conversions/${conversionIds[0]}/stream`, { headers });
+    expect(response.ok()).toBeTruthy();
+    expect(await response.text()).toMatch(/^event: (done|error)/);
+  });
+
+  test('should list and show conversion jobs', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found.');
+
+    const response = await request.get(`${API_URL}/api/jobs`, {
+      headers,
+      params: { kind: 'conversion', limit: 100 }
+    });
+    expect(response.ok()).toBeTruthy();
+    const jobs = (await response.json()).data.items;
+
+    for (const conversionId of conversionIds) {
+      const job = jobs.find((item: any) => item.target_id === conversionId);
+      expect(job).toBeTruthy();
+      expect(['completed', 'failed']).toContain(job.status);
+
+      const detail = await request.get(`${API_URL}/api/jobs/${job.id}`, { headers });
+      expect(detail.ok()).toBeTruthy();
+      expect((await detail.json()).data.id).toBe(job.id);
+
+      // A finished job cannot be cancelled
+      const cancel = await request.post(`${API_URL}/api/jobs/${job.id}/cancel`, { headers });
+      expect(cancel.status()).toBe(400);
+    }
+  });
+
+  test('should accept a Vision Batch API mode upload and cancel its job', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found.');
+
+    const response = await uploadBatch(request, headers, templateId!, 'batch');
+    expect(response.ok()).toBeTruthy();
+    const batch = (await response.json()).data;
+    expect(batch.execution_mode).toBe('batch');
+
+    const jobsResponse = await request.get(`${API_URL}/api/jobs`, {
+      headers,
+      params: { kind: 'conversion', limit: 100 }
+    });
+    const job = (await jobsResponse.json()).data.items.find((item: any) => item.target_id === batch.items[0].id);
+    expect(job).toBeTruthy();
+
+    // A queued job is cancelled at once, a running one at the next page boundary;
+    // a job that already finished cannot be cancelled
+    const cancel = await request.post(`${API_URL}/api/jobs/${job.id}/cancel`, { headers });
+    if (cancel.ok()) {
+      const cancelled = (await cancel.json()).data;
+      expect(cancelled.cancel_requested).toBeTruthy();
+    } else {
+      expect(cancel.status()).toBe(400);
+    }
+
+    const finished = await waitForBatch(request, headers, batch.id, 180000);
+    expect(finished.completed + finished.error).toBe(finished.total);
+  });
+
+  test('should reject an unknown execution mode', async ({ request }) => {
+    test.skip(!templateId, 'No ready template found.');
+
+    const response = await uploadBatch(request, headers, templateId!, 'unknown');
+    expect(response.status()).toBe(422);
+  });
+
+  test('should expose Prometheus metrics', async ({ request }) => {
+    const response = await request.get(`${API_URL}/metrics`);
+    test.skip(response.status() === 404, 'Metrics are disabled (METRICS_ENABLED=false).');
+    expect(response.ok()).toBeTruthy();
+    expect(response.headers()['content-type']).toContain('text/plain');
+
+    const text = await response.text();
+    expect(text).toContain('repagepdf_conversion_queue_depth');
+    expect(text).toContain('repagepdf_conversion_duration_seconds');
+    // Requests are labelled with the route template, not the concrete path
+    expect(text).toContain('route="/api/conversions/batches/{batch_id}"');
+  });
+});
+
+// Minimal ZIP writer (stored entries, no compression) for uploading several PDFs in one request
+function createZip(entries: { name: string; data: Buffer }[]): Buffer {
+  const localParts: Buffer[] = [];
+  const centralParts: Buffer[] = [];
+  let offset = 0;
+
+  for (const entry of entries) {
+    const name = Buffer.from(entry.name, 'utf-8');
+    const crc = crc32(entry.data);
+
+    const local = Buffer.alloc(30);
+    local.writeUInt32LE(0x04034b50, 0);
+    local.writeUInt16LE(20, 4);
+    local.writeUInt32LE(crc, 14);
+    local.writeUInt32LE(entry.data.length, 18);
+    local.writeUInt32LE(entry.data.length, 22);
+    local.writeUInt16LE(name.length, 26);
+    localParts.push(local, name, entry.data);
+
+    const central = Buffer.alloc(46);
+    central.writeUInt32LE(0x02014b50, 0);
+    central.writeUInt16LE(20, 4);
+    central.writeUInt16LE(20, 6);
+    central.writeUInt32LE(crc, 16);
+    central.writeUInt32LE(entry.data.length, 20);
+    central.writeUInt32LE(entry.data.length, 24);
+    central.writeUInt16LE(name.length, 28);
+    central.writeUInt32LE(offset, 42);
+    centralParts.push(central, name);
+
+    offset += local.length + name.length + entry.data.length;
+  }
+
+  const centralSize = centralParts.reduce((size, part) => size + part.length, 0);
+  const end = Buffer.alloc(22);
+  end.writeUInt32LE(0x06054b50, 0);
+  end.writeUInt16LE(entries.length, 8);
+  end.writeUInt16LE(entries.length, 10);
+  end.writeUInt32LE(centralSize, 12);
+  end.writeUInt32LE(offset, 16);
+
+  return Buffer.concat([...localParts, ...centralParts, end]);
+}
+
+function crc32(data: Buffer): number {
+  let crc = 0xffffffff;
+  for (const byte of data) {
+    crc ^= byte;
+    for (let i = 0; i < 8; i++) {
+      crc = (crc >>> 1) ^ (0xedb88320 & -(crc & 1));
+    }
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}